@@ -7,7 +7,8 @@ django.setup()
 
 from food_detection.models import Food
 
-# List of food items to add
+# List of food items to add. Values are per 100 g unless basis_grams says
+# otherwise: the weight of the serving they describe, or None if unknown
 food_items = [
     {
         'name': 'Orange',
@@ -16,7 +17,8 @@ food_items = [
         'protein': 1.2,
         'carbs': 15.4,
         'fat': 0.2,
-        'food_class': 'orange'
+        'food_class': 'orange',
+        'basis_grams': 131
     },
     {
         'name': 'Sandwich',
@@ -25,7 +27,8 @@ food_items = [
         'protein': 15,
         'carbs': 45,
         'fat': 12,
-        'food_class': 'sandwich'
+        'food_class': 'sandwich',
+        'basis_grams': None
     },
     {
         'name': 'Pizza',
@@ -43,7 +46,8 @@ food_items = [
         'protein': 20,
         'carbs': 29,
         'fat': 17,
-        'food_class': 'burger'
+        'food_class': 'burger',
+        'basis_grams': None
     },
     {
         'name': 'Hotdog',
@@ -52,7 +56,8 @@ food_items = [
         'protein': 12,
         'carbs': 18,
         'fat': 18,
-        'food_class': 'hotdog'
+        'food_class': 'hotdog',
+        'basis_grams': None
     },
     {
         'name': 'Rice',
@@ -106,7 +111,8 @@ food_items = [
         'protein': 4,
         'carbs': 36,
         'fat': 16,
-        'food_class': 'donut'
+        'food_class': 'donut',
+        'basis_grams': None
     },
     {
         'name': 'Coffee',
@@ -115,7 +121,8 @@ food_items = [
         'protein': 0.3,
         'carbs': 0,
         'fat': 0,
-        'food_class': 'coffee'
+        'food_class': 'coffee',
+        'basis_grams': None
     },
     {
         'name': 'Juice',
@@ -124,7 +131,8 @@ food_items = [
         'protein': 1,
         'carbs': 28,
         'fat': 0,
-        'food_class': 'juice'
+        'food_class': 'juice',
+        'basis_grams': None
     }
 ]
 
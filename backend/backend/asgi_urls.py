@@ -0,0 +1,16 @@
+"""URLconf used for requests served through backend.asgi.
+
+The detection upload endpoints are routed to native async views, which hand
+anything but their POSTs back to the DRF views; every other path falls
+through to the regular project URLconf.
+"""
+from django.urls import include, path
+
+from food_detection import async_views
+
+urlpatterns = [
+    path('api/detections/detect_food/', async_views.detect_food_base64, name='detection-detect-food'),
+    path('api/detect/', async_views.detect_food, name='detect_food'),
+    path('api/detect/batch/', async_views.detect_food_batch, name='detect_food_batch'),
+    path('', include('backend.urls')),
+]
@@ -42,9 +42,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'food_detection.middleware.ASGIURLConfMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
+# Requests served through backend.asgi get the native async food/detection views
+ASGI_URLCONF = 'backend.asgi_urls'
 
 TEMPLATES = [
     {
@@ -112,6 +115,92 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Food detection inference: 'compiled' (traced tf.function), 'predict'
+# (Keras model.predict) or 'tflite' (quantized build from convert_tflite)
+DETECTION_INFERENCE_ENGINE = os.getenv('DETECTION_INFERENCE_ENGINE', 'compiled')
+DETECTION_MODEL_DIR = Path(os.getenv('DETECTION_MODEL_DIR', BASE_DIR / 'models'))
+# Seconds a process trusts its last read of the catalogue version before
+# checking it again; edits made in other processes show up within this window
+CATALOGUE_VERSION_TTL = float(os.getenv('CATALOGUE_VERSION_TTL', 1.0))
+# Memory-mapped columnar copy of the Food table shared by all workers on a host
+FOOD_COLUMNS_PATH = Path(os.getenv('FOOD_COLUMNS_PATH', DETECTION_MODEL_DIR / 'food_columns.bin'))
+# /api/meals/calculate/: (food id, grams) items per request
+MEAL_MAX_ITEMS = int(os.getenv('MEAL_MAX_ITEMS', 50000))
+# Explicit .tflite path; defaults to the newest artifact of the configured
+# quantization in DETECTION_MODEL_DIR
+DETECTION_TFLITE_MODEL = os.getenv('DETECTION_TFLITE_MODEL')
+DETECTION_TFLITE_QUANTIZATION = os.getenv('DETECTION_TFLITE_QUANTIZATION', 'int8')
+DETECTION_TFLITE_THREADS = int(os.getenv('DETECTION_TFLITE_THREADS')) if os.getenv('DETECTION_TFLITE_THREADS') else None
+# Local copy of imagenet_class_index.json; downloaded through keras if missing
+DETECTION_IMAGENET_CLASS_INDEX = os.getenv('DETECTION_IMAGENET_CLASS_INDEX')
+
+# Food detection inference batching
+DETECTION_BATCH_MAX_SIZE = int(os.getenv('DETECTION_BATCH_MAX_SIZE', 8))
+DETECTION_BATCH_MAX_WAIT_MS = float(os.getenv('DETECTION_BATCH_MAX_WAIT_MS', 5))
+# Dedicated inference threads per process, and the images a process accepts at
+# once, waiting or being classified; beyond that detection requests get a 503
+# with Retry-After (0 = no limit)
+DETECTION_INFERENCE_WORKERS = int(os.getenv('DETECTION_INFERENCE_WORKERS', 1))
+DETECTION_INFERENCE_MAX_PENDING = int(os.getenv('DETECTION_INFERENCE_MAX_PENDING', 64))
+# TensorFlow per-op thread pools; keep WORKERS x INTRA_OP within the cores
+DETECTION_TF_INTRA_OP_THREADS = int(os.getenv('DETECTION_TF_INTRA_OP_THREADS')) if os.getenv('DETECTION_TF_INTRA_OP_THREADS') else None
+DETECTION_TF_INTER_OP_THREADS = int(os.getenv('DETECTION_TF_INTER_OP_THREADS')) if os.getenv('DETECTION_TF_INTER_OP_THREADS') else None
+# /api/detect/batch/: images per request and threads decoding them
+DETECTION_BATCH_MAX_IMAGES = int(os.getenv('DETECTION_BATCH_MAX_IMAGES', 16))
+DETECTION_UPLOAD_THREADS = int(os.getenv('DETECTION_UPLOAD_THREADS', 8))
+# Under ASGI: uploads classified concurrently per worker, and threads running
+# the blocking Firestore client
+DETECTION_ASYNC_INFERENCE_THREADS = int(os.getenv('DETECTION_ASYNC_INFERENCE_THREADS', 16))
+FIRESTORE_EXECUTOR_THREADS = int(os.getenv('FIRESTORE_EXECUTOR_THREADS', 8))
+# /api/foods/ on Firestore is served from an in-memory copy of the foods
+# collection, kept current by a snapshot listener or reloaded after the TTL
+FIRESTORE_CATALOGUE_TTL = int(os.getenv('FIRESTORE_CATALOGUE_TTL', 300))
+FIRESTORE_CATALOGUE_LISTEN = os.getenv('FIRESTORE_CATALOGUE_LISTEN', 'false').lower() == 'true'
+# /api/foods/?search= ranks every word-prefix match, but at most this many
+# fuzzy (typo-tolerant) matches per query
+FOOD_SEARCH_MAX_CANDIDATES = int(os.getenv('FOOD_SEARCH_MAX_CANDIDATES', 200))
+
+# Detection history write-behind buffer. FLUSH_MODE is 'thread' (background
+# writer) or 'request' (flush at the end of the request that crosses a
+# trigger). At most MAX_PENDING unflushed events are kept; more are dropped.
+DETECTION_HISTORY_BATCH_SIZE = int(os.getenv('DETECTION_HISTORY_BATCH_SIZE', 100))
+DETECTION_HISTORY_FLUSH_INTERVAL = float(os.getenv('DETECTION_HISTORY_FLUSH_INTERVAL', 1.0))
+DETECTION_HISTORY_MAX_PENDING = int(os.getenv('DETECTION_HISTORY_MAX_PENDING', 10000))
+DETECTION_HISTORY_FLUSH_MODE = os.getenv('DETECTION_HISTORY_FLUSH_MODE', 'thread')
+
+# Detection result cache keyed by a hash of the uploaded bytes. BACKEND is
+# 'local' (in-process LRU bounded by MAX_BYTES), 'django' (the cache named
+# by ALIAS) or 'none'. PERCEPTUAL also matches re-encoded copies of a photo.
+DETECTION_CACHE_BACKEND = os.getenv('DETECTION_CACHE_BACKEND', 'local')
+DETECTION_CACHE_ALIAS = os.getenv('DETECTION_CACHE_ALIAS', 'default')
+DETECTION_CACHE_TTL = int(os.getenv('DETECTION_CACHE_TTL', 300))
+DETECTION_CACHE_MAX_BYTES = int(os.getenv('DETECTION_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+DETECTION_CACHE_PERCEPTUAL = os.getenv('DETECTION_CACHE_PERCEPTUAL', 'false').lower() == 'true'
+DETECTION_CACHE_RECORD_HISTORY_ON_HIT = os.getenv('DETECTION_CACHE_RECORD_HISTORY_ON_HIT', 'false').lower() == 'true'
+
+# OpenFoodFacts search proxy (/api/fooddb/). Results are cached per
+# normalized query for CACHE_TTL seconds, then served stale for up to
+# STALE_TTL more while refreshed in the background.
+OPENFOODFACTS_SEARCH_URL = os.getenv('OPENFOODFACTS_SEARCH_URL', 'https://world.openfoodfacts.org/cgi/search.pl')
+OPENFOODFACTS_CONNECT_TIMEOUT = float(os.getenv('OPENFOODFACTS_CONNECT_TIMEOUT', 3.05))
+OPENFOODFACTS_READ_TIMEOUT = float(os.getenv('OPENFOODFACTS_READ_TIMEOUT', 5))
+OPENFOODFACTS_CACHE_TTL = int(os.getenv('OPENFOODFACTS_CACHE_TTL', 600))
+OPENFOODFACTS_STALE_TTL = int(os.getenv('OPENFOODFACTS_STALE_TTL', 3600))
+OPENFOODFACTS_CACHE_MAX_ENTRIES = int(os.getenv('OPENFOODFACTS_CACHE_MAX_ENTRIES', 1024))
+OPENFOODFACTS_POOL_SIZE = int(os.getenv('OPENFOODFACTS_POOL_SIZE', 10))
+# Search the local mirror filled by import_openfoodfacts before the remote API
+FOODDB_LOCAL_SEARCH = os.getenv('FOODDB_LOCAL_SEARCH', 'true').lower() == 'true'
+
+# /api/nutrition/food/ page size (?limit=) and its upper bound
+NUTRITION_ENTRIES_PAGE_SIZE = int(os.getenv('NUTRITION_ENTRIES_PAGE_SIZE', 50))
+NUTRITION_ENTRIES_MAX_PAGE_SIZE = int(os.getenv('NUTRITION_ENTRIES_MAX_PAGE_SIZE', 500))
+# /api/nutrition/rollup/: most day/week/month buckets one request may read
+NUTRITION_ROLLUP_MAX_BUCKETS = int(os.getenv('NUTRITION_ROLLUP_MAX_BUCKETS', 366))
+# Where food log entries live: 'firestore' or 'django' (the default database)
+NUTRITION_STORAGE_BACKEND = os.getenv('NUTRITION_STORAGE_BACKEND', 'firestore')
+# Service account file used when the FIREBASE_* variables aren't set
+FIREBASE_CREDENTIALS_FILE = os.getenv('FIREBASE_CREDENTIALS_FILE', 'firebase_credentials.json')
+
 # Firebase configuration
 FIREBASE_CREDENTIALS = {
     "type": "service_account",
@@ -127,6 +216,14 @@ FIREBASE_CREDENTIALS = {
     "universe_domain": "googleapis.com"
 }
 
+# ID tokens checked by fooddb.middleware.FirebaseAuthenticationMiddleware:
+# verified claims are cached until the token expires, Google's signing keys
+# for as long as their Cache-Control allows (else SIGNING_KEY_TTL seconds)
+FIREBASE_PROJECT_ID = os.getenv('FIREBASE_PROJECT_ID')
+FIREBASE_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('FIREBASE_TOKEN_CACHE_MAX_ENTRIES', 10000))
+FIREBASE_SIGNING_KEY_TTL = int(os.getenv('FIREBASE_SIGNING_KEY_TTL', 3600))
+FIREBASE_TOKEN_CLOCK_SKEW = int(os.getenv('FIREBASE_TOKEN_CLOCK_SKEW', 0))
+
 # Initialize Firebase Admin only if credentials are available
 if all([
     os.getenv('FIREBASE_PROJECT_ID'),
@@ -1,9 +1,9 @@
 from django.contrib import admin
-from .models import Food, DetectionHistory
+from .models import Food, DetectionHistory, ClassLabelMapping
 
 @admin.register(Food)
 class FoodAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'calories', 'protein', 'carbs', 'fat')
+    list_display = ('name', 'category', 'calories', 'protein', 'carbs', 'fat', 'basis_grams')
     list_filter = ('category',)
     search_fields = ('name', 'category')
     ordering = ('name',)
@@ -13,4 +13,11 @@ class DetectionHistoryAdmin(admin.ModelAdmin):
     list_display = ('food', 'confidence', 'detected_at')
     list_filter = ('detected_at', 'food__category')
     search_fields = ('food__name',)
-    ordering = ('-detected_at',) 
\ No newline at end of file
+    ordering = ('-detected_at',)
+
+@admin.register(ClassLabelMapping)
+class ClassLabelMappingAdmin(admin.ModelAdmin):
+    list_display = ('class_id', 'label', 'food')
+    search_fields = ('label', 'food__name')
+    autocomplete_fields = ('food',)
+    ordering = ('class_id',)
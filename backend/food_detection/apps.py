@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 class FoodDetectionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'food_detection' 
\ No newline at end of file
+    name = 'food_detection'
+
+    def ready(self):
+        from .food_mapping import invalidate_food_mapping
+        from .models import ClassLabelMapping, Food
+
+        # Any change to the catalogue or the mapping rebuilds the lookup table
+        for model in (Food, ClassLabelMapping):
+            post_save.connect(invalidate_food_mapping, sender=model, dispatch_uid=f'food_mapping_save_{model.__name__}')
+            post_delete.connect(invalidate_food_mapping, sender=model, dispatch_uid=f'food_mapping_delete_{model.__name__}')
@@ -0,0 +1,143 @@
+"""Native async versions of the detection upload endpoints.
+
+Served instead of the DRF views when the app runs under ASGI (see
+backend/asgi_urls.py); other methods on those paths go to the DRF views.
+Uploads pass the same DRF authentication, permission and throttle checks
+and are parsed and answered by the same helpers as in ``views``; only the
+waiting differs: inference runs on the bounded executor in ``executors``,
+so a single uvicorn worker keeps accepting uploads while earlier ones are
+classified.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import resolve
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.views import APIView
+
+from .batching import SchedulerSaturated
+from .executors import inference_executor
+from .views import (
+    base64_upload, batch_response_data, batch_uploads, detect_food_in_upload,
+    detect_foods_in_uploads, detection_response_data, scheduler,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _api_policies(request):
+    # What APIView.initial does for the DRF views; returns the error response
+    # or None when the request may go ahead
+    view = APIView()
+    view.args, view.kwargs, view.headers = (), {}, {}
+    drf_request = view.initialize_request(request)
+    view.request = drf_request
+    try:
+        view.initial(drf_request)
+    except Exception as e:
+        # Same status codes and headers as the DRF views (re-raises unhandled errors)
+        response = view.handle_exception(e)
+        error = JsonResponse(response.data, status=response.status_code)
+        for header in ('WWW-Authenticate', 'Retry-After'):
+            if header in response:
+                error[header] = response[header]
+        return error
+    return None
+
+
+def async_upload(view):
+    # POSTs get the async view after the DRF checks; any other method is
+    # answered by the DRF view the regular URLconf has for the same path
+    async def wrapped(request, *args, **kwargs):
+        if request.method != 'POST':
+            match = resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+            return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+        error = await sync_to_async(_api_policies)(request)
+        if error is not None:
+            return error
+        return await view(request, *args, **kwargs)
+    return csrf_exempt(wrapped)
+
+
+def _saturated(error):
+    response = JsonResponse({'error': 'Detection is busy, retry later'}, status=503)
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
+async def _run_admitted(images, fn, *args, pass_release=False):
+    # Admission is taken before the upload queues for an executor thread, so
+    # a saturated worker answers immediately, and given back when the call
+    # finishes (or is cancelled before it started), not when the client leaves.
+    # With pass_release, fn also gets the release to give slots back earlier
+    release = scheduler.admit(images)
+    try:
+        kwargs = {'release': release} if pass_release else {}
+        future = inference_executor.submit(fn, *args, **kwargs)
+    except BaseException:
+        release()
+        raise
+    future.add_done_callback(lambda _: release())
+    return await asyncio.wrap_future(future)
+
+
+async def _detect(image_bytes, found_key):
+    try:
+        result = await _run_admitted(1, detect_food_in_upload, image_bytes)
+    except SchedulerSaturated as e:
+        return _saturated(e)
+    except Exception as e:
+        logger.error(f"Error processing image: {str(e)}", exc_info=True)
+        return JsonResponse({'error': f'Error processing image: {str(e)}'}, status=500)
+
+    payload, status_code = detection_response_data(result, found_key)
+    return JsonResponse(payload, status=status_code)
+
+
+def _request_data(request):
+    # Roughly DRF's request.data for the JSON and form bodies these views take
+    if request.content_type != 'application/json':
+        return request.POST
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        return None
+
+
+@async_upload
+async def detect_food(request):
+    if 'image' not in request.FILES:
+        return JsonResponse({'error': 'No image provided'}, status=400)
+    return await _detect(request.FILES['image'].read(), 'detected_foods')
+
+
+@async_upload
+async def detect_food_base64(request):
+    # Same contract as FoodDetectionViewSet.detect_food: {"image": <base64>}
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    image_bytes, error = base64_upload(data)
+    if error:
+        return JsonResponse(error[0], status=error[1])
+    return await _detect(image_bytes, 'results')
+
+
+@async_upload
+async def detect_food_batch(request):
+    uploads, error = batch_uploads(request.FILES, _request_data(request))
+    if error:
+        return JsonResponse(error[0], status=error[1])
+
+    try:
+        results = await _run_admitted(len(uploads), detect_foods_in_uploads, uploads, pass_release=True)
+    except SchedulerSaturated as e:
+        return _saturated(e)
+    except Exception as e:
+        logger.error(f"Error processing images: {str(e)}", exc_info=True)
+        return JsonResponse({'error': f'Error processing images: {str(e)}'}, status=500)
+    return JsonResponse(batch_response_data(results))
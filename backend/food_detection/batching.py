@@ -0,0 +1,217 @@
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import numpy as np
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250)
+BATCH_MS_BUCKETS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+# Seconds between checks, while collecting a batch, for whether more images
+# can still arrive
+EXPECTING_POLL = 0.001
+
+
+class SchedulerSaturated(Exception):
+    """Raised instead of queueing when the admission queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class WorkerStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.batches = 0
+        self.images = 0
+        self.busy_seconds = 0.0
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'batches': self.batches,
+            'images': self.images,
+            'busy_seconds': self.busy_seconds,
+            'utilization': self.busy_seconds / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class BatchScheduler:
+    """Groups single preprocessed images into batches for one forward pass.
+
+    Requests call ``submit`` with an image of shape (H, W, C) and block until
+    one of the ``workers`` inference threads has run the batch that image
+    ended up in. A batch is dispatched as soon as it holds ``max_batch_size``
+    images, the oldest image has waited ``max_wait_ms`` milliseconds, or,
+    when requests go through ``admit``, every admitted image not already
+    running is in it, so a lone request never waits for batch-mates.
+
+    At most ``max_pending`` images are admitted at once (0 means unbounded).
+    Requests take their slots with ``admit`` before any work and give them
+    back once their results are ready, so uploads still waiting for a request
+    thread or executor count too; beyond the limit SchedulerSaturated is
+    raised straight away, so callers can shed load instead of queueing
+    behind slow images. Slots of images that will never be submitted have to
+    be given back as soon as that is known, or batches wait ``max_wait_ms``
+    for them.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=5, workers=1, max_pending=0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.workers = max(1, int(workers))
+        self.max_pending = max(0, int(max_pending))
+        self.rejected = 0
+        self.in_flight = 0
+        self._running = 0
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self.batch_ms = Histogram(BATCH_MS_BUCKETS)
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._threads = []
+        self._worker_stats = {}
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self):
+        # Started lazily so forked workers each get their own threads
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                name = f'detection-worker-{len(self._threads)}'
+                stats = self._worker_stats[name] = WorkerStats()
+                thread = threading.Thread(
+                    target=self._run, args=(stats,), name=name, daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def retry_after(self):
+        # Seconds until the current backlog should have drained
+        batch_seconds = (self.batch_ms.snapshot()['mean'] or 0.0) / 1000.0
+        batches = max(self.in_flight, self._queue.qsize()) / (self.max_batch_size * self.workers)
+        return max(1, math.ceil(batches * batch_seconds))
+
+    def admit(self, images=1):
+        """Reserves ``images`` of the ``max_pending`` slots and returns a
+        function giving them back, or raises SchedulerSaturated when full.
+
+        Called with no argument the function gives back every slot still
+        held; with a count, only that many, so a request can free the slots
+        of images it turns out not to submit (or whose batch has already
+        run) while it works on the rest. A request larger than the whole
+        limit is still let through while nothing else is in flight.
+        """
+        with self._lock:
+            if self.max_pending and self.in_flight and self.in_flight + images > self.max_pending:
+                self.rejected += 1
+                raise SchedulerSaturated(self.retry_after())
+            self.in_flight += images
+
+        held = [images]
+
+        def release(count=None):
+            with self._lock:
+                count = held[0] if count is None else min(count, held[0])
+                held[0] -= count
+                self.in_flight -= count
+
+        return release
+
+    @contextmanager
+    def admission(self, images=1):
+        release = self.admit(images)
+        try:
+            yield release
+        finally:
+            release()
+
+    def submit_async(self, image):
+        self._ensure_workers()
+        future = Future()
+        try:
+            self._queue.put_nowait((image, future, time.perf_counter()))
+        except queue.Full:
+            self.rejected += 1
+            raise SchedulerSaturated(self.retry_after())
+        return future
+
+    def submit(self, image, timeout=None):
+        return self.submit_async(image).result(timeout=timeout)
+
+    def _expecting_more(self, collected):
+        # Whether admitted images that are neither in this batch nor already
+        # being run may still be submitted; without admission, assume so
+        with self._lock:
+            return not self.in_flight or self.in_flight - self._running - collected > 0
+
+    def _collect(self):
+        items = [self._queue.get()]
+        deadline = items[0][2] + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0 or not self._expecting_more(len(items)):
+                    # Nobody else can join, so don't wait for batch-mates
+                    items.append(self._queue.get_nowait())
+                else:
+                    items.append(self._queue.get(timeout=min(remaining, EXPECTING_POLL)))
+            except queue.Empty:
+                if remaining <= 0 or not self._expecting_more(len(items)):
+                    break
+        with self._lock:
+            self._running += len(items)
+        return items
+
+    def _run(self, stats):
+        while True:
+            items = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued in items:
+                self.queue_wait_ms.observe((started - enqueued) * 1000.0)
+            self.batch_sizes.observe(len(items))
+
+            try:
+                batch = np.stack([image for image, _, _ in items])
+                predictions = self.predict_fn(batch)
+            except Exception as e:
+                logger.error(f"Batched inference failed: {str(e)}", exc_info=True)
+                for _, future, _ in items:
+                    future.set_exception(e)
+                continue
+            finally:
+                with self._lock:
+                    self._running -= len(items)
+                elapsed = time.perf_counter() - started
+                stats.batches += 1
+                stats.images += len(items)
+                stats.busy_seconds += elapsed
+                self.batch_ms.observe(elapsed * 1000.0)
+
+            for (_, future, _), prediction in zip(items, predictions):
+                future.set_result(prediction)
+
+    def stats(self):
+        with self._lock:
+            workers = dict(self._worker_stats)
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'pending': self._queue.qsize(),
+            'in_flight': self.in_flight,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_ms': self.queue_wait_ms.snapshot(),
+            'batch_ms': self.batch_ms.snapshot(),
+            'workers': {name: stats.snapshot() for name, stats in workers.items()},
+        }
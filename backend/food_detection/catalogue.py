@@ -0,0 +1,172 @@
+import logging
+import sys
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a new snapshot listener's first update before reading directly
+LISTENER_TIMEOUT = 10
+
+CatalogueSnapshot = namedtuple('CatalogueSnapshot', [
+    'version', 'foods', 'by_id', 'by_name', 'by_category', 'loaded_at', 'load_seconds', 'nbytes',
+])
+
+
+def _deep_size(value, seen=None):
+    # Rough in-memory size of the snapshot: containers, their items and the
+    # attributes of the food objects, each object counted once
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (dict, MappingProxyType)):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(item, seen) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += _deep_size(vars(value), seen)
+    return size
+
+
+def build_snapshot(version, foods, load_seconds=0.0):
+    foods = tuple(sorted(foods, key=lambda food: ((food.name or '').lower(), str(food.id))))
+    by_category = {}
+    for food in foods:
+        by_category.setdefault(food.category, []).append(food)
+    snapshot = CatalogueSnapshot(
+        version=version,
+        foods=foods,
+        by_id=MappingProxyType({food.id: food for food in foods}),
+        by_name=MappingProxyType({(food.name or '').lower(): food for food in foods}),
+        by_category=MappingProxyType({category: tuple(items) for category, items in by_category.items()}),
+        loaded_at=time.time(),
+        load_seconds=load_seconds,
+        nbytes=0,
+    )
+    return snapshot._replace(nbytes=_deep_size(snapshot))
+
+
+class FoodCatalogueCache:
+    """Immutable, versioned in-memory copy of the Firestore food catalogue.
+
+    The whole ``foods`` collection is loaded once and indexed by id, lower
+    case name and category, so lists and filters cost no Firestore reads.
+    With ``listen`` a snapshot listener swaps in a new version whenever the
+    collection changes; otherwise (or if the listener dies) the copy is
+    reloaded after ``ttl`` seconds, by one caller while the others keep
+    serving the previous version.
+    """
+
+    def __init__(self, collection, factory, ttl=300, listen=False):
+        self.collection = collection
+        self.factory = factory
+        self.ttl = ttl
+        self.listen = listen
+        self.hits = 0
+        self.loads = 0
+        self.listener_updates = 0
+        self._snapshot = None
+        self._version = 0
+        self._watch = None
+        self._first_update = threading.Event()
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def _from_documents(self, documents, started):
+        foods = [self.factory({**doc.to_dict(), 'id': doc.id}) for doc in documents]
+        with self._lock:
+            self._version += 1
+            snapshot = build_snapshot(self._version, foods, time.perf_counter() - started)
+            self._snapshot = snapshot
+        logger.info(
+            f"Food catalogue v{snapshot.version}: {len(snapshot.foods)} foods, "
+            f"{snapshot.nbytes / 1024:.0f} KiB, built in {snapshot.load_seconds * 1000:.1f}ms"
+        )
+        return snapshot
+
+    def _on_snapshot(self, documents, changes, read_time):
+        # Runs on the listener's thread with the full collection each time
+        self.listener_updates += 1
+        self._from_documents(documents, time.perf_counter())
+        self._first_update.set()
+
+    def _start_listener(self):
+        try:
+            self._watch = self.collection().on_snapshot(self._on_snapshot)
+        except Exception as e:
+            logger.error(f"Food catalogue listener unavailable, using the TTL: {str(e)}")
+            self.listen = False
+
+    def _listening(self):
+        if self._watch is None:
+            return False
+        if getattr(self._watch, 'is_active', True):
+            return True
+        logger.warning('Food catalogue listener stopped, falling back to the TTL')
+        self._watch = None
+        self.listen = False
+        return False
+
+    def _fresh(self, snapshot):
+        if snapshot is None:
+            return False
+        return self._listening() or time.time() - snapshot.loaded_at < self.ttl
+
+    def current(self):
+        """The snapshot if it can be served as is, else None."""
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            self.hits += 1
+            return snapshot
+        return None
+
+    def load(self):
+        """Returns a usable snapshot, reading Firestore if needed (blocking)."""
+        snapshot = self.current()
+        if snapshot is not None:
+            return snapshot
+        if not self._reload_lock.acquire(blocking=self._snapshot is None):
+            # Someone else is reloading; the expired copy is good enough meanwhile
+            self.hits += 1
+            return self._snapshot
+        try:
+            snapshot = self._snapshot
+            if self._fresh(snapshot):
+                return snapshot
+            if self.listen and self._watch is None:
+                self._start_listener()
+                # The listener's first update carries the whole collection
+                if self._watch is not None and self._first_update.wait(LISTENER_TIMEOUT):
+                    return self._snapshot
+            started = time.perf_counter()
+            self.loads += 1
+            return self._from_documents(self.collection().stream(), started)
+        finally:
+            self._reload_lock.release()
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def stats(self):
+        snapshot = self._snapshot
+        stats = {
+            'version': self._version,
+            'source': 'listener' if self._watch is not None else 'ttl',
+            'hits': self.hits,
+            'loads': self.loads,
+            'listener_updates': self.listener_updates,
+        }
+        if snapshot is not None:
+            stats.update({
+                'foods': len(snapshot.foods),
+                'categories': len(snapshot.by_category),
+                'bytes': snapshot.nbytes,
+                'age_seconds': time.time() - snapshot.loaded_at,
+                'load_ms': snapshot.load_seconds * 1000.0,
+            })
+        return stats
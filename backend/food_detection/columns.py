@@ -0,0 +1,249 @@
+"""Read-only, array-backed copy of the Food catalogue.
+
+Nutrients live in one NumPy structured array sorted by food id, names in a
+single UTF-8 blob with offsets and categories in a small interned table. The
+arrays are written to one file and memory-mapped read-only, so every worker
+on a host shares the same pages, and filters run as vectorized masks instead
+of SQL queries or model instances.
+"""
+import json
+import logging
+import os
+import struct
+import threading
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HMFOODS2'
+ALIGNMENT = 64
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+
+FOOD_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('category', '<i4'),
+    ('calories', '<f4'),
+    ('protein', '<f4'),
+    ('carbs', '<f4'),
+    ('fat', '<f4'),
+    # NaN for per-serving values of unknown weight
+    ('basis_grams', '<f4'),
+])
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_columns(path, rows):
+    """Writes (id, name, category, calories, protein, carbs, fat, basis_grams) rows.
+
+    The file is written next to ``path`` and renamed over it, so workers
+    that have the old file mapped keep reading a consistent copy.
+    """
+    rows = sorted(rows, key=lambda row: row[0])
+    categories = {}
+    records = np.empty(len(rows), dtype=FOOD_DTYPE)
+    name_offsets = np.zeros(len(rows) + 1, dtype='<i8')
+    encoded = []
+    position = 0
+    for i, (food_id, name, category, calories, protein, carbs, fat, basis_grams) in enumerate(rows):
+        records[i] = (food_id, categories.setdefault(category, len(categories)),
+                      calories, protein, carbs, fat, np.nan if basis_grams is None else basis_grams)
+        data = (name or '').encode()
+        encoded.append(data)
+        position += len(data)
+        name_offsets[i + 1] = position
+    names = np.frombuffer(b''.join(encoded), dtype='u1')
+
+    arrays = {'records': records, 'name_offsets': name_offsets, 'names': names}
+    header = {'count': len(rows), 'categories': list(categories), 'arrays': {}}
+    # The header records the array offsets, which depend on its own length
+    start = 0
+    while True:
+        offset = start
+        for key, array in arrays.items():
+            dtype = array.dtype.descr if array.dtype.names else array.dtype.str
+            header['arrays'][key] = {'offset': offset, 'dtype': dtype, 'shape': list(array.shape)}
+            offset = _aligned(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode()
+        if len(MAGIC) + 4 + len(header_bytes) <= start:
+            break
+        start = _aligned(len(MAGIC) + 4 + len(header_bytes) + ALIGNMENT)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        for key, array in arrays.items():
+            f.seek(header['arrays'][key]['offset'])
+            f.write(array.tobytes())
+        f.truncate(offset)
+    os.replace(tmp_path, path)
+
+
+def _descr(descr):
+    # JSON turns the (name, format) tuples into lists
+    return np.dtype([tuple(field) for field in descr]) if isinstance(descr, list) else np.dtype(descr)
+
+
+class FoodColumns:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a food catalogue file")
+            (length,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(length))
+        self.categories = tuple(header['categories'])
+        self.category_ids = {category: i for i, category in enumerate(self.categories)}
+        arrays = {}
+        for key, spec in header['arrays'].items():
+            shape = tuple(spec['shape'])
+            if not np.prod(shape):
+                arrays[key] = np.empty(shape, dtype=_descr(spec['dtype']))
+                continue
+            arrays[key] = np.memmap(path, dtype=_descr(spec['dtype']), mode='r',
+                                    offset=spec['offset'], shape=shape)
+        self.records = arrays['records']
+        self._name_offsets = arrays['name_offsets']
+        self._names = arrays['names']
+        self.ids = self.records['id']
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes + self._name_offsets.nbytes + self._names.nbytes
+
+    def name(self, index):
+        start, end = self._name_offsets[index], self._name_offsets[index + 1]
+        return bytes(self._names[start:end]).decode()
+
+    def positions(self, food_ids):
+        """Row positions of ``food_ids`` and a mask of the ids that exist."""
+        food_ids = np.asarray(food_ids, dtype='<i8')
+        positions = np.searchsorted(self.ids, food_ids)
+        positions = np.minimum(positions, max(len(self.ids) - 1, 0))
+        found = self.ids[positions] == food_ids if len(self.ids) else np.zeros(len(food_ids), dtype=bool)
+        return positions, found
+
+    def mask(self, categories=None, ranges=None):
+        """Rows in any of ``categories`` whose values fall in ``ranges``:
+        {column: (min, max)} over NUTRIENTS and per-100 kcal values such as
+        'protein_per_100kcal', either bound None for open-ended."""
+        mask = np.ones(len(self.records), dtype=bool)
+        if categories:
+            codes = [self.category_ids[category] for category in categories if category in self.category_ids]
+            mask &= np.isin(self.records['category'], codes)
+        for column, (low, high) in (ranges or {}).items():
+            values = self._values(column)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return mask
+
+    def _values(self, column):
+        if column in NUTRIENTS:
+            return self.records[column]
+        nutrient, _, unit = column.partition('_per_')
+        if unit != '100kcal' or nutrient not in NUTRIENTS:
+            raise ValueError(f"Unknown column {column}")
+        calories = self.records['calories']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Foods without calories never match a per-calorie bound
+            return np.where(calories > 0, self.records[nutrient] * 100.0 / calories, np.nan)
+
+    def rows(self, indices):
+        """Rows at the given positions (e.g. np.flatnonzero of a mask) as dicts."""
+        records = self.records[indices]
+        return [
+            {
+                'id': int(record['id']),
+                'name': self.name(index),
+                'category': self.categories[record['category']],
+                'calories': float(record['calories']),
+                'protein': float(record['protein']),
+                'carbs': float(record['carbs']),
+                'fat': float(record['fat']),
+                'basis_grams': None if np.isnan(record['basis_grams']) else float(record['basis_grams']),
+            }
+            for index, record in zip(np.asarray(indices).tolist(), records)
+        ]
+
+
+def build_columns(path):
+    from .models import Food
+
+    rows = Food.objects.values_list('id', 'name', 'category', 'calories', 'protein', 'carbs', 'fat', 'basis_grams')
+    write_columns(path, rows.iterator(chunk_size=10000))
+
+
+class FoodColumnsCache:
+    """The mapped catalogue file, rebuilt after Food data changes.
+
+    Invalidating deletes the file, so whichever process looks next (they
+    all stat it on every lookup) rebuilds it and the others map the new copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._columns = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _mtime_now(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self):
+        columns = self._columns
+        if columns is not None and self._mtime_now() == self._mtime:
+            return columns
+        with self._lock:
+            mtime = self._mtime_now()
+            if self._columns is None or mtime != self._mtime:
+                if mtime is None:
+                    mtime = self._build()
+                try:
+                    columns = FoodColumns(self.path)
+                except ValueError:
+                    # Written by a version with another file format
+                    mtime = self._build()
+                    columns = FoodColumns(self.path)
+                self._columns = columns
+                self._mtime = mtime
+            return self._columns
+
+    def _build(self):
+        build_columns(self.path)
+        logger.info(f"Built food catalogue columns at {self.path}")
+        return self._mtime_now()
+
+    def invalidate(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        columns = self._columns
+        if columns is None:
+            return {'foods': None, 'path': str(self.path)}
+        return {
+            'foods': len(columns),
+            'categories': len(columns.categories),
+            'bytes': columns.nbytes,
+            'path': str(self.path),
+        }
+
+
+food_columns = FoodColumnsCache(
+    getattr(settings, 'FOOD_COLUMNS_PATH', settings.BASE_DIR / 'models' / 'food_columns.bin')
+)
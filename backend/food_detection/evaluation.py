@@ -0,0 +1,61 @@
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .preprocessing import decode_image, preprocess_image
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+
+def load_fixture_images(directory):
+    """Returns the preprocessed images found in ``directory`` as one batch."""
+    paths = sorted(
+        p for p in Path(directory).rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES
+    )
+    images = []
+    for path in paths:
+        image = decode_image(path.read_bytes())
+        if image is not None:
+            images.append(preprocess_image(image))
+    if not images:
+        raise ValueError(f"No readable images found in {directory}")
+    return np.stack(images).astype(np.float32)
+
+
+def _timed_predictions(engine, images):
+    outputs, timings = [], []
+    for image in images:
+        started = time.perf_counter()
+        outputs.append(engine.predict(image[np.newaxis])[0])
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return np.stack(outputs), np.asarray(timings)
+
+
+def compare_engines(reference, candidate, images, top=5):
+    """Accuracy of ``candidate`` against ``reference`` plus per-image latency.
+
+    Agreement is measured against the reference model's own predictions, so
+    the fixture set does not need labels.
+    """
+    reference.predict(images[:1])
+    candidate.predict(images[:1])
+    ref_out, ref_ms = _timed_predictions(reference, images)
+    cand_out, cand_ms = _timed_predictions(candidate, images)
+
+    ref_top = np.argsort(ref_out, axis=1)[:, -top:]
+    cand_top = np.argsort(cand_out, axis=1)[:, -top:]
+    overlap = [len(set(r) & set(c)) / top for r, c in zip(ref_top, cand_top)]
+
+    def latency(timings):
+        p50, p99 = np.percentile(timings, [50, 99])
+        return {'p50_ms': float(p50), 'p99_ms': float(p99), 'mean_ms': float(timings.mean())}
+
+    return {
+        'images': len(images),
+        'top1_agreement': float(np.mean(ref_top[:, -1] == cand_top[:, -1])),
+        f'top{top}_overlap': float(np.mean(overlap)),
+        'max_abs_prob_error': float(np.max(np.abs(ref_out - cand_out))),
+        'reference': {'engine': reference.name, **latency(ref_ms)},
+        'candidate': {'engine': candidate.name, **latency(cand_ms)},
+    }
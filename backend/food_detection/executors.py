@@ -0,0 +1,23 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# Blocking work reached from async views runs on these bounded pools, so the
+# event loop keeps accepting requests while uploads wait for inference
+inference_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'DETECTION_ASYNC_INFERENCE_THREADS', 16),
+    thread_name_prefix='detect-async',
+)
+
+# The Firestore client is synchronous; its calls are run here instead
+firestore_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'FIRESTORE_EXECUTOR_THREADS', 8),
+    thread_name_prefix='firestore',
+)
+
+
+async def run_in_executor(executor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,163 @@
+"""Mirrors the SQL ``Food`` catalogue into the Firestore ``foods`` collection.
+
+Documents are keyed by the Food primary key and written with batched,
+merge-mode sets of up to 500 operations, several batches committing at once.
+The content hash of every document sent is recorded in a local state file
+after its batch commits, so a later run (or a run resumed after a failure)
+only sends foods that changed since.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+FOODS_COLLECTION = 'foods'
+# Firestore's limit on writes per commit
+MAX_BATCH_WRITES = 500
+FOOD_FIELDS = ('name', 'category', 'calories', 'protein', 'carbs', 'fat', 'image_url', 'food_class')
+
+
+def food_document(food):
+    """The Firestore fields of a Food row (or of a row's values dict)."""
+    if isinstance(food, dict):
+        return {field: food.get(field) for field in FOOD_FIELDS}
+    return {field: getattr(food, field) for field in FOOD_FIELDS}
+
+
+def content_hash(document):
+    data = json.dumps([document.get(field) for field in FOOD_FIELDS], separators=(',', ':'))
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+class FoodSyncState:
+    """{document id: content hash} as last committed, saved as JSON."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.hashes = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.hashes = json.load(f).get('hashes', {})
+
+    def update(self, hashes, removed=()):
+        with self._lock:
+            self.hashes.update(hashes)
+            for doc_id in removed:
+                self.hashes.pop(doc_id, None)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps({'collection': FOODS_COLLECTION, 'hashes': self.hashes})
+        # Written to a temporary file first so a crash never leaves half a checkpoint
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+class FoodCatalogueSync:
+    def __init__(self, db, state, batch_size=MAX_BATCH_WRITES, parallelism=4):
+        if not 1 <= batch_size <= MAX_BATCH_WRITES:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_WRITES}")
+        self.db = db
+        self.state = state
+        self.batch_size = batch_size
+        self.parallelism = parallelism
+
+    def refresh_state(self):
+        """Rebuilds the state from the documents in Firestore, e.g. when the
+        state file was lost; costs one read per document."""
+        query = self.db.collection(FOODS_COLLECTION).select(list(FOOD_FIELDS))
+        hashes = {doc.id: content_hash(food_document(doc.to_dict())) for doc in query.stream()}
+        self.state.hashes = {}
+        self.state.update(hashes)
+        self.state.save()
+        return len(hashes)
+
+    def plan(self, foods, prune=False):
+        """(document id -> fields to write, document ids to delete)."""
+        writes = {}
+        seen = set()
+        for food in foods:
+            doc_id = str(food['id'] if isinstance(food, dict) else food.pk)
+            seen.add(doc_id)
+            document = food_document(food)
+            if self.state.hashes.get(doc_id) != content_hash(document):
+                writes[doc_id] = document
+        deletes = [doc_id for doc_id in self.state.hashes if doc_id not in seen] if prune else []
+        return writes, deletes
+
+    def _commit(self, operations):
+        collection = self.db.collection(FOODS_COLLECTION)
+        batch = self.db.batch()
+        hashes = {}
+        removed = []
+        for doc_id, document in operations:
+            if document is None:
+                batch.delete(collection.document(doc_id))
+                removed.append(doc_id)
+            else:
+                batch.set(collection.document(doc_id),
+                          {**document, 'updated_at': firestore.SERVER_TIMESTAMP}, merge=True)
+                hashes[doc_id] = content_hash(document)
+        batch.commit()
+        return hashes, removed
+
+    def _batches(self, writes, deletes):
+        operations = list(writes.items()) + [(doc_id, None) for doc_id in deletes]
+        for start in range(0, len(operations), self.batch_size):
+            yield operations[start:start + self.batch_size]
+
+    def run(self, foods, prune=False, dry_run=False):
+        started = time.perf_counter()
+        writes, deletes = self.plan(foods, prune=prune)
+        result = {
+            'changed': len(writes),
+            'deleted': len(deletes),
+            'batches': 0,
+            'seconds': 0.0,
+        }
+        if dry_run or not (writes or deletes):
+            result['seconds'] = time.perf_counter() - started
+            return result
+
+        pending = set()
+        error = None
+        with ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix='firestore-sync') as pool:
+            batches = self._batches(writes, deletes)
+            while True:
+                # At most `parallelism` commits in flight
+                while error is None and len(pending) < self.parallelism:
+                    operations = next(batches, None)
+                    if operations is None:
+                        break
+                    pending.add(pool.submit(self._commit, operations))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        hashes, removed = future.result()
+                    except Exception as e:
+                        # Let the commits in flight finish; everything
+                        # committed so far is checkpointed for the next run
+                        logger.error(f"Firestore food sync batch failed: {str(e)}")
+                        error = error or e
+                        continue
+                    self.state.update(hashes, removed)
+                    result['batches'] += 1
+                self.state.save()
+        if error is not None:
+            raise error
+        result['seconds'] = time.perf_counter() - started
+        return result
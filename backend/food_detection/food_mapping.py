@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import CatalogueVersion, ClassLabelMapping
+
+FoodMatch = namedtuple('FoodMatch', ['food_id', 'name', 'calories', 'protein', 'carbs', 'fat'])
+
+
+def load_food_mapping():
+    rows = ClassLabelMapping.objects.values_list(
+        'class_id', 'food_id', 'food__name', 'food__calories',
+        'food__protein', 'food__carbs', 'food__fat',
+    )
+    return MappingProxyType({row[0]: FoodMatch(*row[1:]) for row in rows})
+
+
+class CatalogueVersionCache:
+    """The CatalogueVersion row, re-read at most once every ``ttl`` seconds.
+
+    Keeps the query off the detection hot path; the process that bumps the
+    version drops its copy once the bump commits.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.reads = 0
+        self._version = None
+        self._expires = 0.0
+
+    def get(self):
+        version = self._version
+        if version is not None and time.monotonic() < self._expires:
+            return version
+        version = CatalogueVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+        self.reads += 1
+        self._version, self._expires = version, time.monotonic() + self.ttl
+        return version
+
+    def invalidate(self):
+        self._version = None
+
+
+version_cache = CatalogueVersionCache(getattr(settings, 'CATALOGUE_VERSION_TTL', 1.0))
+
+
+def catalogue_version():
+    return version_cache.get()
+
+
+def bump_catalogue_version():
+    # Runs inside the writer's transaction, so readers see the new version
+    # only together with the data it describes
+    transaction.on_commit(version_cache.invalidate)
+    while not CatalogueVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        _, created = CatalogueVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+        if created:
+            return
+
+
+class FoodMappingCache:
+    """Immutable class id -> FoodMatch dict, rebuilt when Food data changes.
+
+    Writes to Food or ClassLabelMapping bump the CatalogueVersion row, which
+    every process compares with the version its copy was loaded at (read
+    through ``version_cache``, so other processes notice within its TTL); the
+    local flag covers the process that made the write.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._mapping = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        version = catalogue_version()
+        mapping = self._mapping
+        if mapping is not None and version == self._version:
+            return mapping
+        with self._lock:
+            if self._mapping is None or version != self._version:
+                self._mapping = self.loader()
+                self._version = version
+            return self._mapping
+
+    def invalidate(self):
+        with self._lock:
+            self._mapping = None
+        bump_catalogue_version()
+
+
+food_mapping = FoodMappingCache(load_food_mapping)
+
+
+def invalidate_food_mapping(sender=None, **kwargs):
+    food_mapping.invalidate()
+    # The columnar copy is rebuilt by the next process that reads it, so it
+    # must only go once the change is visible to that process
+    from .columns import food_columns
+    transaction.on_commit(food_columns.invalidate)
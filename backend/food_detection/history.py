@@ -0,0 +1,239 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import IntegrityError
+
+from nutrition.firebase import get_db
+
+from .models import DetectionHistory, FirestoreDetectionHistory
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects write batches with more than 500 operations
+FIRESTORE_MAX_BATCH = 500
+# Seconds before retrying after a failed flush, doubled per consecutive failure
+FLUSH_RETRY_MIN = 0.5
+FLUSH_RETRY_MAX = 60.0
+
+
+class WriteBehindBuffer:
+    """Collects events in memory and writes them in bulk.
+
+    A flush is triggered once ``max_batch`` events are pending or the oldest
+    pending event is ``flush_interval`` seconds old. In 'thread' mode a
+    background thread performs the flush; in 'request' mode it happens in the
+    request_finished signal of whichever request crosses a trigger. Pending
+    events are flushed at interpreter shutdown.
+
+    Loss is bounded by ``max_pending``: once that many events are waiting,
+    new ones are dropped and counted instead of growing memory without limit.
+    A failed flush puts its events back, subject to the same bound, and the
+    next attempt is delayed with exponential backoff. A batch failing with
+    one of the ``reject_errors`` (bad data rather than an unavailable
+    backend) is instead written event by event, and the events that still
+    fail are dropped and counted as rejected so they can't hold up the rest.
+    """
+
+    def __init__(self, flush_fn, name, max_batch=100, flush_interval=1.0,
+                 max_pending=10000, mode='thread', reject_errors=()):
+        self.flush_fn = flush_fn
+        self.name = name
+        self.max_batch = max(1, int(max_batch))
+        self.flush_interval = float(flush_interval)
+        self.max_pending = max(self.max_batch, int(max_pending))
+        self.mode = mode
+        self.reject_errors = tuple(reject_errors)
+        self.flushed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.flush_errors = 0
+        self._retry_delay = 0.0
+        self._retry_at = None
+        self._events = deque()
+        self._oldest = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+    @property
+    def pending(self):
+        return len(self._events)
+
+    def add(self, event):
+        with self._condition:
+            if len(self._events) >= self.max_pending:
+                self.dropped += 1
+                return False
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.append(event)
+            if len(self._events) >= self.max_batch:
+                self._condition.notify()
+        if self.mode == 'thread':
+            self._ensure_worker()
+        return True
+
+    def should_flush(self):
+        retry_at = self._retry_at
+        if retry_at is not None and time.monotonic() < retry_at:
+            return False
+        oldest = self._oldest
+        return len(self._events) >= self.max_batch or (
+            oldest is not None and time.monotonic() - oldest >= self.flush_interval
+        )
+
+    def flush(self):
+        # One flusher at a time so batches are written in order
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    if not self._events:
+                        self._oldest = None
+                        return
+                    batch = [self._events.popleft()
+                             for _ in range(min(self.max_batch, len(self._events)))]
+                    self._oldest = time.monotonic() if self._events else None
+                try:
+                    self.flush_fn(batch)
+                    self.flushed += len(batch)
+                except self.reject_errors as e:
+                    logger.warning(f"Writing {len(batch)} {self.name} events one by one: {str(e)}")
+                    if not self._flush_each(batch):
+                        return
+                except Exception as e:
+                    self._failed(batch, e)
+                    return
+                self._retry_delay = 0.0
+                self._retry_at = None
+
+    def _flush_each(self, batch):
+        for index, event in enumerate(batch):
+            try:
+                self.flush_fn([event])
+                self.flushed += 1
+            except self.reject_errors as e:
+                self.rejected += 1
+                logger.error(f"Dropped {self.name} event {event!r}: {str(e)}")
+            except Exception as e:
+                self._failed(batch[index:], e)
+                return False
+        return True
+
+    def _failed(self, batch, error):
+        self.flush_errors += 1
+        self._retry_delay = min(FLUSH_RETRY_MAX, max(FLUSH_RETRY_MIN, self._retry_delay * 2))
+        self._retry_at = time.monotonic() + self._retry_delay
+        logger.error(
+            f"Failed to flush {len(batch)} {self.name} events, retrying in "
+            f"{self._retry_delay:.1f}s: {str(error)}"
+        )
+        self._requeue(batch)
+
+    def _requeue(self, batch):
+        with self._condition:
+            room = self.max_pending - len(self._events)
+            kept = batch[:max(0, room)]
+            self.dropped += len(batch) - len(kept)
+            self._events.extendleft(reversed(kept))
+            if self._events and self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def _ensure_worker(self):
+        # Started lazily so forked workers each get their own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f'{self.name}-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            with self._condition:
+                timeout = self.flush_interval
+                if self._retry_at is not None:
+                    # Nothing is due before the backoff ends
+                    timeout = max(0.01, self._retry_at - time.monotonic())
+                self._condition.wait_for(self.should_flush, timeout=timeout)
+            if self.should_flush():
+                self.flush()
+
+    def flush_if_due(self, **kwargs):
+        if self.should_flush():
+            self.flush()
+
+    def stop(self):
+        self._stopped = True
+        with self._condition:
+            self._condition.notify_all()
+        # Last chance to write, whatever the backoff says
+        self._retry_at = None
+        self.flush()
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'pending': self.pending,
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'flush_errors': self.flush_errors,
+            'retry_in': max(0.0, self._retry_at - time.monotonic()) if self._retry_at is not None else 0.0,
+            'max_batch': self.max_batch,
+            'max_pending': self.max_pending,
+        }
+
+
+def _bulk_create_detections(events):
+    DetectionHistory.objects.bulk_create(
+        [DetectionHistory(food_id=food_id, confidence=confidence) for food_id, confidence in events]
+    )
+
+
+def _commit_firestore_batches(events):
+    # events are (DocumentReference, data) pairs
+    for start in range(0, len(events), FIRESTORE_MAX_BATCH):
+        batch = get_db().batch()
+        for doc_ref, data in events[start:start + FIRESTORE_MAX_BATCH]:
+            batch.set(doc_ref, data)
+        batch.commit()
+
+
+def _make_buffer(flush_fn, name, reject_errors=()):
+    buffer = WriteBehindBuffer(
+        flush_fn,
+        name,
+        max_batch=getattr(settings, 'DETECTION_HISTORY_BATCH_SIZE', 100),
+        flush_interval=getattr(settings, 'DETECTION_HISTORY_FLUSH_INTERVAL', 1.0),
+        max_pending=getattr(settings, 'DETECTION_HISTORY_MAX_PENDING', 10000),
+        mode=getattr(settings, 'DETECTION_HISTORY_FLUSH_MODE', 'thread'),
+        reject_errors=reject_errors,
+    )
+    if buffer.mode == 'request':
+        request_finished.connect(buffer.flush_if_due, weak=False, dispatch_uid=f'{name}_flush')
+    atexit.register(buffer.stop)
+    return buffer
+
+
+# A Food deleted before the flush fails its rows' foreign key
+history_buffer = _make_buffer(_bulk_create_detections, 'detection-history', reject_errors=(IntegrityError,))
+firestore_history_buffer = _make_buffer(_commit_firestore_batches, 'firestore-detection-history')
+
+
+def record_detection(food_id, confidence, firestore=False):
+    # Written to wherever the history is listed from
+    if firestore:
+        detection = FirestoreDetectionHistory(
+            food_id=food_id, confidence=confidence, detected_at=datetime.now(timezone.utc)
+        )
+        return detection.queue()
+    return history_buffer.add((food_id, confidence))
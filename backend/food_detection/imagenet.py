@@ -0,0 +1,71 @@
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+# Same file keras' decode_predictions downloads and caches
+CLASS_INDEX_URL = (
+    'https://storage.googleapis.com/download.tensorflow.org/'
+    'data/imagenet_class_index.json'
+)
+NUM_CLASSES = 1000
+
+# Define non-food classes that might be detected
+NON_FOOD_CLASSES = [
+    'person', 'human', 'face', 'dog', 'cat', 'bird', 'car', 'truck', 'bus',
+    'chair', 'table', 'laptop', 'computer', 'phone', 'book', 'pen', 'pencil',
+    'desk', 'bed', 'sofa', 'couch', 'television', 'tv', 'monitor', 'keyboard',
+    'mouse', 'door', 'window', 'wall', 'floor', 'ceiling', 'light', 'lamp',
+    'clock', 'watch', 'shoe', 'boot', 'sock', 'shirt', 'pants', 'dress', 'hat',
+    'glasses', 'sunglasses', 'bag', 'backpack', 'purse', 'wallet', 'key', 'lock',
+    'bottle', 'cup', 'glass', 'bowl', 'plate', 'fork', 'spoon', 'knife'
+]
+
+
+def load_class_index():
+    # A local copy avoids importing TensorFlow (e.g. on tflite_runtime workers)
+    path = getattr(settings, 'DETECTION_IMAGENET_CLASS_INDEX', None)
+    if not path or not Path(path).exists():
+        import tensorflow as tf
+        path = tf.keras.utils.get_file(
+            'imagenet_class_index.json',
+            CLASS_INDEX_URL,
+            cache_subdir='models',
+            file_hash='c2c37ea517e94d9795004a39431a14cb',
+        )
+    with open(path) as f:
+        class_index = json.load(f)
+    return [class_index[str(i)] for i in range(NUM_CLASSES)]
+
+
+class ClassTable:
+    """ImageNet class metadata as arrays indexed by class id."""
+
+    def __init__(self, class_index):
+        self.wnids = np.array([wnid for wnid, _ in class_index])
+        self.names = np.array([name for _, name in class_index])
+        non_food = set(NON_FOOD_CLASSES)
+        self.non_food_mask = np.array(
+            [name.lower() in non_food for name in self.names], dtype=bool
+        )
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_class_table():
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = ClassTable(load_class_index())
+    return _table
+
+
+def top_k(probabilities, k=5):
+    """Indices of the k largest probabilities, highest first."""
+    top = np.argpartition(probabilities, -k)[-k:]
+    return top[np.argsort(probabilities[top])[::-1]]
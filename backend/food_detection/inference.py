@@ -0,0 +1,211 @@
+import logging
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+INPUT_SHAPE = (224, 224, 3)
+TFLITE_SUFFIX = '.tflite'
+
+logger = logging.getLogger(__name__)
+
+
+def configure_tf_threads(tf):
+    # Each scheduler worker runs its own forward passes, so TF's per-op
+    # pools are pinned to keep workers x intra-op threads within the cores
+    intra_op = getattr(settings, 'DETECTION_TF_INTRA_OP_THREADS', None)
+    inter_op = getattr(settings, 'DETECTION_TF_INTER_OP_THREADS', None)
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        # Only possible before the TF runtime has been initialized
+        logger.warning(f"Could not pin TensorFlow threads: {str(e)}")
+
+
+def load_mobilenet():
+    # TensorFlow is imported here so that management commands, migrations
+    # and the admin never pay for it
+    import tensorflow as tf
+    configure_tf_threads(tf)
+    return tf.keras.applications.MobileNetV2(
+        weights='imagenet',
+        include_top=True
+    )
+
+
+def latest_tflite_model(model_dir=None):
+    # Artifacts are named <model>-<quantization>-<timestamp>.tflite, so
+    # within one quantization the lexically last file is the newest
+    model_dir = Path(model_dir or settings.DETECTION_MODEL_DIR)
+    quantization = getattr(settings, 'DETECTION_TFLITE_QUANTIZATION', 'int8')
+    candidates = sorted(model_dir.glob(f'*-{quantization}-*{TFLITE_SUFFIX}'))
+    if not candidates:
+        raise ValueError(f"No {quantization} TFLite model found in {model_dir}")
+    return candidates[-1]
+
+
+class InferenceEngine:
+    """Runs the classifier on a float32 batch of shape (N, 224, 224, 3)."""
+
+    name = None
+
+    @classmethod
+    def load(cls, model=None):
+        return cls(model if model is not None else load_mobilenet())
+
+    def predict(self, batch):
+        raise NotImplementedError
+
+
+class KerasPredictEngine(InferenceEngine):
+    """``model.predict``; builds a data adapter and callback loop per call."""
+
+    name = 'predict'
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class CompiledKerasEngine(InferenceEngine):
+    """Direct ``model(x, training=False)`` call traced once as a tf.function.
+
+    The input signature is fixed with an unknown batch dimension, so every
+    batch size the scheduler produces reuses the same concrete function.
+    """
+
+    name = 'compiled'
+
+    def __init__(self, model):
+        import tensorflow as tf
+        self.model = model
+        self._forward = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32)],
+        )
+
+    def predict(self, batch):
+        return self._forward(np.asarray(batch, dtype=np.float32)).numpy()
+
+
+class TFLiteEngine(InferenceEngine):
+    """Quantized TFLite build of the classifier, see ``convert_tflite``.
+
+    Uses the standalone ``tflite_runtime`` interpreter when it is installed
+    so CPU-only workers do not need to import TensorFlow at all.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None, model_content=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.model_path = Path(model_path)
+        if model_content is not None:
+            self.interpreter = Interpreter(model_content=model_content, num_threads=num_threads)
+        else:
+            self.interpreter = Interpreter(
+                model_path=str(self.model_path), num_threads=num_threads
+            )
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter is not thread-safe; scheduler workers take turns
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, model=None):
+        # model is the (path, bytes) from read_model, if it was read before forking
+        if isinstance(model, tuple):
+            model_path, content = model
+        else:
+            model_path = getattr(settings, 'DETECTION_TFLITE_MODEL', None) or latest_tflite_model()
+            content = None
+        return cls(model_path, num_threads=getattr(settings, 'DETECTION_TFLITE_THREADS', None),
+                   model_content=content)
+
+    @classmethod
+    def read_model(cls):
+        # Plain file bytes: no interpreter and no thread pools yet, so this is
+        # safe in a process that forks afterwards
+        model_path = Path(getattr(settings, 'DETECTION_TFLITE_MODEL', None) or latest_tflite_model())
+        return model_path, model_path.read_bytes()
+
+    def _resize(self, batch_size):
+        # Reallocating is expensive, so only do it when the batch size changes
+        if batch_size != self._batch_size:
+            self.interpreter.resize_tensor_input(
+                self._input['index'], (batch_size,) + INPUT_SHAPE
+            )
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch):
+        with self._lock:
+            return self._predict(batch)
+
+    def _predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        self._resize(batch.shape[0])
+
+        input_dtype = self._input['dtype']
+        if input_dtype != np.float32:
+            scale, zero_point = self._input['quantization']
+            batch = np.clip(
+                np.round(batch / scale + zero_point),
+                np.iinfo(input_dtype).min, np.iinfo(input_dtype).max
+            ).astype(input_dtype)
+
+        self.interpreter.set_tensor(self._input['index'], batch)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self._output['index'])
+
+        if output.dtype != np.float32:
+            scale, zero_point = self._output['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+ENGINES = {
+    KerasPredictEngine.name: KerasPredictEngine,
+    CompiledKerasEngine.name: CompiledKerasEngine,
+    TFLiteEngine.name: TFLiteEngine,
+}
+
+
+def engine_name():
+    return getattr(settings, 'DETECTION_INFERENCE_ENGINE', 'compiled')
+
+
+def read_model(name=None):
+    """The configured engine's model read into memory without starting its
+    runtime, for ``load_engine`` in forked workers; None if the engine
+    cannot do that.
+
+    Only the TFLite build qualifies. Building the Keras model starts the
+    TensorFlow runtime, whose thread pools do not survive a fork.
+    """
+    engine = ENGINES.get(name or engine_name())
+    if not hasattr(engine, 'read_model'):
+        return None
+    return engine.read_model()
+
+
+def load_engine(name=None, model=None):
+    name = name or engine_name()
+    if name not in ENGINES:
+        raise ValueError(f"Unknown inference engine: {name}")
+    return ENGINES[name].load(model)
@@ -0,0 +1,77 @@
+import random
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from food_detection.catalogue import FoodCatalogueCache
+
+
+class Command(BaseCommand):
+    help = (
+        'Report the memory use and refresh cost of the in-memory Firestore food catalogue, '
+        'and list/filter latency and reads with and without it'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fake', type=int, metavar='FOODS',
+                            help='Use an in-memory Firestore fake holding this many foods')
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['fake']:
+            from nutrition.firestore_fake import FakeFirestore
+            db = FakeFirestore()
+            rng = random.Random(0)
+            categories = [f'Category {i}' for i in range(40)]
+            batch = db.batch()
+            for i in range(options['fake']):
+                batch.set(db.collection('foods').document(str(i)), {
+                    'name': f'Food {i}', 'category': rng.choice(categories),
+                    'calories': rng.randint(0, 900), 'protein': rng.uniform(0, 50),
+                    'carbs': rng.uniform(0, 100), 'fat': rng.uniform(0, 40),
+                    'image_url': '', 'food_class': f'food_{i}',
+                })
+            batch.commit()
+        else:
+            from nutrition.firebase import get_db
+            try:
+                db = get_db()
+            except ImproperlyConfigured as e:
+                raise CommandError(f"{e}, or use --fake FOODS")
+
+        reads = lambda: getattr(db, 'reads', None)
+        cache = FoodCatalogueCache(lambda: db.collection('foods'), lambda data: SimpleNamespace(**data))
+        snapshot = cache.load()
+        categories = list(snapshot.by_category)
+        self.stdout.write(
+            f"{len(snapshot.foods)} foods in {len(categories)} categories: "
+            f"{snapshot.nbytes / 1024 / 1024:.2f} MiB in memory, refresh took {snapshot.load_seconds * 1000:.1f}ms"
+        )
+
+        def direct(category):
+            query = db.collection('foods')
+            if category:
+                query = query.where('category', '==', category)
+            return [SimpleNamespace(**doc.to_dict()) for doc in query.stream()]
+
+        def cached(category):
+            snapshot = cache.load()
+            return list(snapshot.by_category.get(category, ())) if category else list(snapshot.foods)
+
+        rng = random.Random(1)
+        workload = [rng.choice(categories) if rng.random() < 0.5 else None for _ in range(options['requests'])]
+        for label, fn in (('firestore', direct), ('cached', cached)):
+            before = reads()
+            timings = []
+            for category in workload:
+                started = time.perf_counter()
+                fn(category)
+                timings.append((time.perf_counter() - started) * 1000.0)
+            p50, p99 = np.percentile(timings, [50, 99])
+            line = f"  {label:<10} p50={p50:.3f}ms p99={p99:.3f}ms"
+            if before is not None:
+                line += f" reads/request={(reads() - before) / len(workload):.1f}"
+            self.stdout.write(line)
@@ -0,0 +1,114 @@
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from food_detection.columns import FoodColumns, write_columns
+from food_detection.models import Food
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare memory use and filter latency of Food model instances with the '
+        'memory-mapped columnar catalogue (synthetic rows are rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--foods', type=int, nargs='+', default=[10000, 100000],
+                            help='Catalogue sizes to measure, padded with synthetic foods')
+        parser.add_argument('--queries', type=int, default=50)
+
+    def handle(self, *args, **options):
+        for size in options['foods']:
+            try:
+                with transaction.atomic():
+                    self._run(size, options['queries'])
+                    raise Rollback()
+            except Rollback:
+                pass
+
+    def _pad(self, size):
+        existing = Food.objects.count()
+        categories = list(Food.objects.values_list('category', flat=True).distinct()[:50]) or ['General']
+        rng = random.Random(0)
+        Food.objects.bulk_create(
+            [
+                Food(name=f'Synthetic food {i}', category=rng.choice(categories),
+                     calories=rng.randint(0, 900), protein=rng.uniform(0, 50),
+                     carbs=rng.uniform(0, 100), fat=rng.uniform(0, 40), food_class='')
+                for i in range(max(0, size - existing))
+            ],
+            batch_size=5000,
+            ignore_conflicts=True,
+        )
+        return categories
+
+    def _run(self, size, queries):
+        categories = self._pad(size)
+        total = Food.objects.count()
+
+        tracemalloc.start()
+        foods = list(Food.objects.all())
+        _, orm_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del foods
+
+        fd, path = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        try:
+            started = time.perf_counter()
+            write_columns(path, Food.objects.values_list(
+                'id', 'name', 'category', 'calories', 'protein', 'carbs', 'fat', 'basis_grams'
+            ).iterator(chunk_size=10000))
+            build_seconds = time.perf_counter() - started
+            tracemalloc.start()
+            columns = FoodColumns(path)
+            _, columns_heap = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{total} foods: model instances {orm_peak / 1024 / 1024:.1f} MiB per worker; "
+                f"columns {os.path.getsize(path) / 1024 / 1024:.1f} MiB mapped (shared) + "
+                f"{columns_heap / 1024:.0f} KiB heap, built in {build_seconds:.2f}s"
+            )
+
+            rng = random.Random(1)
+            workload = [(rng.sample(categories, min(3, len(categories))), rng.uniform(2, 20))
+                        for _ in range(queries)]
+
+            def orm(picked, min_protein):
+                return list(
+                    Food.objects.filter(category__in=picked, calories__gt=0)
+                    .annotate(per_100kcal=F('protein') * 100.0 / Cast('calories', FloatField()))
+                    .filter(per_100kcal__gte=min_protein)
+                    .values_list('id', flat=True)
+                )
+
+            def vectorized(picked, min_protein):
+                mask = columns.mask(picked, {'protein_per_100kcal': (min_protein, None)})
+                return columns.ids[mask].tolist()
+
+            counts = {}
+            for label, fn in (('orm', orm), ('columns', vectorized)):
+                timings = []
+                for picked, min_protein in workload:
+                    started = time.perf_counter()
+                    counts[label] = len(fn(picked, min_protein))
+                    timings.append((time.perf_counter() - started) * 1000.0)
+                p50, p99 = np.percentile(timings, [50, 99])
+                self.stdout.write(f"  {label:<8} p50={p50:.2f}ms p99={p99:.2f}ms")
+            if counts['orm'] != counts['columns']:
+                self.stdout.write(self.style.WARNING(f"  result counts differ: {counts}"))
+        finally:
+            os.remove(path)
@@ -0,0 +1,81 @@
+import csv
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from food_detection.models import Food
+from food_detection.search import search_foods
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark /api/foods/ search on food_dataset.csv-sized catalogues (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--csv', type=str,
+            default=str(Path(settings.BASE_DIR) / 'data' / 'food_dataset.csv')
+        )
+        parser.add_argument('--scales', type=int, nargs='+', default=[1, 100])
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with open(options['csv'], newline='') as f:
+            rows = [(row['FoodItem'], row['FoodCategory']) for row in csv.DictReader(f)]
+
+        rng = random.Random(0)
+        words = [word for name, _ in rows for word in name.split() if len(word) > 3]
+        prefixes = [rng.choice(words)[:4] for _ in range(options['queries'])]
+        typos = []
+        for _ in range(options['queries']):
+            word = rng.choice(words)
+            i = rng.randrange(1, len(word) - 1)
+            typos.append(word[:i] + word[i + 1:])
+
+        for scale in options['scales']:
+            try:
+                with transaction.atomic():
+                    self._run(rows, scale, prefixes, typos)
+                    raise Rollback()
+            except Rollback:
+                pass
+
+    def _run(self, rows, scale, prefixes, typos):
+        Food.objects.bulk_create(
+            [
+                Food(name=name if copy == 0 else f'{name} {copy}', category=category,
+                     calories=0, protein=0, carbs=0, fat=0, food_class='')
+                for copy in range(scale)
+                for name, category in rows
+            ],
+            batch_size=5000,
+            # Names are unique; repeats in the CSV and foods already loaded are kept as they are
+            ignore_conflicts=True,
+        )
+        total = Food.objects.count()
+
+        def timed(label, fn, queries):
+            timings, found = [], 0
+            for query in queries:
+                started = time.perf_counter()
+                found += len(fn(query))
+                timings.append((time.perf_counter() - started) * 1000.0)
+            p50, p99 = np.percentile(timings, [50, 99])
+            # Larger catalogues fill more of each page, which costs a little more to load
+            self.stdout.write(f"  {label:<18} p50={p50:.2f}ms p99={p99:.2f}ms rows={found / len(queries):.1f}")
+
+        self.stdout.write(
+            f"{total} foods (x{scale}), ranking at most "
+            f"{getattr(settings, 'FOOD_SEARCH_MAX_CANDIDATES', 200)} fuzzy matches per query"
+        )
+        timed('fts prefix', lambda q: search_foods(q, limit=50)[0], prefixes)
+        timed('fts fuzzy', lambda q: search_foods(q, limit=50)[0], typos)
+        timed('icontains scan', lambda q: list(Food.objects.filter(name__icontains=q)[:50]), prefixes)
@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from food_detection.inference import ENGINES, INPUT_SHAPE, load_engine, load_mobilenet
+
+
+class Command(BaseCommand):
+    help = 'Compare p50/p99 latency of the available inference engines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=1)
+        parser.add_argument(
+            '--engines', nargs='+', default=list(ENGINES),
+            help='Engines to benchmark (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        batch = np.random.default_rng(0).uniform(
+            -1, 1, (options['batch_size'],) + INPUT_SHAPE
+        ).astype(np.float32)
+
+        # Keras engines wrap the same model so only call overhead differs
+        model = load_mobilenet()
+        for name in options['engines']:
+            try:
+                engine = load_engine(name, model=model)
+            except ValueError as e:
+                self.stdout.write(self.style.WARNING(f"{name:>10}: skipped ({str(e)})"))
+                continue
+            for _ in range(options['warmup']):
+                engine.predict(batch)
+
+            timings = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                engine.predict(batch)
+                timings.append((time.perf_counter() - started) * 1000.0)
+
+            p50, p99 = np.percentile(timings, [50, 99])
+            self.stdout.write(
+                f"{name:>10}: p50={p50:.2f}ms p99={p99:.2f}ms "
+                f"mean={np.mean(timings):.2f}ms (batch={options['batch_size']}, n={options['iterations']})"
+            )
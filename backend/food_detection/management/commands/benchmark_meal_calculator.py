@@ -0,0 +1,73 @@
+import json
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from food_detection.columns import NUTRIENTS, food_columns
+from food_detection.meals import meal_macros
+from food_detection.models import Food
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare meal macro totals computed item by item from Food rows with the '
+        'vectorized calculator, directly and through /api/meals/calculate/'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10000, help='(food id, grams) items per request')
+        parser.add_argument('--requests', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Foods without a serving weight can't be weighed out
+        food_ids = list(Food.objects.filter(basis_grams__isnull=False).values_list('id', flat=True))
+        if not food_ids:
+            raise CommandError('No foods loaded; run load_food_data first')
+
+        rng = random.Random(0)
+        meals = [
+            ([rng.choice(food_ids) for _ in range(options['items'])],
+             [round(rng.uniform(5, 400), 1) for _ in range(options['items'])])
+            for _ in range(options['requests'])
+        ]
+        columns = food_columns.get()
+        client = Client()
+
+        def per_item(ids, grams):
+            foods = Food.objects.in_bulk(set(ids))
+            totals = dict.fromkeys(NUTRIENTS, 0.0)
+            for food_id, portion in zip(ids, grams):
+                food = foods[food_id]
+                for nutrient in NUTRIENTS:
+                    totals[nutrient] += getattr(food, nutrient) * portion / food.basis_grams
+            return totals
+
+        def vectorized(ids, grams):
+            return meal_macros(columns, ids, grams)['totals']
+
+        def api(ids, grams):
+            response = client.post('/api/meals/calculate/', json.dumps({'food_ids': ids, 'grams': grams}),
+                                   content_type='application/json')
+            if response.status_code != 200:
+                raise CommandError(f"API returned {response.status_code}: {response.content[:200]}")
+            return response.json()['totals']
+
+        self.stdout.write(f"{options['requests']} meals of {options['items']} items over {len(food_ids)} foods")
+        results = {}
+        for label, fn in (('per-item', per_item), ('vectorized', vectorized), ('api', api)):
+            timings = []
+            for ids, grams in meals:
+                started = time.perf_counter()
+                results[label] = fn(ids, grams)
+                timings.append((time.perf_counter() - started) * 1000.0)
+            p50, p99 = np.percentile(timings, [50, 99])
+            self.stdout.write(
+                f"  {label:<10} p50={p50:.2f}ms p99={p99:.2f}ms "
+                f"({options['items'] / p50 * 1000.0:,.0f} items/s)"
+            )
+        for nutrient in NUTRIENTS:
+            if not np.isclose(results['per-item'][nutrient], results['vectorized'][nutrient], rtol=1e-4):
+                self.stdout.write(self.style.WARNING(f"  {nutrient} totals differ: {results}"))
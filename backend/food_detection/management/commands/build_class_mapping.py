@@ -0,0 +1,155 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from food_detection.food_mapping import invalidate_food_mapping
+from food_detection.imagenet import load_class_index
+from food_detection.models import ClassLabelMapping, Food
+
+# The ImageNet classes that can be mapped: the dishes, fruit and vegetables of
+# the food subtree, except fodder (hay) and whole courses (plate, cup), plus
+# the ears of corn filed under plants. Everything else - live animals such as
+# goose or eel, nuts like acorn - may share a name with a Food row but is not
+# a meal.
+FOOD_WNIDS = {
+    'n07583066': 'guacamole',
+    'n07584110': 'consomme',
+    'n07590611': 'hot_pot',
+    'n07613480': 'trifle',
+    'n07614500': 'ice_cream',
+    'n07615774': 'ice_lolly',
+    'n07684084': 'French_loaf',
+    'n07693725': 'bagel',
+    'n07695742': 'pretzel',
+    'n07697313': 'cheeseburger',
+    'n07697537': 'hotdog',
+    'n07711569': 'mashed_potato',
+    'n07714571': 'head_cabbage',
+    'n07714990': 'broccoli',
+    'n07715103': 'cauliflower',
+    'n07716358': 'zucchini',
+    'n07716906': 'spaghetti_squash',
+    'n07717410': 'acorn_squash',
+    'n07717556': 'butternut_squash',
+    'n07718472': 'cucumber',
+    'n07718747': 'artichoke',
+    'n07720875': 'bell_pepper',
+    'n07730033': 'cardoon',
+    'n07734744': 'mushroom',
+    'n07742313': 'Granny_Smith',
+    'n07745940': 'strawberry',
+    'n07747607': 'orange',
+    'n07749582': 'lemon',
+    'n07753113': 'fig',
+    'n07753275': 'pineapple',
+    'n07753592': 'banana',
+    'n07754684': 'jackfruit',
+    'n07760859': 'custard_apple',
+    'n07768694': 'pomegranate',
+    'n07831146': 'carbonara',
+    'n07836838': 'chocolate_sauce',
+    'n07860988': 'dough',
+    'n07871810': 'meat_loaf',
+    'n07873807': 'pizza',
+    'n07875152': 'potpie',
+    'n07880968': 'burrito',
+    'n07892512': 'red_wine',
+    'n07920052': 'espresso',
+    'n07932039': 'eggnog',
+    'n12144580': 'corn',
+    'n13133613': 'ear',
+}
+
+# ImageNet labels whose name does not match a Food row directly, with the
+# food names / food_class values to try instead (most specific first)
+LABEL_SYNONYMS = {
+    'Granny_Smith': ['green apple', 'apple'],
+    'cheeseburger': ['burger', 'hamburger'],
+    'hotdog': ['hot dog', 'hotdog'],
+    'French_loaf': ['baguette', 'bread'],
+    'bagel': ['bagels', 'bread'],
+    'pretzel': ['pretzels'],
+    'espresso': ['espresso', 'coffee'],
+    'carbonara': ['spaghetti carbonara', 'spaghetti', 'noodles'],
+    'trifle': ['trifle', 'cake'],
+    'ice_cream': ['ice cream'],
+    'ice_lolly': ['popsicle', 'ice pop'],
+    'mashed_potato': ['mashed potatoes'],
+    'meat_loaf': ['meatloaf'],
+    'potpie': ['chicken pot pie', 'pot pie'],
+    'head_cabbage': ['cabbage'],
+    'bell_pepper': ['bell pepper', 'red pepper', 'green pepper'],
+    'spaghetti_squash': ['spaghetti squash', 'squash'],
+    'acorn_squash': ['acorn squash', 'squash'],
+    'butternut_squash': ['butternut squash', 'squash'],
+    'ear': ['corn on the cob', 'sweet corn', 'corn'],
+    'corn': ['sweet corn', 'corn'],
+    'custard_apple': ['custard apple', 'cherimoya'],
+    'consomme': ['consomme', 'broth'],
+    'hot_pot': ['hot pot', 'stew'],
+    'red_wine': ['red wine', 'wine'],
+    'chocolate_sauce': ['chocolate sauce', 'chocolate syrup'],
+    'dough': ['dough', 'bread'],
+    'eggnog': ['eggnog'],
+}
+
+
+def normalize(value):
+    return ' '.join(value.lower().replace('_', ' ').split())
+
+
+class Command(BaseCommand):
+    help = (
+        'Map the ImageNet food classes (FOOD_WNIDS) to Food rows by name, food_class '
+        'and known synonyms'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--replace', action='store_true',
+            help='Rebuild all mappings instead of only adding missing ones; also drops '
+                 'mappings of classes outside FOOD_WNIDS'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            class_index = load_class_index()
+        except Exception as e:
+            raise CommandError(f"Could not load ImageNet class index: {str(e)}")
+
+        # Exact names win over food_class, earlier rows win over later ones
+        foods = list(Food.objects.order_by('id').values_list('id', 'name', 'food_class'))
+        index = {}
+        for food_id, name, _ in foods:
+            index.setdefault(normalize(name), food_id)
+        for food_id, _, food_class in foods:
+            if food_class:
+                index.setdefault(normalize(food_class), food_id)
+
+        existing = set() if options['replace'] else set(
+            ClassLabelMapping.objects.values_list('class_id', flat=True)
+        )
+        mappings = []
+        for class_id, (wnid, label) in enumerate(class_index):
+            if class_id in existing or wnid not in FOOD_WNIDS:
+                continue
+            for candidate in [label] + LABEL_SYNONYMS.get(label, []):
+                key = normalize(candidate)
+                food_id = index.get(key) or index.get(f'{key}s') or index.get(f'{key}es')
+                if food_id:
+                    mappings.append(ClassLabelMapping(class_id=class_id, label=label, food_id=food_id))
+                    break
+
+        for mapping in mappings:
+            self.stdout.write(f"{mapping.class_id:>4} {mapping.label}")
+        if options['dry_run']:
+            self.stdout.write(f"Dry run: would map {len(mappings)} classes")
+            return
+
+        with transaction.atomic():
+            if options['replace']:
+                ClassLabelMapping.objects.all().delete()
+            ClassLabelMapping.objects.bulk_create(mappings)
+        # bulk_create does not send post_save
+        invalidate_food_mapping()
+        self.stdout.write(self.style.SUCCESS(f"Mapped {len(mappings)} ImageNet classes to foods"))
@@ -0,0 +1,103 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from food_detection.evaluation import compare_engines, load_fixture_images
+from food_detection.inference import (
+    INPUT_SHAPE, TFLITE_SUFFIX, CompiledKerasEngine, TFLiteEngine, load_mobilenet
+)
+
+MODEL_NAME = 'mobilenet_v2'
+
+
+class Command(BaseCommand):
+    help = 'Convert the MobileNetV2 classifier into a versioned, quantized TFLite artifact'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--quantization', choices=['int8', 'float16', 'dynamic'], default='int8'
+        )
+        parser.add_argument(
+            '--output-dir', type=str, default=None,
+            help='Defaults to settings.DETECTION_MODEL_DIR'
+        )
+        parser.add_argument(
+            '--calibration-dir', type=str, default=None,
+            help='Images used to calibrate int8 activation ranges'
+        )
+        parser.add_argument(
+            '--fixtures', type=str, default=None,
+            help='Image directory for an accuracy-vs-latency report after conversion'
+        )
+
+    def _representative_dataset(self, calibration_dir):
+        if calibration_dir:
+            images = load_fixture_images(calibration_dir)
+        else:
+            self.stdout.write(self.style.WARNING(
+                'No --calibration-dir given, calibrating int8 ranges on random inputs'
+            ))
+            images = np.random.default_rng(0).uniform(
+                -1, 1, (100,) + INPUT_SHAPE
+            ).astype(np.float32)
+
+        def dataset():
+            for image in images:
+                yield [image[np.newaxis]]
+        return dataset
+
+    def handle(self, *args, **options):
+        import tensorflow as tf
+
+        quantization = options['quantization']
+        output_dir = Path(options['output_dir'] or settings.DETECTION_MODEL_DIR)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        model = load_mobilenet()
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantization == 'int8':
+            # Integer weights and activations; float input/output keeps the
+            # engine interchangeable with the Keras ones
+            converter.representative_dataset = self._representative_dataset(
+                options['calibration_dir']
+            )
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        elif quantization == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+
+        try:
+            flatbuffer = converter.convert()
+        except Exception as e:
+            raise CommandError(f"TFLite conversion failed: {str(e)}")
+
+        version = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        artifact = output_dir / f'{MODEL_NAME}-{quantization}-{version}{TFLITE_SUFFIX}'
+        artifact.write_bytes(flatbuffer)
+        metadata = {
+            'model': MODEL_NAME,
+            'quantization': quantization,
+            'version': version,
+            'tensorflow': tf.__version__,
+            'sha256': hashlib.sha256(flatbuffer).hexdigest(),
+            'size_bytes': len(flatbuffer),
+            'keras_params': int(model.count_params()),
+        }
+        artifact.with_suffix('.json').write_text(json.dumps(metadata, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {artifact} ({len(flatbuffer) / 1e6:.1f} MB)"
+        ))
+
+        if options['fixtures']:
+            report = compare_engines(
+                CompiledKerasEngine(model),
+                TFLiteEngine(artifact),
+                load_fixture_images(options['fixtures'])
+            )
+            artifact.with_suffix('.report.json').write_text(json.dumps(report, indent=2))
+            self.stdout.write(json.dumps(report, indent=2))
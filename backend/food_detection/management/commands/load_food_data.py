@@ -1,28 +1,176 @@
 import csv
-from django.core.management.base import BaseCommand
+import re
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from food_detection.food_mapping import invalidate_food_mapping
 from food_detection.models import Food
+from food_detection.search import create_fts_index, drop_fts_index
+
+UPDATE_FIELDS = ['category', 'calories', 'protein', 'carbs', 'fat', 'image_url', 'food_class', 'basis_grams']
+COLUMNS = ['name'] + UPDATE_FIELDS
+
+_NUMBER_RE = re.compile(r'[-+]?\d*\.?\d+')
+_NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+
+def _upsert_sql():
+    # Plain executemany upsert: bulk_create(update_conflicts=True) spends most
+    # of its time in per-field pre_save calls, several times the insert itself
+    quote = connection.ops.quote_name
+    return (
+        f"INSERT INTO {quote(Food._meta.db_table)} ({', '.join(map(quote, COLUMNS))}) "
+        f"VALUES ({', '.join(['%s'] * len(COLUMNS))}) "
+        f"ON CONFLICT ({quote('name')}) DO UPDATE SET "
+        + ', '.join(f"{quote(field)} = excluded.{quote(field)}" for field in UPDATE_FIELDS)
+    )
+
+
+def _number(value):
+    # "62 cal", "1,495 kJ", "3.5" -> float; anything else -> 0
+    if not value:
+        return 0.0
+    match = _NUMBER_RE.search(value.replace(',', ''))
+    return float(match.group()) if match else 0.0
+
+
+def _food_class(name):
+    # "Mandarin Oranges" -> "mandarin_oranges"
+    return _NON_WORD_RE.sub('_', name.lower()).strip('_')
+
+
+def _dataset_rows(reader):
+    # data/food_dataset.csv: FoodCategory,FoodItem,per100grams,Cals_per100grams,KJ_per100grams
+    for row in reader:
+        name = (row.get('FoodItem') or '').strip()
+        yield {
+            'name': name,
+            'category': row.get('FoodCategory'),
+            'calories': row.get('Cals_per100grams'),
+            'protein': None,
+            'carbs': None,
+            'fat': None,
+            'image_url': None,
+            'food_class': _food_class(name),
+            # per100grams is 100g or 100ml, taken as 100 g
+            'basis_grams': '100',
+        }
+
+
+def _food_rows(reader):
+    # The Food columns: food_name,category,calories,protein,carbs,fat[,image_url,food_class,basis_grams]
+    for row in reader:
+        name = (row.get('food_name') or '').strip()
+        yield {
+            'name': name,
+            'category': row.get('category'),
+            'calories': row.get('calories'),
+            'protein': row.get('protein'),
+            'carbs': row.get('carbs'),
+            'fat': row.get('fat'),
+            'image_url': row.get('image_url'),
+            'food_class': row.get('food_class') or _food_class(name),
+            # Values are per 100 g unless the file says otherwise; an empty
+            # basis_grams is a serving of unknown weight
+            'basis_grams': row.get('basis_grams', '100'),
+        }
+
 
 class Command(BaseCommand):
-    help = 'Load food data from CSV file'
+    help = (
+        'Load food data from CSV file (data/food_dataset.csv or the Food columns), '
+        'upserting by name in batches'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file', type=str, help='Path to the CSV file')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Parse and count the rows without writing anything')
+        parser.add_argument('--rebuild-search-index', action='store_true',
+                            help='Drop the search index during the load and rebuild it once '
+                                 'afterwards; faster for large files')
 
     def handle(self, *args, **options):
         csv_file = options['csv_file']
-        with open(csv_file, 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                Food.objects.get_or_create(
-                    name=row['food_name'],
-                    defaults={
-                        'category': row['category'],
-                        'calories': float(row['calories']),
-                        'protein': float(row['protein']),
-                        'carbs': float(row['carbs']),
-                        'fat': float(row['fat']),
-                        'image_url': row['image_url'],
-                        'food_class': row['food_class'],
-                    }
-                )
-        self.stdout.write(self.style.SUCCESS('Successfully loaded food data')) 
\ No newline at end of file
+        try:
+            file = open(csv_file, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f"Cannot open {csv_file}: {e}")
+        dry_run = options['dry_run']
+        rebuild = options['rebuild_search_index'] and not dry_run
+
+        if rebuild:
+            with connection.schema_editor() as editor:
+                drop_fts_index(editor)
+        started = time.perf_counter()
+        try:
+            with file, transaction.atomic():
+                read, written, skipped = self._load(file, options['batch_size'], dry_run, started)
+        finally:
+            if rebuild:
+                indexing = time.perf_counter()
+                with connection.schema_editor() as editor:
+                    create_fts_index(editor)
+                self.stdout.write(f"Rebuilt the search index in {time.perf_counter() - indexing:.1f}s")
+
+        if not dry_run:
+            # Raw inserts send no signals
+            invalidate_food_mapping()
+        elapsed = time.perf_counter() - started
+        verb = 'Would load' if dry_run else 'Loaded'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {written} foods, skipped {skipped} blank or repeated rows, in {elapsed:.1f}s "
+            f"({read / elapsed if elapsed else 0:.0f} rows/s)"
+        ))
+
+    def _load(self, file, batch_size, dry_run, started):
+        reader = csv.DictReader(file)
+        fields = set(reader.fieldnames or ())
+        if {'FoodItem', 'Cals_per100grams'} <= fields:
+            rows = _dataset_rows(reader)
+        elif 'food_name' in fields:
+            rows = _food_rows(reader)
+        else:
+            raise CommandError(f"Unrecognized columns: {', '.join(reader.fieldnames or ())}")
+
+        sql = _upsert_sql()
+        read = written = 0
+        while True:
+            # Only one batch is held in memory at a time
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            read += len(batch)
+            values = self._values(batch)
+            if not dry_run:
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, values)
+            written += len(values)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{read} read, {written} upserted ({read / elapsed:.0f} rows/s)")
+        return read, written, read - written
+
+    def _values(self, batch):
+        # Rows in COLUMNS order; the last row for a name within a batch wins,
+        # as it would across batches
+        values = {}
+        for row in batch:
+            name = row['name'][:100]
+            if not name:
+                continue
+            values[name] = (
+                name,
+                (row['category'] or '').strip()[:50] or 'General',
+                round(_number(row['calories'])),
+                _number(row['protein']),
+                _number(row['carbs']),
+                _number(row['fat']),
+                (row['image_url'] or '').strip()[:500],
+                row['food_class'][:100],
+                _number(row['basis_grams']) or None,
+            )
+        return list(values.values())
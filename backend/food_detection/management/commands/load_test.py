@@ -0,0 +1,83 @@
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test a running server, e.g. the WSGI and ASGI deployments side by side: '
+        '--target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True,
+                            help='NAME=BASE_URL, may be repeated')
+        parser.add_argument('--path', type=str, default='/api/detect/')
+        parser.add_argument('--image', type=str,
+                            help='Image to upload as multipart "image"; GET requests without it')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, base_url = target.partition('=')
+            if not sep:
+                raise CommandError(f"Expected NAME=BASE_URL, got {target}")
+            targets.append((name, base_url.rstrip('/') + options['path']))
+
+        body = content_type = None
+        if options['image']:
+            body, content_type = self._multipart(Path(options['image']))
+
+        for name, url in targets:
+            self.stdout.write(f"{name}: {url}")
+            for concurrency in options['concurrency']:
+                self._run(url, body, content_type, concurrency, options['requests'], options['timeout'])
+
+    def _multipart(self, path):
+        boundary = uuid.uuid4().hex
+        body = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="image"; filename="{path.name}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode() + path.read_bytes() + f'\r\n--{boundary}--\r\n'.encode()
+        return body, f'multipart/form-data; boundary={boundary}'
+
+    def _request(self, url, body, content_type, timeout):
+        request = urllib.request.Request(url, data=body, method='POST' if body else 'GET')
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = None
+        return status, (time.perf_counter() - started) * 1000.0
+
+    def _run(self, url, body, content_type, concurrency, requests, timeout):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(
+                lambda _: self._request(url, body, content_type, timeout), range(requests)
+            ))
+            elapsed = time.perf_counter() - started
+
+        timings = np.array([ms for _, ms in results])
+        errors = sum(1 for status, _ in results if status is None or status >= 500)
+        p50, p99 = np.percentile(timings, [50, 99])
+        self.stdout.write(
+            f"  c={concurrency:<4} {requests / elapsed:8.1f} req/s "
+            f"p50={p50:.1f}ms p99={p99:.1f}ms errors={errors}"
+        )
@@ -0,0 +1,63 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from food_detection.firestore_sync import (
+    FOOD_FIELDS, MAX_BATCH_WRITES, FoodCatalogueSync, FoodSyncState,
+)
+from food_detection.models import Food
+
+
+class Command(BaseCommand):
+    help = (
+        'Mirror the Food table into the Firestore "foods" collection with batched writes, '
+        'sending only foods that changed since the last run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--state', type=str,
+                            default=str(Path(settings.BASE_DIR) / 'firestore_foods_sync.json'),
+                            help='Checkpoint of the content hashes already in Firestore')
+        parser.add_argument('--batch-size', type=int, default=MAX_BATCH_WRITES)
+        parser.add_argument('--parallelism', type=int, default=4,
+                            help='Batches committed at the same time')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete documents of foods no longer in the table')
+        parser.add_argument('--refresh-state', action='store_true',
+                            help='Rebuild the checkpoint from Firestore before syncing')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be written')
+        parser.add_argument('--fake', action='store_true',
+                            help='Sync into an in-memory Firestore fake (for trying the tool out)')
+
+    def handle(self, *args, **options):
+        if options['fake']:
+            from nutrition.firestore_fake import FakeFirestore
+            db = FakeFirestore()
+        else:
+            from nutrition.firebase import get_db
+            # Honours FIRESTORE_EMULATOR_HOST like any other firestore client
+            try:
+                db = get_db()
+            except ImproperlyConfigured as e:
+                raise CommandError(f"{e}, or use --fake")
+
+        state = FoodSyncState(None if options['fake'] else options['state'])
+        try:
+            sync = FoodCatalogueSync(db, state, batch_size=options['batch_size'],
+                                     parallelism=options['parallelism'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['refresh_state']:
+            self.stdout.write(f"Read {sync.refresh_state()} documents from Firestore")
+
+        foods = Food.objects.order_by('pk').values('id', *FOOD_FIELDS).iterator(chunk_size=5000)
+        result = sync.run(foods, prune=options['prune'], dry_run=options['dry_run'])
+        verb = 'Would write' if options['dry_run'] else 'Wrote'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['changed']} changed foods and deleted {result['deleted']} "
+            f"in {result['batches']} batches ({result['seconds']:.2f}s); "
+            f"{len(state.hashes)} foods in sync"
+        ))
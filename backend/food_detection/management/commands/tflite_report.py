@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from food_detection.evaluation import compare_engines, load_fixture_images
+from food_detection.inference import CompiledKerasEngine, TFLiteEngine, latest_tflite_model
+
+
+class Command(BaseCommand):
+    help = 'Compare a TFLite artifact with the float Keras model on a local image fixture set'
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixtures', type=str, help='Directory of fixture images')
+        parser.add_argument(
+            '--artifact', type=str, default=None,
+            help='Defaults to the newest artifact in settings.DETECTION_MODEL_DIR'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            artifact = options['artifact'] or latest_tflite_model()
+            images = load_fixture_images(options['fixtures'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        report = compare_engines(CompiledKerasEngine.load(), TFLiteEngine(artifact), images)
+        report['artifact'] = str(artifact)
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,60 @@
+import numpy as np
+
+from .columns import NUTRIENTS
+
+# Food ids are stored as int64
+ID_LIMIT = 2 ** 63
+
+
+class UnknownFoods(ValueError):
+    def __init__(self, food_ids):
+        super().__init__(f"Unknown food ids: {food_ids}")
+        self.food_ids = food_ids
+
+
+class UnweighedFoods(ValueError):
+    # Per-serving values without a serving weight can't be scaled by grams
+    def __init__(self, food_ids):
+        super().__init__(f"Foods with per-serving values of unknown weight: {food_ids}")
+        self.food_ids = food_ids
+
+
+def meal_macros(columns, food_ids, grams):
+    """Calories and macros of each (food id, grams) portion and their totals.
+
+    Catalogue values are per ``basis_grams`` of each food (100 g, or one
+    serving of known weight). Everything happens in one pass of array
+    operations over the columnar catalogue, so thousands of items cost about
+    as much as one; per-item values come back as parallel lists.
+    """
+    # Checked one by one: converting straight to int64 would truncate 1.9 to
+    # food 1, accept true as 1 and overflow on ids beyond 2**63
+    if not all(type(food_id) is int and 0 <= food_id < ID_LIMIT for food_id in food_ids):
+        raise ValueError('food_ids must be non-negative integers')
+    if not all(isinstance(portion, (int, float)) and not isinstance(portion, bool) for portion in grams):
+        raise ValueError('grams must be non-negative numbers')
+    food_ids = np.asarray(food_ids, dtype='<i8')
+    grams = np.asarray(grams, dtype='f8')
+    if food_ids.shape != grams.shape or food_ids.ndim != 1:
+        raise ValueError('food_ids and grams must be lists of the same length')
+    if not np.isfinite(grams).all() or (grams < 0).any():
+        raise ValueError('grams must be non-negative numbers')
+
+    positions, found = columns.positions(food_ids)
+    if not found.all():
+        raise UnknownFoods(np.unique(food_ids[~found]).tolist())
+
+    records = columns.records[positions]
+    basis = records['basis_grams']
+    unweighed = np.isnan(basis)
+    if unweighed.any():
+        raise UnweighedFoods(np.unique(food_ids[unweighed]).tolist())
+    scale = grams / basis
+    items = {nutrient: records[nutrient] * scale for nutrient in NUTRIENTS}
+    return {
+        'items': len(food_ids),
+        'food_ids': food_ids.tolist(),
+        'grams': grams.tolist(),
+        **{nutrient: np.round(values, 2).tolist() for nutrient, values in items.items()},
+        'totals': {nutrient: round(float(values.sum()), 2) for nutrient, values in items.items()},
+    }
@@ -0,0 +1,75 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed upper bounds."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            'buckets': buckets,
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else 0.0,
+        }
+
+
+STAGE_MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class StageTimings:
+    """Per-stage latency histograms in milliseconds."""
+
+    def __init__(self, buckets=STAGE_MS_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram(self.buckets))
+        return histogram
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(stage).observe((time.perf_counter() - started) * 1000.0)
+
+    def snapshot(self):
+        return {stage: histogram.snapshot() for stage, histogram in self._histograms.items()}
+
+
+# decode -> preprocess -> inference -> postprocess for /api/detect/
+detection_timings = StageTimings()
@@ -0,0 +1,32 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+
+class ASGIURLConfMiddleware:
+    """Routes requests that arrive through backend.asgi to ASGI_URLCONF,
+    where the food and detection endpoints are native async views. WSGI
+    requests keep using ROOT_URLCONF."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _route(self, request):
+        urlconf = getattr(settings, 'ASGI_URLCONF', None)
+        if urlconf and isinstance(request, ASGIRequest):
+            request.urlconf = urlconf
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._route(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._route(request)
+        return await self.get_response(request)
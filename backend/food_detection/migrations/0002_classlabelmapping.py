@@ -0,0 +1,24 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_detection', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassLabelMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_id', models.PositiveSmallIntegerField(unique=True)),
+                ('label', models.CharField(max_length=100)),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='class_mappings', to='food_detection.food')),
+            ],
+            options={
+                'ordering': ['class_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+from food_detection.search import create_fts_index, drop_fts_index
+
+
+def create_fts(apps, schema_editor):
+    create_fts_index(schema_editor)
+
+
+def drop_fts(apps, schema_editor):
+    drop_fts_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_detection', '0002_classlabelmapping'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='image_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='food',
+            name='category',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='food',
+            name='food_class',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
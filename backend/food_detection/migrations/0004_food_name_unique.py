@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+from food_detection.search import create_fts_index
+
+
+def merge_duplicate_names(apps, schema_editor):
+    # Keep the oldest row per name and point detections and class mappings at it
+    Food = apps.get_model('food_detection', 'Food')
+    DetectionHistory = apps.get_model('food_detection', 'DetectionHistory')
+    ClassLabelMapping = apps.get_model('food_detection', 'ClassLabelMapping')
+    kept = {}
+    duplicates = {}
+    for food_id, name in Food.objects.order_by('id').values_list('id', 'name'):
+        if name in kept:
+            duplicates[food_id] = kept[name]
+        else:
+            kept[name] = food_id
+    for food_id, keep_id in duplicates.items():
+        DetectionHistory.objects.filter(food_id=food_id).update(food_id=keep_id)
+        ClassLabelMapping.objects.filter(food_id=food_id).update(food_id=keep_id)
+    Food.objects.filter(id__in=list(duplicates)).delete()
+
+
+def create_fts(apps, schema_editor):
+    # Altering the column rebuilds the SQLite table, which drops the FTS triggers
+    create_fts_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_detection', '0003_food_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+        migrations.RunPython(migrations.RunPython.noop, create_fts),
+        migrations.AlterField(
+            model_name='food',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.RunPython(create_fts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-18 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_detection', '0004_food_name_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
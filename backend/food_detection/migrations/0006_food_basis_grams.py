@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+from food_detection.search import create_fts_index
+
+# Seed rows (0001_initial and add_food_items.py) whose values are for one
+# serving: (name, calories as seeded, grams in the serving or None if unknown)
+PER_SERVING_SEEDS = [
+    ('Apple', 95, 182),
+    ('Banana', 105, 118),
+    ('Orange', 62, 131),
+    ('Sandwich', 350, None),
+    ('Burger', 354, None),
+    ('Hotdog', 290, None),
+    ('Donut', 300, None),
+    ('Coffee', 2, None),
+    ('Juice', 120, None),
+]
+
+
+def mark_per_serving_seeds(apps, schema_editor):
+    # Rows since edited or reloaded from food_dataset.csv keep the 100 g basis
+    Food = apps.get_model('food_detection', 'Food')
+    for name, calories, grams in PER_SERVING_SEEDS:
+        Food.objects.filter(name=name, calories=calories).update(basis_grams=grams)
+
+
+def create_fts(apps, schema_editor):
+    # Adding a column with a default rebuilds the SQLite table, which drops the FTS triggers
+    create_fts_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food_detection', '0005_catalogueversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_fts),
+        migrations.AddField(
+            model_name='food',
+            name='basis_grams',
+            field=models.FloatField(blank=True, default=100, null=True),
+        ),
+        migrations.RunPython(create_fts, migrations.RunPython.noop),
+        migrations.RunPython(mark_per_serving_seeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from .inference import INPUT_SHAPE, load_engine, read_model
+
+logger = logging.getLogger(__name__)
+
+UNLOADED = 'unloaded'
+LOADING = 'loading'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class ModelRegistry:
+    """Loads the inference engine once per process, on first use or on warmup.
+
+    ``preload`` only reads the model file, for the gunicorn master to do
+    before forking so that workers share its pages copy-on-write; each worker
+    still builds its own engine, as runtimes started before a fork (such as
+    TensorFlow's thread pools) do not work in the child. ``load`` builds the
+    engine and ``warmup`` additionally runs a dummy inference to trigger
+    graph tracing and marks the registry ready.
+    """
+
+    def __init__(self, loader, reader=None):
+        self.loader = loader
+        self.reader = reader
+        self.model = None
+        self.engine = None
+        self.state = UNLOADED
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._lock = threading.RLock()
+
+    @property
+    def is_ready(self):
+        return self.state == READY
+
+    def preload(self):
+        """Reads the model for engines built later; False if the engine can't."""
+        with self._lock:
+            if self.model is None and self.reader is not None:
+                self.model = self.reader()
+            return self.model is not None
+
+    def load(self):
+        with self._lock:
+            if self.engine is not None:
+                return self.engine
+            self.state = LOADING
+            started = time.perf_counter()
+            try:
+                self.engine = self.loader(model=self.model) if self.model is not None else self.loader()
+            except Exception as e:
+                self.state = FAILED
+                self.error = str(e)
+                logger.error(f"Error loading model: {str(e)}")
+                raise ValueError("Model not loaded") from e
+            self.load_seconds = time.perf_counter() - started
+            self.state = WARMING
+            self.error = None
+            logger.info(f"Successfully loaded {self.engine.name} inference engine in {self.load_seconds:.2f}s")
+            return self.engine
+
+    def warmup(self):
+        with self._lock:
+            engine = self.load()
+            if self.state == READY:
+                return engine
+            started = time.perf_counter()
+            try:
+                engine.predict(np.zeros((1,) + INPUT_SHAPE, dtype=np.float32))
+            except Exception as e:
+                self.state = FAILED
+                self.error = str(e)
+                logger.error(f"Error warming up model: {str(e)}")
+                raise ValueError("Model warmup failed") from e
+            self.warmup_seconds = time.perf_counter() - started
+            self.state = READY
+            logger.info(f"Model warmed up in {self.warmup_seconds:.2f}s")
+            return engine
+
+    def warmup_async(self):
+        # Used by the readiness probe so a cold process starts warming itself
+        if self.state != READY and self._lock.acquire(blocking=False):
+            try:
+                threading.Thread(
+                    target=self._warmup_quietly, name='model-warmup', daemon=True
+                ).start()
+            finally:
+                self._lock.release()
+
+    def _warmup_quietly(self):
+        try:
+            self.warmup()
+        except ValueError:
+            pass
+
+    def get(self):
+        if self.state == READY:
+            return self.engine
+        return self.warmup()
+
+    def status(self):
+        return {
+            'engine': self.engine.name if self.engine is not None else None,
+            'state': self.state,
+            'ready': self.is_ready,
+            'error': self.error,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds,
+        }
+
+
+registry = ModelRegistry(load_engine, read_model)
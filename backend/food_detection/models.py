@@ -2,14 +2,23 @@ from django.db import models
 from django.conf import settings
 from datetime import datetime
 
+from nutrition.firebase import get_db
+
+from .catalogue import FoodCatalogueCache
+from .executors import firestore_executor, run_in_executor
+
 class Food(models.Model):
-    name = models.CharField(max_length=100)
-    category = models.CharField(max_length=50)
+    name = models.CharField(max_length=100, unique=True)
+    category = models.CharField(max_length=50, db_index=True)
     calories = models.IntegerField()
     protein = models.FloatField()
     carbs = models.FloatField()
     fat = models.FloatField()
-    food_class = models.CharField(max_length=100)
+    image_url = models.URLField(max_length=500, blank=True)
+    food_class = models.CharField(max_length=100, db_index=True)
+    # Grams the nutrient values are for: 100, or the weight of the serving
+    # they describe; empty for per-serving values of unknown weight
+    basis_grams = models.FloatField(null=True, blank=True, default=100)
 
     def __str__(self):
         return self.name
@@ -27,107 +36,148 @@ class DetectionHistory(models.Model):
 
     class Meta:
         ordering = ['-detected_at']
-# Only define Firestore models if Firebase is configured
-if hasattr(settings, 'db') and settings.db is not None:
-    class FirestoreFood:
-        def __init__(self, id=None, name=None, category=None, calories=None, 
-                     protein=None, carbs=None, fat=None, image_url=None, 
-                     food_class=None, created_at=None, updated_at=None):
-            self.id = id
-            self.name = name
-            self.category = category
-            self.calories = calories
-            self.protein = protein
-            self.carbs = carbs
-            self.fat = fat
-            self.image_url = image_url
-            self.food_class = food_class
-            self.created_at = created_at
-            self.updated_at = updated_at
-
-        @classmethod
-        def from_dict(cls, data):
-            return cls(**data)
-
-        def to_dict(self):
-            return {
-                'name': self.name,
-                'category': self.category,
-                'calories': self.calories,
-                'protein': self.protein,
-                'carbs': self.carbs,
-                'fat': self.fat,
-                'image_url': self.image_url,
-                'food_class': self.food_class,
-                'created_at': self.created_at,
-                'updated_at': self.updated_at
-            }
-
-        @classmethod
-        async def get_all(cls):
-            foods_ref = settings.db.collection('foods')
-            docs = foods_ref.stream()
-            return [cls.from_dict(doc.to_dict()) for doc in docs]
-
-        @classmethod
-        async def get_by_category(cls, category):
-            foods_ref = settings.db.collection('foods')
-            docs = foods_ref.where('category', '==', category).stream()
-            return [cls.from_dict(doc.to_dict()) for doc in docs]
-
-        @classmethod
-        async def get_by_id(cls, food_id):
-            food_ref = settings.db.collection('foods').document(food_id)
-            doc = food_ref.get()
-            if doc.exists:
-                return cls.from_dict(doc.to_dict())
-            return None
-
-        async def save(self):
-            foods_ref = settings.db.collection('foods')
-            if self.id:
-                foods_ref.document(self.id).set(self.to_dict())
-            else:
-                doc_ref = foods_ref.document()
-                self.id = doc_ref.id
-                doc_ref.set(self.to_dict())
-
-    class FirestoreDetectionHistory:
-        def __init__(self, id=None, food_id=None, image_url=None, confidence=None, detected_at=None):
-            self.id = id
-            self.food_id = food_id
-            self.image_url = image_url
-            self.confidence = confidence
-            self.detected_at = detected_at
-
-        @classmethod
-        def from_dict(cls, data):
-            return cls(**data)
-
-        def to_dict(self):
-            return {
-                'food_id': self.food_id,
-                'image_url': self.image_url,
-                'confidence': self.confidence,
-                'detected_at': self.detected_at
-            }
-
-        @classmethod
-        async def get_all(cls):
-            detections_ref = settings.db.collection('detections')
-            docs = detections_ref.stream()
-            return [cls.from_dict(doc.to_dict()) for doc in docs]
-
-        async def save(self):
-            detections_ref = settings.db.collection('detections')
-            if self.id:
-                detections_ref.document(self.id).set(self.to_dict())
-            else:
-                doc_ref = detections_ref.document()
-                self.id = doc_ref.id
-                doc_ref.set(self.to_dict())
-
-# Make Firestore classes available even if Firebase is not configured
-else:
-    FirestoreFood = None
-    FirestoreDetectionHistory = None 
+
+# Maps a classifier output class (ImageNet id) to a Food row
+class ClassLabelMapping(models.Model):
+    class_id = models.PositiveSmallIntegerField(unique=True)
+    label = models.CharField(max_length=100)
+    food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name='class_mappings')
+
+    def __str__(self):
+        return f"{self.class_id} {self.label} -> {self.food.name}"
+
+    class Meta:
+        ordering = ['class_id']
+
+# Single row counting changes to Food and ClassLabelMapping, so every process
+# can tell when its cached copies of them are stale
+class CatalogueVersion(models.Model):
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Catalogue v{self.version}"
+
+# Firestore counterparts, used by the views when nutrition.firebase can
+# create a client; nothing here touches Firestore until it is called
+class FirestoreFood:
+    def __init__(self, id=None, name=None, category=None, calories=None, 
+                 protein=None, carbs=None, fat=None, image_url=None, 
+                 food_class=None, created_at=None, updated_at=None):
+        self.id = id
+        self.name = name
+        self.category = category
+        self.calories = calories
+        self.protein = protein
+        self.carbs = carbs
+        self.fat = fat
+        self.image_url = image_url
+        self.food_class = food_class
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'category': self.category,
+            'calories': self.calories,
+            'protein': self.protein,
+            'carbs': self.carbs,
+            'fat': self.fat,
+            'image_url': self.image_url,
+            'food_class': self.food_class,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    # Reads are served from the in-memory catalogue snapshot; only
+    # (re)loading it touches Firestore, on the bounded firestore executor
+    # so the coroutines never stall the event loop
+    @classmethod
+    async def _catalogue(cls):
+        snapshot = food_catalogue.current()
+        if snapshot is None:
+            snapshot = await run_in_executor(firestore_executor, food_catalogue.load)
+        return snapshot
+
+    @classmethod
+    async def get_all(cls):
+        return list((await cls._catalogue()).foods)
+
+    @classmethod
+    async def get_by_category(cls, category):
+        return list((await cls._catalogue()).by_category.get(category, ()))
+
+    @classmethod
+    async def get_by_name(cls, name):
+        return (await cls._catalogue()).by_name.get(name.lower())
+
+    @classmethod
+    async def get_by_id(cls, food_id):
+        return (await cls._catalogue()).by_id.get(food_id)
+
+    async def save(self):
+        foods_ref = get_db().collection('foods')
+        if self.id:
+            doc_ref = foods_ref.document(self.id)
+        else:
+            doc_ref = foods_ref.document()
+            self.id = doc_ref.id
+        await run_in_executor(firestore_executor, doc_ref.set, self.to_dict())
+        # The listener, if any, picks the change up by itself
+        if not food_catalogue.listen:
+            food_catalogue.invalidate()
+
+food_catalogue = FoodCatalogueCache(
+    lambda: get_db().collection('foods'),
+    FirestoreFood.from_dict,
+    ttl=getattr(settings, 'FIRESTORE_CATALOGUE_TTL', 300),
+    listen=getattr(settings, 'FIRESTORE_CATALOGUE_LISTEN', False),
+)
+
+class FirestoreDetectionHistory:
+    def __init__(self, id=None, food_id=None, image_url=None, confidence=None, detected_at=None):
+        self.id = id
+        self.food_id = food_id
+        self.image_url = image_url
+        self.confidence = confidence
+        self.detected_at = detected_at
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        return {
+            'food_id': self.food_id,
+            'image_url': self.image_url,
+            'confidence': self.confidence,
+            'detected_at': self.detected_at
+        }
+
+    @classmethod
+    async def get_all(cls):
+        detections_ref = get_db().collection('detections')
+        return await run_in_executor(firestore_executor, cls._fetch, detections_ref)
+
+    @classmethod
+    def _fetch(cls, query):
+        return [cls.from_dict(doc.to_dict()) for doc in query.stream()]
+
+    async def save(self):
+        return self.queue()
+
+    def queue(self):
+        # Queued and committed in batches by the write-behind buffer;
+        # document ids are generated client-side so self.id is final
+        from .history import firestore_history_buffer
+        detections_ref = get_db().collection('detections')
+        if self.id:
+            doc_ref = detections_ref.document(self.id)
+        else:
+            doc_ref = detections_ref.document()
+            self.id = doc_ref.id
+        return firestore_history_buffer.add((doc_ref, self.to_dict()))
@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class FoodCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'limit'
+    max_page_size = 200
+    ordering = ('name', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Firestore results are plain lists; return them whole, but in the
+        # same envelope so clients don't need to care which backend served them
+        self.unpaginated = isinstance(queryset, list)
+        if self.unpaginated:
+            return queryset
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.unpaginated:
+            return Response({'next': None, 'previous': None, 'results': data})
+        return super().get_paginated_response(data)
@@ -0,0 +1,215 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from .food_mapping import catalogue_version
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+def content_hash(data):
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def perceptual_hash(image):
+    """64-bit difference hash, stable across re-encoding and resizing."""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return np.packbits(bits).tobytes().hex()
+
+
+class LocalLRUBackend:
+    """In-process LRU with per-entry TTL and a total byte budget."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl)
+        self.bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return pickle.loads(value)
+
+    def set(self, key, value):
+        value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+        }
+
+
+class DjangoCacheBackend:
+    """Django cache framework; eviction is left to the configured backend."""
+
+    def __init__(self, alias, ttl):
+        self.alias = alias
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, timeout=self.ttl)
+
+    def stats(self):
+        return {'alias': self.alias}
+
+
+class DetectionResultCache:
+    """Detection results keyed by a hash of the uploaded bytes.
+
+    Keys include the inference engine and the food mapping version, so
+    switching models or editing the catalogue never serves stale results.
+    With ``perceptual`` enabled, a byte-level miss falls back to a lookup by
+    perceptual hash of the decoded image, which catches re-encoded uploads.
+    """
+
+    def __init__(self, backend, perceptual=False):
+        self.backend = backend
+        self.perceptual = perceptual
+        self.hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+
+    def _key(self, kind, digest):
+        engine = getattr(settings, 'DETECTION_INFERENCE_ENGINE', 'compiled')
+        mapping_version = catalogue_version()
+        return f'detect:{engine}:{mapping_version}:{kind}:{digest}'
+
+    def lookup(self, image_bytes, decode):
+        """Returns (entry, image, keys).
+
+        On a hit ``entry`` is set and the image is not decoded. On a miss
+        ``image`` is the decoded image (None if it can't be decoded) and
+        ``keys`` must be passed to ``store`` with the computed entry.
+        """
+        byte_key = self._key('bytes', content_hash(image_bytes))
+        entry = self.backend.get(byte_key)
+        if entry is not None:
+            self.hits += 1
+            return entry, None, ()
+
+        image = decode(image_bytes)
+        if image is None:
+            return None, None, ()
+
+        if self.perceptual:
+            perceptual_key = self._key('dhash', perceptual_hash(image))
+            entry = self.backend.get(perceptual_key)
+            if entry is not None:
+                self.perceptual_hits += 1
+                self.backend.set(byte_key, entry)
+                return entry, None, ()
+            keys = (byte_key, perceptual_key)
+        else:
+            keys = (byte_key,)
+
+        self.misses += 1
+        return None, image, keys
+
+    def store(self, keys, entry):
+        for key in keys:
+            self.backend.set(key, entry)
+
+    def get_or_detect(self, image_bytes, decode, detect):
+        """Returns (entry, hit); entry is None when the image can't be decoded.
+
+        ``detect`` is called with the decoded image on a miss and must return
+        the cache entry to store.
+        """
+        entry, image, keys = self.lookup(image_bytes, decode)
+        if entry is not None:
+            return entry, True
+        if image is None:
+            return None, False
+        entry = detect(image)
+        self.store(keys, entry)
+        return entry, False
+
+    def stats(self):
+        lookups = self.hits + self.perceptual_hits + self.misses
+        return {
+            'hits': self.hits,
+            'perceptual_hits': self.perceptual_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.perceptual_hits) / lookups if lookups else 0.0,
+            **self.backend.stats(),
+        }
+
+
+class NullCache:
+    def lookup(self, image_bytes, decode):
+        return None, decode(image_bytes), ()
+
+    def store(self, keys, entry):
+        pass
+
+    def get_or_detect(self, image_bytes, decode, detect):
+        image = decode(image_bytes)
+        if image is None:
+            return None, False
+        return detect(image), False
+
+    def stats(self):
+        return {'enabled': False}
+
+
+def build_result_cache():
+    backend = getattr(settings, 'DETECTION_CACHE_BACKEND', 'local')
+    ttl = getattr(settings, 'DETECTION_CACHE_TTL', 300)
+    if backend == 'none':
+        return NullCache()
+    if backend == 'django':
+        store = DjangoCacheBackend(getattr(settings, 'DETECTION_CACHE_ALIAS', 'default'), ttl)
+    else:
+        store = LocalLRUBackend(getattr(settings, 'DETECTION_CACHE_MAX_BYTES', 16 * 1024 * 1024), ttl)
+    return DetectionResultCache(store, perceptual=getattr(settings, 'DETECTION_CACHE_PERCEPTUAL', False))
+
+
+result_cache = build_result_cache()
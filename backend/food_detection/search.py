@@ -0,0 +1,190 @@
+import base64
+import json
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from .models import Food
+
+PREFIX_TABLE = 'food_detection_food_fts'
+TRIGRAM_TABLE = 'food_detection_food_trigram'
+
+FTS_TABLES = {
+    # Ranked word-prefix matching on names
+    PREFIX_TABLE: "tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'",
+    # Substring / typo-tolerant matching on name trigrams
+    TRIGRAM_TABLE: "tokenize='trigram'",
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def create_fts_index(schema_editor):
+    """Creates the SQLite FTS5 tables and the triggers that keep them in sync.
+
+    Triggers cover bulk inserts and raw updates as well as model saves. Any
+    migration that makes SQLite rebuild food_detection_food drops them, so it
+    has to call this again afterwards.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, options in FTS_TABLES.items():
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"name, content='food_detection_food', content_rowid='id', {options})"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON food_detection_food BEGIN "
+            f"INSERT INTO {table}(rowid, name) VALUES (new.id, new.name); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON food_detection_food BEGIN "
+            f"INSERT INTO {table}({table}, rowid, name) VALUES ('delete', old.id, old.name); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF name ON food_detection_food BEGIN "
+            f"INSERT INTO {table}({table}, rowid, name) VALUES ('delete', old.id, old.name); "
+            f"INSERT INTO {table}(rowid, name) VALUES (new.id, new.name); END"
+        )
+        schema_editor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def drop_fts_index(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in FTS_TABLES:
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def _prefix_query(tokens):
+    # Every word must match as a prefix: "chick brea" -> "chick"* AND "brea"*
+    return ' AND '.join(f'"{token}"*' for token in tokens)
+
+
+def _trigrams(tokens):
+    return sorted({token[i:i + 3] for token in tokens for i in range(len(token) - 2)})
+
+
+def _trigram_query(trigrams):
+    # Any shared trigram matches, which tolerates typos such as "chiken"
+    return ' OR '.join(f'"{trigram}"' for trigram in trigrams)
+
+
+def _similarity(trigrams):
+    # Most shared query trigrams first, then the names with the fewest other
+    # trigrams (Jaccard); negated to sort first
+    shared = ' + '.join(['(instr(lower(name), %s) > 0)'] * len(trigrams))
+    sql = f"-(({shared}) * (1.0 + 1.0 / ({len(trigrams)} + max(length(name) - 2, 1) - ({shared}))))"
+    return sql, list(trigrams) * 2
+
+
+def _ranked_ids(table, match, category, after, limit, similarity=None):
+    # Word-prefix matches are all ranked, so every match is reachable through
+    # the cursor. Fuzzy matches share a trigram with the query, which can be
+    # most of the catalogue; only the FOOD_SEARCH_MAX_CANDIDATES best by FTS
+    # rank (the most, and the rarest, shared trigrams) are scored. bm25 does
+    # not order the results: its term weights count every match in the
+    # catalogue
+    candidates = f"SELECT {table}.rowid AS id, {table}.name AS name FROM {table} "
+    if category:
+        candidates += f"JOIN food_detection_food f ON f.id = {table}.rowid "
+    candidates += f"WHERE {table} MATCH %s"
+    params = [match]
+    if category:
+        candidates += " AND f.category = %s"
+        params.append(category)
+    if similarity:
+        candidates += f" ORDER BY {table}.rank LIMIT %s"
+        params.append(getattr(settings, 'FOOD_SEARCH_MAX_CANDIDATES', 200))
+
+    rank, rank_params = similarity or ('0', [])
+    # Shorter names are closer matches
+    sql = f"SELECT id, {rank} AS rank, length(name) AS score FROM ({candidates})"
+    params = rank_params + params
+    if after:
+        sql = f"SELECT id, rank, score FROM ({sql}) WHERE (rank, score, id) > (%s, %s, %s)"
+        params += list(after)
+    sql += " ORDER BY rank, score, id LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search_foods(query, category=None, limit=50, cursor=None):
+    """Ranked search over Food names; returns (foods, next_cursor).
+
+    Word-prefix matches are tried first; when they find nothing the query is
+    retried as a fuzzy trigram match. The cursor records which of the two
+    produced the page and the (rank, score, id) of its last row. Shorter names
+    rank first, fuzzy matches after ranking by the trigrams they share with
+    the query. Fuzzy results stop after the FOOD_SEARCH_MAX_CANDIDATES
+    closest matches.
+    """
+    tokens = [token.lower() for token in _TOKEN_RE.findall(query)]
+    if not tokens:
+        return [], None
+
+    mode, after = 'prefix', None
+    if cursor:
+        position = decode_cursor(cursor)
+        try:
+            mode = position['mode']
+            after = (position['rank'], position['score'], position['id'])
+        except (AttributeError, KeyError, TypeError):
+            raise ValueError("Invalid cursor")
+
+    if connection.vendor != 'sqlite' or mode == 'fallback':
+        return _search_fallback(query, category, limit, after)
+
+    try:
+        rows = []
+        if mode == 'prefix':
+            rows = _ranked_ids(PREFIX_TABLE, _prefix_query(tokens), category, after, limit + 1)
+            if not rows and after is None:
+                mode = 'fuzzy'
+        if mode == 'fuzzy':
+            trigrams = _trigrams(tokens)
+            if trigrams:
+                rows = _ranked_ids(TRIGRAM_TABLE, _trigram_query(trigrams), category, after, limit + 1,
+                                   similarity=_similarity(trigrams))
+    except DatabaseError:
+        # FTS5 tables missing (migration not applied or no FTS5 support)
+        return _search_fallback(query, category, limit, after)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        food_id, rank, score = rows[-1]
+        next_cursor = encode_cursor({'mode': mode, 'rank': rank, 'score': score, 'id': food_id})
+
+    foods = Food.objects.in_bulk([row[0] for row in rows])
+    return [foods[row[0]] for row in rows if row[0] in foods], next_cursor
+
+
+def _search_fallback(query, category, limit, after):
+    queryset = Food.objects.filter(name__icontains=query).order_by('id')
+    if category:
+        queryset = queryset.filter(category=category)
+    if after:
+        queryset = queryset.filter(id__gt=after[-1])
+    foods = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(foods) > limit:
+        foods = foods[:limit]
+        next_cursor = encode_cursor({'mode': 'fallback', 'rank': 0, 'score': 0, 'id': foods[-1].id})
+    return foods, next_cursor
@@ -11,7 +11,7 @@ class DetectionHistorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = DetectionHistory
-        fields = ['id', 'food', 'image', 'confidence', 'detected_at']
+        fields = ['id', 'food', 'confidence', 'detected_at']
 
 class FoodDetectionRequestSerializer(serializers.Serializer):
     image = serializers.CharField(required=True)  # Base64 encoded image 
\ No newline at end of file
@@ -0,0 +1,600 @@
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+import cv2
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from nutrition.firestore_fake import FakeFirestore
+
+from .batching import BatchScheduler, SchedulerSaturated
+from .columns import FoodColumnsCache
+from .firestore_sync import MAX_BATCH_WRITES, FoodCatalogueSync, FoodSyncState
+from .food_mapping import bump_catalogue_version, food_mapping, version_cache
+from .history import WriteBehindBuffer, firestore_history_buffer, record_detection
+from .imagenet import NUM_CLASSES, ClassTable
+from .model_registry import ModelRegistry
+from .models import ClassLabelMapping, Food, food_catalogue
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class StubEngine:
+    """Scores every image as ImageNet class 0, recording the batch sizes."""
+
+    name = 'stub'
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, batch):
+        self.batches.append(len(batch))
+        probabilities = np.zeros((len(batch), NUM_CLASSES), dtype=np.float32)
+        probabilities[:, 0] = 0.9
+        return probabilities
+
+
+def upload(seed, name='meal.png'):
+    # A distinct image per seed, so uploads never hit each other in the result cache
+    image = np.random.default_rng(seed).integers(0, 256, (32, 32, 3), dtype=np.uint8)
+    return SimpleUploadedFile(name, cv2.imencode('.png', image)[1].tobytes(), content_type='image/png')
+
+
+class DetectionTestCase(TestCase):
+    """Runs the detection views on StubEngine, with class 0 mapped to Apple."""
+
+    def setUp(self):
+        self.food, _ = Food.objects.update_or_create(name='Apple', defaults={
+            'category': 'Fruit', 'calories': 52, 'protein': 0.3, 'carbs': 14.0, 'fat': 0.2, 'food_class': 'apple',
+        })
+        ClassLabelMapping.objects.create(class_id=0, label='apple', food=self.food)
+        self.engine = StubEngine()
+        self.history = WriteBehindBuffer(lambda events: None, 'test-history', mode='request')
+        class_table = ClassTable([(f'n{i:08d}', f'class_{i}') for i in range(NUM_CLASSES)])
+        for patcher in (mock.patch('food_detection.views.registry', ModelRegistry(lambda: self.engine)),
+                        mock.patch('food_detection.views.get_class_table', return_value=class_table),
+                        mock.patch('food_detection.views.HAS_FIRESTORE', False),
+                        mock.patch('food_detection.history.history_buffer', self.history)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        food_mapping.invalidate()
+        self.addCleanup(food_mapping.invalidate)
+        version_cache.invalidate()
+
+
+class CatalogueVersionTests(DetectionTestCase):
+    def test_detection_makes_no_queries_once_warm(self):
+        response = self.client.post('/api/detect/', {'image': upload(1)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['detected_foods'][0]['name'], 'Apple')
+
+        with self.assertNumQueries(0):
+            for seed in (2, 3):
+                self.assertEqual(self.client.post('/api/detect/', {'image': upload(seed)}).status_code, 200)
+        self.assertEqual(self.history.pending, 3)
+
+    def test_version_is_reread_after_the_ttl(self):
+        with mock.patch.object(version_cache, 'ttl', 60):
+            version = version_cache.get()
+            reads = version_cache.reads
+            # Without its commit callback, the bump looks like another process's
+            with self.captureOnCommitCallbacks(execute=False):
+                bump_catalogue_version()
+            self.assertEqual(version_cache.get(), version)
+            self.assertEqual(version_cache.reads, reads)
+
+            with mock.patch('food_detection.food_mapping.time.monotonic', return_value=time.monotonic() + 61):
+                self.assertEqual(version_cache.get(), version + 1)
+            self.assertEqual(version_cache.reads, reads + 1)
+
+    def test_bump_is_seen_at_once_by_the_writing_process(self):
+        version = version_cache.get()
+        with mock.patch.object(version_cache, 'ttl', 60), self.captureOnCommitCallbacks(execute=True):
+            bump_catalogue_version()
+        self.assertEqual(version_cache.get(), version + 1)
+
+
+class BatchSchedulerTests(SimpleTestCase):
+    def scheduler(self, **kwargs):
+        self.engine = StubEngine()
+        return BatchScheduler(self.engine.predict, **kwargs)
+
+    def image(self):
+        return np.zeros((2, 2, 3), dtype=np.float32)
+
+    def submit_together(self, scheduler, count):
+        barrier = threading.Barrier(count)
+
+        def submit(_):
+            barrier.wait()
+            return scheduler.submit(self.image(), timeout=5)
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            return list(executor.map(submit, range(count)))
+
+    def test_admission_beyond_max_pending_is_rejected(self):
+        scheduler = self.scheduler(max_pending=4)
+        release = scheduler.admit(3)
+        with self.assertRaises(SchedulerSaturated) as raised:
+            scheduler.admit(2)
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual((scheduler.in_flight, scheduler.rejected), (3, 1))
+
+        release(2)
+        with scheduler.admission(2):
+            self.assertEqual(scheduler.in_flight, 3)
+        release()
+        release()
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_oversized_request_is_admitted_when_idle(self):
+        scheduler = self.scheduler(max_pending=4)
+        with scheduler.admission(10):
+            with self.assertRaises(SchedulerSaturated):
+                scheduler.admit(1)
+        scheduler.admit(1)()
+
+    def test_admitted_images_form_one_batch(self):
+        scheduler = self.scheduler(max_batch_size=8, max_wait_ms=5000)
+        with scheduler.admission(4):
+            started = time.monotonic()
+            results = self.submit_together(scheduler, 4)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(self.engine.batches, [4])
+        self.assertEqual(len(results), 4)
+
+    def test_batches_are_split_at_max_batch_size(self):
+        scheduler = self.scheduler(max_batch_size=4, max_wait_ms=5000)
+        started = time.monotonic()
+        with scheduler.admission(10) as release:
+            futures = [scheduler.submit_async(self.image()) for _ in range(10)]
+            for future in futures:
+                # As detect_foods_in_uploads does, so the last batch doesn't
+                # wait for images that have already run
+                future.add_done_callback(lambda _: release(1))
+            for future in futures:
+                future.result(timeout=5)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(sorted(self.engine.batches), [2, 4, 4])
+
+    def test_released_slots_are_not_waited_for(self):
+        scheduler = self.scheduler(max_wait_ms=5000)
+        with scheduler.admission(3) as release:
+            release(2)
+            started = time.monotonic()
+            scheduler.submit(self.image(), timeout=5)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(self.engine.batches, [1])
+
+    def test_full_queue_is_rejected(self):
+        blocked = threading.Event()
+        scheduler = BatchScheduler(lambda batch: blocked.wait(5) and np.zeros((len(batch), 1)),
+                                   max_batch_size=1, max_pending=2)
+        futures = [scheduler.submit_async(self.image())]
+        self.assertTrue(wait_for(lambda: scheduler.stats()['pending'] == 0))
+        futures += [scheduler.submit_async(self.image()) for _ in range(2)]
+        with self.assertRaises(SchedulerSaturated):
+            scheduler.submit_async(self.image())
+        blocked.set()
+        for future in futures:
+            future.result(timeout=5)
+
+
+class DetectionBackPressureTests(DetectionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.scheduler = BatchScheduler(self.engine.predict, max_batch_size=8, max_wait_ms=5000, max_pending=4)
+        for target in ('food_detection.views.scheduler', 'food_detection.async_views.scheduler'):
+            patcher = mock.patch(target, self.scheduler)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_saturated_scheduler_answers_503(self):
+        release = self.scheduler.admit(4)
+        self.addCleanup(release)
+        response = self.client.post('/api/detect/', {'image': upload(10)})
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+        response = self.client.post('/api/detect/batch/', {'images': [upload(11), upload(12)]})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.engine.batches, [])
+
+    def test_batch_only_waits_for_the_images_it_submits(self):
+        self.client.post('/api/detect/', {'image': upload(20)})
+        # Leaves out the model warmup's batch
+        self.engine.batches.clear()
+        images = [upload(20, 'hit.png'), upload(21), upload(21, 'repeat.png'),
+                  SimpleUploadedFile('broken.png', b'not an image'), upload(22)]
+        started = time.monotonic()
+        with self.assertLogs('food_detection.preprocessing', 'ERROR'):
+            response = self.client.post('/api/detect/batch/', {'images': images})
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([('detected_foods' in result) for result in results], [True, True, True, False, True])
+        self.assertEqual(self.engine.batches, [2])
+        self.assertEqual(self.scheduler.in_flight, 0)
+
+    async def test_async_batch_only_waits_for_the_images_it_submits(self):
+        # Loaded here, so the executor thread running the batch needs no queries
+        await sync_to_async(food_mapping.get)()
+        images = [upload(30), upload(30, 'repeat.png'), SimpleUploadedFile('broken.png', b'not an image'), upload(31)]
+        started = time.monotonic()
+        with self.assertLogs('food_detection.preprocessing', 'ERROR'):
+            response = await self.async_client.post('/api/detect/batch/', {'images': images})
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 4)
+        self.assertEqual(self.engine.batches[-1], 2)
+        self.assertEqual(self.scheduler.in_flight, 0)
+
+
+class FirestoreFoodListTests(TestCase):
+    def setUp(self):
+        self.db = FakeFirestore()
+        foods = self.db.collection('foods')
+        for food_id, name, category in ((1, 'Banana', 'Fruit'), (2, 'Apple', 'Fruit'), (3, 'Carrot', 'Vegetable')):
+            foods.document(str(food_id)).set({
+                'name': name, 'category': category, 'calories': 50, 'protein': 1.0,
+                'carbs': 10.0, 'fat': 0.5, 'image_url': '', 'food_class': name.lower(),
+            })
+        for patcher in (mock.patch('nutrition.firebase._db', self.db),
+                        mock.patch('food_detection.views.HAS_FIRESTORE', True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        food_catalogue.invalidate()
+        self.addCleanup(food_catalogue.invalidate)
+
+    def test_foods_are_served_from_the_catalogue_snapshot(self):
+        loads = food_catalogue.loads
+        response = self.client.get('/api/foods/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([food['name'] for food in response.json()['results']], ['Apple', 'Banana', 'Carrot'])
+        self.assertEqual(food_catalogue.loads, loads + 1)
+
+        reads = self.db.reads
+        response = self.client.get('/api/foods/?category=Vegetable')
+        self.assertEqual([food['id'] for food in response.json()['results']], [3])
+        self.client.get('/api/foods/')
+        self.assertEqual(self.db.reads, reads)
+        self.assertEqual(food_catalogue.loads, loads + 1)
+
+    def test_snapshot_is_reloaded_after_invalidation(self):
+        self.client.get('/api/foods/')
+        self.db.collection('foods').document('4').set({
+            'name': 'Date', 'category': 'Fruit', 'calories': 280, 'protein': 2.0,
+            'carbs': 75.0, 'fat': 0.4, 'image_url': '', 'food_class': 'date',
+        })
+        self.assertEqual(len(self.client.get('/api/foods/').json()['results']), 3)
+
+        food_catalogue.invalidate()
+        self.assertEqual(len(self.client.get('/api/foods/').json()['results']), 4)
+
+
+class WriteBehindBufferTests(SimpleTestCase):
+    def buffer(self, flush_fn=None, **kwargs):
+        self.batches = []
+        buffer = WriteBehindBuffer(flush_fn or self.batches.append, 'test', **kwargs)
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    def test_flush_writes_batches_of_max_batch(self):
+        buffer = self.buffer(max_batch=3, flush_interval=60, mode='request')
+        for event in range(7):
+            buffer.add(event)
+        self.assertTrue(buffer.should_flush())
+        buffer.flush()
+        self.assertEqual(self.batches, [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual((buffer.flushed, buffer.pending), (7, 0))
+
+    def test_thread_flushes_once_max_batch_is_pending(self):
+        buffer = self.buffer(max_batch=2, flush_interval=60)
+        buffer.add('a')
+        time.sleep(0.05)
+        self.assertEqual(self.batches, [])
+        buffer.add('b')
+        self.assertTrue(wait_for(lambda: self.batches == [['a', 'b']]))
+
+    def test_thread_flushes_after_flush_interval(self):
+        buffer = self.buffer(max_batch=100, flush_interval=0.05)
+        buffer.add('a')
+        self.assertTrue(wait_for(lambda: self.batches == [['a']]))
+
+    def test_request_mode_flushes_when_due(self):
+        buffer = self.buffer(max_batch=100, flush_interval=0.05, mode='request')
+        buffer.add('a')
+        buffer.flush_if_due()
+        self.assertEqual(self.batches, [])
+        time.sleep(0.06)
+        buffer.flush_if_due()
+        self.assertEqual(self.batches, [['a']])
+
+    def test_stop_drains_pending_events(self):
+        buffer = self.buffer(max_batch=100, flush_interval=60)
+        for event in range(5):
+            buffer.add(event)
+        buffer.stop()
+        self.assertEqual(self.batches, [[0, 1, 2, 3, 4]])
+
+    def test_events_beyond_max_pending_are_dropped(self):
+        buffer = self.buffer(max_batch=2, max_pending=3, flush_interval=60, mode='request')
+        self.assertEqual([buffer.add(event) for event in range(4)], [True, True, True, False])
+        self.assertEqual((buffer.pending, buffer.dropped), (3, 1))
+
+    def test_failed_flush_requeues_and_backs_off(self):
+        failing = threading.Event()
+        failing.set()
+
+        def flush_fn(batch):
+            if failing.is_set():
+                raise ConnectionError('backend down')
+            self.batches.append(batch)
+
+        buffer = self.buffer(flush_fn, max_batch=2, flush_interval=60, mode='request')
+        buffer.add('a')
+        buffer.add('b')
+        with self.assertLogs('food_detection.history', 'ERROR'):
+            buffer.flush()
+        self.assertEqual((buffer.pending, buffer.flush_errors), (2, 1))
+        self.assertFalse(buffer.should_flush())
+
+        failing.clear()
+        buffer.stop()
+        self.assertEqual(self.batches, [['a', 'b']])
+
+    def test_rejected_events_do_not_hold_up_the_batch(self):
+        def flush_fn(batch):
+            if 'bad' in batch:
+                raise ValueError('bad event')
+            self.batches.append(batch)
+
+        buffer = self.buffer(flush_fn, max_batch=3, flush_interval=60, mode='request',
+                             reject_errors=(ValueError,))
+        for event in ('a', 'bad', 'b'):
+            buffer.add(event)
+        with self.assertLogs('food_detection.history', 'WARNING'):
+            buffer.flush()
+        self.assertEqual(self.batches, [['a'], ['b']])
+        self.assertEqual((buffer.flushed, buffer.rejected, buffer.pending), (2, 1, 0))
+
+
+class FirestoreDetectionHistoryTests(SimpleTestCase):
+    def test_detections_are_committed_to_firestore(self):
+        db = FakeFirestore()
+        with mock.patch('nutrition.firebase._db', db):
+            for food_id in (1, 2, 3):
+                self.assertTrue(record_detection(food_id, 0.9, firestore=True))
+            firestore_history_buffer.flush()
+        documents = [doc.to_dict() for doc in db.collection('detections').stream()]
+        self.assertEqual(sorted(document['food_id'] for document in documents), [1, 2, 3])
+        self.assertEqual(db.writes, 3)
+
+
+class FoodSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('load_food_data', str(Path(settings.BASE_DIR) / 'data' / 'food_dataset.csv'), stdout=StringIO())
+
+    def search(self, query, **params):
+        """Every page of /api/foods/?search=, followed through the cursor."""
+        names, url, data = [], '/api/foods/', {'search': query, **params}
+        while url:
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            names += [food['name'] for food in response.json()['results']]
+            url, data = response.json()['next'], None
+        return names
+
+    def test_prefix_matches_are_ranked_shortest_first(self):
+        names = self.search('ch', limit=10)
+        self.assertEqual([len(name) for name in names], sorted(len(name) for name in names))
+        self.assertIn('Chili', names[:20])
+        self.assertEqual(names[:2], sorted(names[:2]))
+
+    @override_settings(FOOD_SEARCH_MAX_CANDIDATES=50)
+    def test_pagination_reaches_every_prefix_match(self):
+        names = self.search('c', limit=200)
+        expected = {
+            food.name for food in Food.objects.all()
+            if any(word.lower().startswith('c') for word in re.findall(r'\w+', food.name))
+        }
+        self.assertGreater(len(expected), 200)
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(set(names), expected)
+        self.assertEqual(names[0], 'Cod')
+        self.assertTrue({'Carp', 'Cava'} <= set(names[:50]))
+
+    def test_category_filter_applies_before_ranking(self):
+        names = self.search('s', category='Fruits', limit=5)
+        self.assertTrue(names)
+        self.assertEqual(set(Food.objects.filter(name__in=names).values_list('category', flat=True)), {'Fruits'})
+
+    @override_settings(FOOD_SEARCH_MAX_CANDIDATES=20)
+    def test_fuzzy_matches_are_the_closest_candidates(self):
+        names = self.search('chiken', limit=5)
+        self.assertEqual(len(names), 20)
+        self.assertIn('Chicken', names[:5])
+
+
+class MealCalculatorTests(TestCase):
+    def setUp(self):
+        self.oats = Food.objects.create(
+            name='Test Oats', category='Grains', calories=380, protein=13, carbs=67, fat=7)
+        self.orange = Food.objects.create(
+            name='Test Orange', category='Fruits', calories=62, protein=1.2, carbs=15.4, fat=0.2, basis_grams=131)
+        self.burger = Food.objects.create(
+            name='Test Burger', category='Fast Food', calories=354, protein=20, carbs=29, fat=17, basis_grams=None)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        columns = FoodColumnsCache(Path(tmp.name) / 'food_columns.bin')
+        patcher = mock.patch('food_detection.views.food_columns', columns)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def calculate(self, items):
+        return self.client.post('/api/meals/calculate/', {'items': items}, content_type='application/json')
+
+    def test_values_are_scaled_by_each_foods_basis(self):
+        response = self.calculate([
+            {'food_id': self.oats.id, 'grams': 50},
+            {'food_id': self.orange.id, 'grams': 262},
+        ])
+        self.assertEqual(response.status_code, 200)
+        calories = response.json()['calories']
+        self.assertAlmostEqual(calories[0], 190.0, places=3)
+        self.assertAlmostEqual(calories[1], 124.0, places=3)
+
+    def test_servings_of_unknown_weight_are_rejected(self):
+        response = self.calculate([
+            {'food_id': self.oats.id, 'grams': 50},
+            {'food_id': self.burger.id, 'grams': 200},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['unweighed_food_ids'], [self.burger.id])
+
+
+class BuildClassMappingTests(TestCase):
+    def test_only_food_classes_are_mapped(self):
+        for name in ('Banana', 'Sweet Corn', 'Goose', 'Acorn', 'Eel'):
+            Food.objects.update_or_create(name=name, defaults={
+                'category': 'Test', 'calories': 100, 'protein': 1.0, 'carbs': 1.0, 'fat': 1.0,
+                'food_class': name.lower().replace(' ', '_'),
+            })
+        class_index = [
+            ('n01855672', 'goose'), ('n07753592', 'banana'), ('n12267677', 'acorn'),
+            ('n02526121', 'eel'), ('n12144580', 'corn'),
+        ]
+        with mock.patch('food_detection.management.commands.build_class_mapping.load_class_index',
+                        return_value=class_index):
+            call_command('build_class_mapping', '--replace', stdout=StringIO())
+        self.assertEqual(
+            list(ClassLabelMapping.objects.values_list('class_id', 'label', 'food__name')),
+            [(1, 'banana', 'Banana'), (4, 'corn', 'Sweet Corn')],
+        )
+
+
+def food_rows(count, start=1):
+    return [
+        {'id': food_id, 'name': f'Food {food_id}', 'category': 'Test', 'calories': food_id,
+         'protein': 1.0, 'carbs': 2.0, 'fat': 3.0, 'image_url': '', 'food_class': f'food_{food_id}'}
+        for food_id in range(start, start + count)
+    ]
+
+
+class FoodCatalogueSyncTests(SimpleTestCase):
+    def setUp(self):
+        self.db = FakeFirestore()
+        self.commits = []
+        batch = self.db.batch
+
+        def recording_batch():
+            write_batch = batch()
+            commit = write_batch.commit
+
+            def recorded_commit():
+                if self.fail_at == len(self.commits):
+                    self.commits.append(None)
+                    raise ConnectionError('deadline exceeded')
+                self.commits.append(len(write_batch))
+                return commit()
+
+            write_batch.commit = recorded_commit
+            return write_batch
+
+        self.fail_at = None
+        self.db.batch = recording_batch
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        self.state_path = os.path.join(state_dir.name, 'sync.json')
+
+    def documents(self):
+        return {doc.id: doc.to_dict() for doc in self.db.collection('foods').stream()}
+
+    def sync(self, **kwargs):
+        return FoodCatalogueSync(self.db, FoodSyncState(self.state_path), **kwargs)
+
+    def test_batch_size_is_within_the_firestore_limit(self):
+        for batch_size in (0, MAX_BATCH_WRITES + 1):
+            with self.subTest(batch_size=batch_size), self.assertRaises(ValueError):
+                self.sync(batch_size=batch_size)
+
+        result = self.sync().run(food_rows(1200))
+        self.assertEqual(sorted(self.commits), [200, 500, 500])
+        self.assertEqual((result['changed'], result['batches']), (1200, 3))
+        self.assertEqual(len(self.documents()), 1200)
+
+    def test_only_changed_foods_are_written_again(self):
+        foods = food_rows(7)
+        self.assertEqual(self.sync(batch_size=3, parallelism=1).run(foods)['batches'], 3)
+        self.assertEqual(self.commits, [3, 3, 1])
+
+        foods[2]['calories'] = 999
+        result = self.sync(batch_size=3).run(foods)
+        self.assertEqual((result['changed'], result['batches']), (1, 1))
+        self.assertEqual(self.documents()['3']['calories'], 999)
+        self.assertEqual(self.sync().run(foods)['changed'], 0)
+
+    def test_failed_run_resumes_from_the_checkpoint(self):
+        foods = food_rows(7)
+        self.fail_at = 1
+        with self.assertLogs('food_detection.firestore_sync', 'ERROR'), self.assertRaises(ConnectionError):
+            self.sync(batch_size=3, parallelism=1).run(foods)
+        self.assertEqual(len(FoodSyncState(self.state_path).hashes), 3)
+
+        self.fail_at = None
+        self.commits = []
+        result = self.sync(batch_size=3, parallelism=1).run(foods)
+        self.assertEqual((result['changed'], result['batches']), (4, 2))
+        self.assertEqual(self.commits, [3, 1])
+        self.assertEqual(sorted(self.documents(), key=int), [str(food_id) for food_id in range(1, 8)])
+
+    def test_prune_deletes_documents_of_removed_foods(self):
+        self.sync().run(food_rows(5))
+        remaining = food_rows(3)
+
+        self.assertEqual(self.sync().run(remaining)['deleted'], 0)
+        self.assertEqual(len(self.documents()), 5)
+
+        self.assertEqual(self.sync().run(remaining, prune=True, dry_run=True)['deleted'], 2)
+        self.assertEqual(len(self.documents()), 5)
+
+        result = self.sync().run(remaining, prune=True)
+        self.assertEqual((result['changed'], result['deleted']), (0, 2))
+        self.assertEqual(sorted(self.documents()), ['1', '2', '3'])
+        self.assertEqual(sorted(FoodSyncState(self.state_path).hashes), ['1', '2', '3'])
+
+    def test_refresh_state_rebuilds_a_lost_checkpoint(self):
+        foods = food_rows(4)
+        self.sync().run(foods)
+        os.remove(self.state_path)
+
+        sync = self.sync()
+        self.assertEqual(sync.refresh_state(), 4)
+        self.assertEqual(sync.run(foods)['changed'], 0)
+
+
+class SyncFirestoreFoodsCommandTests(TestCase):
+    def test_fake_sync_writes_every_food(self):
+        out = StringIO()
+        call_command('sync_firestore_foods', '--fake', '--batch-size', '1', stdout=out)
+        count = Food.objects.count()
+        self.assertIn(f'Wrote {count} changed foods and deleted 0 in {count} batches', out.getvalue())
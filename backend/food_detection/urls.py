@@ -7,6 +7,11 @@ router.register(r'foods', views.FoodViewSet, basename='food')
 router.register(r'detections', views.FoodDetectionViewSet, basename='detection')
 
 urlpatterns = [
+    path('foods/query/', views.food_query, name='food_query'),
     path('', include(router.urls)),
     path('detect/', views.detect_food, name='detect_food'),
+    path('detect/batch/', views.detect_food_batch, name='detect_food_batch'),
+    path('detect/stats/', views.detection_stats, name='detection_stats'),
+    path('meals/calculate/', views.calculate_meal, name='calculate_meal'),
+    path('ready/', views.readiness, name='readiness'),
 ] 
\ No newline at end of file
@@ -1,181 +1,220 @@
 import base64
-import io
-import json
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, parser_classes
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser
-from django.shortcuts import get_object_or_404
+from rest_framework.parsers import JSONParser, MultiPartParser
 from django.conf import settings
-from .models import Food, DetectionHistory
+from asgiref.sync import async_to_sync
+from nutrition.firebase import firestore_configured
+from rest_framework.utils.urls import replace_query_param
+from .batching import BatchScheduler, SchedulerSaturated
+from .columns import NUTRIENTS, food_columns
+from .food_mapping import food_mapping
+from .meals import UnknownFoods, UnweighedFoods, meal_macros
+from .history import firestore_history_buffer, history_buffer, record_detection
+from .imagenet import get_class_table, top_k
+from .metrics import detection_timings
+from .model_registry import registry
+from .pagination import FoodCursorPagination
+from .preprocessing import decode_image, input_buffer, preprocess_image
+from .result_cache import content_hash, result_cache
+from .search import search_foods
+from .models import Food, DetectionHistory, FirestoreDetectionHistory, FirestoreFood, food_catalogue
 from .serializers import (
     DetectionHistorySerializer,
     FoodDetectionRequestSerializer,
     FoodSerializer
 )
-import cv2
 import logging
-import tensorflow as tf
 
 logger = logging.getLogger(__name__)
 
-# Try to import Firestore models if available
-try:
-    from .models import FirestoreFood, FirestoreDetectionHistory
-    HAS_FIRESTORE = hasattr(settings, 'db') and settings.db is not None
-except ImportError:
-    HAS_FIRESTORE = False
-
-# Define common food classes directly in the code
-FOOD_CLASSES = [
-    'apple', 'banana', 'orange', 'sandwich', 'pizza', 'burger', 'hotdog', 
-    'rice', 'noodles', 'salad', 'bread', 'cake', 'donut', 'coffee', 'juice'
-]
-
-# Define non-food classes that might be detected
-NON_FOOD_CLASSES = [
-    'person', 'human', 'face', 'dog', 'cat', 'bird', 'car', 'truck', 'bus',
-    'chair', 'table', 'laptop', 'computer', 'phone', 'book', 'pen', 'pencil',
-    'desk', 'bed', 'sofa', 'couch', 'television', 'tv', 'monitor', 'keyboard',
-    'mouse', 'door', 'window', 'wall', 'floor', 'ceiling', 'light', 'lamp',
-    'clock', 'watch', 'shoe', 'boot', 'sock', 'shirt', 'pants', 'dress', 'hat',
-    'glasses', 'sunglasses', 'bag', 'backpack', 'purse', 'wallet', 'key', 'lock',
-    'bottle', 'cup', 'glass', 'bowl', 'plate', 'fork', 'spoon', 'knife'
-]
-
-# Load the pre-trained model
-try:
-    model = tf.keras.applications.MobileNetV2(
-        weights='imagenet',
-        include_top=True
-    )
-    logger.info("Successfully loaded MobileNetV2 model")
-except Exception as e:
-    logger.error(f"Error loading model: {str(e)}")
-    model = None
-
-def preprocess_image(image):
-    # Resize image to 224x224 (MobileNetV2 input size)
-    image = cv2.resize(image, (224, 224))
-    # Convert BGR to RGB
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    # Normalize
-    image = image / 255.0
-    # Add batch dimension
-    image = np.expand_dims(image, axis=0)
-    return image
+# Foods and detection history are served from Firestore when it is configured
+HAS_FIRESTORE = firestore_configured()
 
-def detect_food_in_image(image):
-    if model is None:
-        raise ValueError("Model not loaded")
-    
-    # Preprocess the image
-    processed_image = preprocess_image(image)
+# Concurrent requests share forward passes through the batch scheduler, whose
+# worker threads are the only place inference runs
+scheduler = BatchScheduler(
+    lambda batch: registry.get().predict(batch),
+    max_batch_size=getattr(settings, 'DETECTION_BATCH_MAX_SIZE', 8),
+    max_wait_ms=getattr(settings, 'DETECTION_BATCH_MAX_WAIT_MS', 5),
+    workers=getattr(settings, 'DETECTION_INFERENCE_WORKERS', 1),
+    max_pending=getattr(settings, 'DETECTION_INFERENCE_MAX_PENDING', 64),
+)
+
+# Decodes and preprocesses the images of one batch request in parallel
+upload_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'DETECTION_UPLOAD_THREADS', 8),
+    thread_name_prefix='detect-upload',
+)
+
+def classify_image(image):
+    """Returns the detection result and the (food_id, confidence) pairs to record."""
+    # Loads and warms the model on first use; raises ValueError on failure
+    registry.get()
+    class_table = get_class_table()
+    mapping = food_mapping.get()
+
+    # Preprocess the image into this thread's reusable input buffer
+    processed_image = preprocess_image(image, out=input_buffer())
     
-    # Get predictions
-    predictions = model.predict(processed_image)
+    # Get predictions (batched with other in-flight requests)
+    with detection_timings.time('inference'):
+        probabilities = scheduler.submit(processed_image)
     
+    with detection_timings.time('postprocess'):
+        return _postprocess(probabilities, class_table, mapping)
+
+def _postprocess(probabilities, class_table, mapping):
     # Get top 5 predictions
-    top_indices = np.argsort(predictions[0])[-5:][::-1]
-    top_probs = predictions[0][top_indices]
-    
-    # Check if any of the top predictions are non-food items
-    non_food_detected = False
-    for idx in top_indices:
-        # Get the class name from ImageNet
-        class_name = tf.keras.applications.mobilenet_v2.decode_predictions(predictions, top=5)[0][0][1]
-        if class_name.lower() in NON_FOOD_CLASSES:
-            non_food_detected = True
-            break
+    top_indices = top_k(probabilities, 5)
+    top_probs = probabilities[top_indices]
     
-    if non_food_detected:
-        return {"error": "Cannot detect - non-food item in frame", "is_food": False}
+    # Reject the frame if the best prediction is a non-food item
+    if class_table.non_food_mask[top_indices[0]]:
+        return {"error": "Cannot detect - non-food item in frame", "is_food": False}, []
     
     # Convert to food items
     detected_foods = []
-    for idx, prob in zip(top_indices, top_probs):
-        # Only process if confidence is above threshold
-        if float(prob) < 0.3:  # Confidence threshold
-            continue
-            
-        food_name = FOOD_CLASSES[idx % len(FOOD_CLASSES)]
-        try:
-            food = Food.objects.get(name__iexact=food_name)
-            detected_foods.append({
-                "name": food.name,
-                "calories": food.calories,
-                "protein": food.protein,
-                "carbs": food.carbs,
-                "fat": food.fat,
-                "confidence": float(prob)
-            })
-            
-            # Create detection history
-            DetectionHistory.objects.create(
-                food=food,
-                confidence=float(prob)
-            )
-        except Food.DoesNotExist:
-            logger.warning(f"Food item {food_name} not found in database")
+    detections = []
+    # Only process predictions above the confidence threshold
+    confident = top_probs >= 0.3
+    for idx, prob in zip(top_indices[confident], top_probs[confident]):
+        food = mapping.get(int(idx))
+        if food is None:
+            logger.warning(f"No food mapped to class {class_table.names[idx]}")
             continue
+        detected_foods.append({
+            "name": food.name,
+            "calories": food.calories,
+            "protein": food.protein,
+            "carbs": food.carbs,
+            "fat": food.fat,
+            "confidence": float(prob)
+        })
+        detections.append((food.food_id, float(prob)))
     
     if not detected_foods:
-        return {"error": "Cannot detect - no food items found", "is_food": False}
+        return {"error": "Cannot detect - no food items found", "is_food": False}, detections
     
-    return {"results": detected_foods, "is_food": True}
+    return {"results": detected_foods, "is_food": True}, detections
+
+def _saturated_response(error):
+    return Response(
+        {'error': 'Detection is busy, retry later'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(error.retry_after)},
+    )
+
+def _record_repeat(detections):
+    # A retried upload is the same meal, so by default it is not counted twice
+    if getattr(settings, 'DETECTION_CACHE_RECORD_HISTORY_ON_HIT', False):
+        _record_detections(detections)
+
+def detection_response_data(result, found_key):
+    # (payload, status) of a single-image detection; shared with async_views
+    if result is None:
+        return {'error': 'Invalid image format'}, status.HTTP_400_BAD_REQUEST
+    if not result.get("is_food", False):
+        return {'error': result.get("error", "Cannot detect food")}, status.HTTP_404_NOT_FOUND
+    return {found_key: result["results"], 'message': 'Food detected successfully'}, status.HTTP_200_OK
+
+def base64_upload(data):
+    """Image bytes of a {"image": <base64>} body, or (None, (payload, status))."""
+    serializer = FoodDetectionRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return None, (serializer.errors, status.HTTP_400_BAD_REQUEST)
+    image_data = serializer.validated_data.get('image')
+    if not image_data:
+        return None, ({"error": "No image provided"}, status.HTTP_400_BAD_REQUEST)
+    try:
+        return base64.b64decode(image_data), None
+    except Exception as e:
+        logger.error(f"Error decoding image: {str(e)}")
+        return None, ({"error": "Invalid image format"}, status.HTTP_400_BAD_REQUEST)
+
+def batch_uploads(files, data):
+    """Image bytes of a batch request, or (None, (payload, status)).
+
+    Several photos of one meal: multipart 'images' files or a JSON
+    {"images": [<base64>, ...]} body.
+    """
+    if files:
+        uploads = [image_file.read() for image_file in files.getlist('images')]
+    else:
+        images = data.get('images') if hasattr(data, 'get') else None
+        if not isinstance(images, list):
+            return None, ({'error': 'Expected a list of base64 images'}, status.HTTP_400_BAD_REQUEST)
+        uploads = []
+        for image_data in images:
+            try:
+                uploads.append(base64.b64decode(image_data, validate=True))
+            except Exception:
+                uploads.append(None)
+
+    if not uploads:
+        return None, ({'error': 'No images provided'}, status.HTTP_400_BAD_REQUEST)
+    max_images = getattr(settings, 'DETECTION_BATCH_MAX_IMAGES', 16)
+    if len(uploads) > max_images:
+        return None, ({'error': f'At most {max_images} images per request'}, status.HTTP_400_BAD_REQUEST)
+    return uploads, None
+
+def batch_response_data(results):
+    return {
+        'results': [{'index': index, **result} for index, result in enumerate(results)],
+        'message': 'Batch processed'
+    }
+
+def _record_detections(detections):
+    # Queue detection history, written in bulk by the write-behind buffer
+    for food_id, confidence in detections:
+        record_detection(food_id, confidence, firestore=HAS_FIRESTORE)
+
+def detect_food_in_image(image):
+    result, detections = classify_image(image)
+    _record_detections(detections)
+    return result
+
+def detect_food_in_upload(image_bytes):
+    """Like detect_food_in_image, but takes the raw upload and is served from
+    the result cache when the same upload was seen before. Returns None if
+    the bytes can't be decoded."""
+    entry, hit = result_cache.get_or_detect(image_bytes, decode_image, classify_image)
+    if entry is None:
+        return None
+    result, detections = entry
+    if hit:
+        _record_repeat(detections)
+    else:
+        _record_detections(detections)
+    return result
 
 class FoodDetectionViewSet(viewsets.ModelViewSet):
     serializer_class = DetectionHistorySerializer
     queryset = DetectionHistory.objects.all()
 
-    async def get_queryset(self):
+    def get_queryset(self):
         if HAS_FIRESTORE:
-            return await FirestoreDetectionHistory.get_all()
-        return super().get_queryset()
+            return async_to_sync(FirestoreDetectionHistory.get_all)()
+        return super().get_queryset().select_related('food')
 
     @action(detail=False, methods=['post'])
-    async def detect_food(self, request):
-        serializer = FoodDetectionRequestSerializer(data=request.data)
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def detect_food(self, request):
+        image_bytes, error = base64_upload(request.data)
+        if error:
+            return Response(error[0], status=error[1])
 
         try:
-            # Get image from request
-            image_data = serializer.validated_data.get('image')
-            if not image_data:
-                return Response(
-                    {"error": "No image provided"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Convert base64 to image
-            try:
-                image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
-                image = np.array(image)
-            except Exception as e:
-                logger.error(f"Error decoding image: {str(e)}")
-                return Response(
-                    {"error": "Invalid image format"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
             # Detect food in image
-            result = detect_food_in_image(image)
-            
-            if not result.get("is_food", False):
-                return Response(
-                    {"error": result.get("error", "Cannot detect food")},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-
-            return Response({
-                "results": result["results"],
-                "message": "Food detected successfully"
-            }, status=status.HTTP_200_OK)
+            with scheduler.admission():
+                result = detect_food_in_upload(image_bytes)
+            payload, status_code = detection_response_data(result, "results")
+            return Response(payload, status=status_code)
 
+        except SchedulerSaturated as e:
+            return _saturated_response(e)
         except Exception as e:
             logger.error(f"Error in food detection: {str(e)}", exc_info=True)
             return Response(
@@ -186,23 +225,47 @@ class FoodDetectionViewSet(viewsets.ModelViewSet):
 class FoodViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = FoodSerializer
     queryset = Food.objects.all()
+    pagination_class = FoodCursorPagination
 
-    async def get_queryset(self):
+    def get_queryset(self):
         category = self.request.query_params.get('category', None)
-        search = self.request.query_params.get('search', None)
 
         if HAS_FIRESTORE:
             if category and category != 'all':
-                return await FirestoreFood.get_by_category(category)
-            return await FirestoreFood.get_all()
+                return async_to_sync(FirestoreFood.get_by_category)(category)
+            return async_to_sync(FirestoreFood.get_all)()
         else:
             queryset = super().get_queryset()
             if category and category != 'all':
                 queryset = queryset.filter(category=category)
-            if search:
-                queryset = queryset.filter(name__icontains=search)
             return queryset
 
+    def list(self, request, *args, **kwargs):
+        search = request.query_params.get('search', None)
+        if not search or HAS_FIRESTORE:
+            return super().list(request, *args, **kwargs)
+
+        # Ranked full-text search, paginated with its own (score, id) cursor
+        category = request.query_params.get('category', None)
+        try:
+            foods, next_cursor = search_foods(
+                search,
+                category=category if category != 'all' else None,
+                limit=self.paginator.get_page_size(request),
+                cursor=request.query_params.get('cursor'),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+        return Response({
+            'next': next_url,
+            'previous': None,
+            'results': self.get_serializer(foods, many=True).data,
+        })
+
 @api_view(['POST'])
 @parser_classes([MultiPartParser])
 def detect_food(request):
@@ -211,31 +274,205 @@ def detect_food(request):
 
     try:
         # Read the uploaded image
-        image_file = request.FILES['image']
-        image_bytes = image_file.read()
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            return Response({'error': 'Invalid image format'}, status=status.HTTP_400_BAD_REQUEST)
+        image_bytes = request.FILES['image'].read()
 
         # Detect food in image
-        result = detect_food_in_image(image)
-        
-        if not result.get("is_food", False):
-            return Response(
-                {'error': result.get("error", "Cannot detect food")},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        return Response({
-            'detected_foods': result["results"],
-            'message': 'Food detected successfully'
-        })
+        with scheduler.admission():
+            result = detect_food_in_upload(image_bytes)
+        payload, status_code = detection_response_data(result, 'detected_foods')
+        return Response(payload, status=status_code)
 
+    except SchedulerSaturated as e:
+        return _saturated_response(e)
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}", exc_info=True)
         return Response(
             {'error': f'Error processing image: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+def _format_batch_result(result):
+    if result is None:
+        return {'error': 'Invalid image format'}
+    if not result.get("is_food", False):
+        return {'error': result.get("error", "Cannot detect food")}
+    return {'detected_foods': result["results"]}
+
+def _prepare_batch_item(image_bytes):
+    # Runs on the upload executor: cache lookup, decode and preprocess
+    if image_bytes is None:
+        return None, None, ()
+    entry, image, keys = result_cache.lookup(image_bytes, decode_image)
+    if entry is not None or image is None:
+        return entry, None, ()
+    return None, preprocess_image(image), keys
+
+def detect_foods_in_uploads(uploads, release=None):
+    """Detects food in several uploads with as few forward passes as possible.
+
+    Identical uploads are handled once. Decoding runs in parallel; all images
+    that miss the result cache are then submitted to the scheduler together
+    so they share batches. Cache hits and repeated uploads record history
+    like retried single uploads do. Callers take the scheduler admission for
+    the uploads first and pass its ``release``, through which the slots of
+    uploads that are not submitted are given back before the others are, and
+    those of submitted ones once their batch has run.
+    """
+    registry.get()
+    class_table = get_class_table()
+    mapping = food_mapping.get()
+
+    # Index of the first upload with the same bytes, for every upload
+    firsts = {}
+    owners = [
+        index if image_bytes is None else firsts.setdefault(content_hash(image_bytes), index)
+        for index, image_bytes in enumerate(uploads)
+    ]
+    unique = sorted(set(owners))
+    prepared = dict(zip(unique, upload_executor.map(_prepare_batch_item, [uploads[index] for index in unique])))
+    images = {index: image for index, (_, image, _) in prepared.items() if image is not None}
+    if release is not None:
+        # Duplicates, cache hits and undecodable uploads never join a batch
+        release(len(uploads) - len(images))
+    futures = {}
+    for index, image in images.items():
+        futures[index] = scheduler.submit_async(image)
+        if release is not None:
+            futures[index].add_done_callback(lambda _: release(1))
+
+    entries = {}
+    for index, (entry, image, keys) in prepared.items():
+        try:
+            if index in futures:
+                entry = _postprocess(futures[index].result(), class_table, mapping)
+                result_cache.store(keys, entry)
+                _record_detections(entry[1])
+            elif entry is not None:
+                _record_repeat(entry[1])
+            entries[index] = entry
+        except Exception as e:
+            logger.error(f"Error processing image: {str(e)}", exc_info=True)
+            entries[index] = e
+
+    results = []
+    for index, owner in enumerate(owners):
+        entry = entries[owner]
+        if isinstance(entry, Exception):
+            results.append({'error': f'Error processing image: {str(entry)}'})
+            continue
+        if index != owner and entry is not None:
+            _record_repeat(entry[1])
+        results.append(_format_batch_result(entry[0] if entry is not None else None))
+    return results
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser, JSONParser])
+def detect_food_batch(request):
+    uploads, error = batch_uploads(request.FILES, request.data)
+    if error:
+        return Response(error[0], status=error[1])
+
+    try:
+        # Shed load before spending time on decoding
+        with scheduler.admission(len(uploads)) as release:
+            results = detect_foods_in_uploads(uploads, release)
+    except SchedulerSaturated as e:
+        return _saturated_response(e)
+    except Exception as e:
+        logger.error(f"Error processing images: {str(e)}", exc_info=True)
+        return Response(
+            {'error': f'Error processing images: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    return Response(batch_response_data(results))
+
+@api_view(['GET'])
+def detection_stats(request):
+    return Response({
+        'model': registry.status(),
+        'batching': scheduler.stats(),
+        'history': history_buffer.stats(),
+        'firestore_history': firestore_history_buffer.stats(),
+        'result_cache': result_cache.stats(),
+        'stage_ms': detection_timings.snapshot(),
+        'food_catalogue': food_catalogue.stats() if HAS_FIRESTORE else None,
+        'food_columns': food_columns.stats(),
+    })
+
+# /api/foods/query/ page size and its upper bound
+FOOD_QUERY_LIMIT = 100
+FOOD_QUERY_MAX_LIMIT = 1000
+FOOD_QUERY_COLUMNS = NUTRIENTS + tuple(f'{nutrient}_per_100kcal' for nutrient in NUTRIENTS if nutrient != 'calories')
+
+@api_view(['GET'])
+def food_query(request):
+    # Vectorized filter over the columnar catalogue, e.g.
+    # ?category=Meat&category=Fish%26Seafood&min_protein_per_100kcal=15&max_fat=10
+    try:
+        ranges = {}
+        for column in FOOD_QUERY_COLUMNS:
+            low = request.query_params.get(f'min_{column}')
+            high = request.query_params.get(f'max_{column}')
+            if low is not None or high is not None:
+                ranges[column] = (
+                    float(low) if low is not None else None,
+                    float(high) if high is not None else None,
+                )
+        limit = int(request.query_params.get('limit', FOOD_QUERY_LIMIT))
+    except ValueError:
+        return Response({'error': 'Bounds and limit must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, FOOD_QUERY_MAX_LIMIT))
+
+    columns = food_columns.get()
+    matches = np.flatnonzero(columns.mask(request.query_params.getlist('category'), ranges))
+    return Response({
+        'count': len(matches),
+        'results': columns.rows(matches[:limit]),
+    })
+
+def _meal_items(data):
+    # {"food_ids": [...], "grams": [...]} or {"items": [{"food_id": 1, "grams": 150}, ...]}
+    if not hasattr(data, 'get'):
+        return None
+    if 'items' in data:
+        items = data['items']
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return None
+        return [item.get('food_id') for item in items], [item.get('grams') for item in items]
+    food_ids, grams = data.get('food_ids'), data.get('grams')
+    if not isinstance(food_ids, list) or not isinstance(grams, list):
+        return None
+    return food_ids, grams
+
+@api_view(['POST'])
+@parser_classes([JSONParser])
+def calculate_meal(request):
+    items = _meal_items(request.data)
+    if items is None:
+        return Response(
+            {'error': 'Expected "items" of {food_id, grams} or "food_ids" and "grams" lists'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    max_items = getattr(settings, 'MEAL_MAX_ITEMS', 50000)
+    if len(items[0]) > max_items:
+        return Response({'error': f'At most {max_items} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        return Response(meal_macros(food_columns.get(), *items))
+    except UnknownFoods as e:
+        return Response({'error': 'Unknown foods', 'unknown_food_ids': e.food_ids},
+                        status=status.HTTP_400_BAD_REQUEST)
+    except UnweighedFoods as e:
+        return Response({'error': 'Foods with per-serving values of unknown weight',
+                         'unweighed_food_ids': e.food_ids},
+                        status=status.HTTP_400_BAD_REQUEST)
+    except (TypeError, ValueError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+def readiness(request):
+    # Load balancer probe: only route detection traffic once warmup finished
+    if registry.is_ready:
+        return Response(registry.status())
+    registry.warmup_async()
+    return Response(registry.status(), status=status.HTTP_503_SERVICE_UNAVAILABLE)
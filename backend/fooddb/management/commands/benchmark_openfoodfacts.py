@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from fooddb.openfoodfacts import OpenFoodFactsClient
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers like /cgi/search.pl after ``server.delay`` seconds."""
+
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        query = parse_qs(urlparse(self.path).query).get('search_terms', [''])[0]
+        body = json.dumps({'products': [
+            {
+                'product_name': f'{query} {i}',
+                'nutriments': {'energy-kcal_100g': 100 + i, 'proteins_100g': 1,
+                               'carbohydrates_100g': 2, 'fat_100g': 3},
+            }
+            for i in range(10)
+        ]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the OpenFoodFacts proxy on cache misses, hits and coalesced misses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', type=str,
+                            help='Search endpoint to use; defaults to a local stand-in server')
+        parser.add_argument('--delay-ms', type=float, default=150.0,
+                            help='Simulated upstream latency of the stand-in server')
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        server = None
+        url = options['url']
+        if not url:
+            server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+            server.delay = options['delay_ms'] / 1000.0
+            server.requests = 0
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f'http://127.0.0.1:{server.server_address[1]}/cgi/search.pl'
+        self.stdout.write(f"upstream: {url}")
+
+        try:
+            self._run(OpenFoodFactsClient(url), options['queries'], options['concurrency'])
+        finally:
+            if server is not None:
+                server.shutdown()
+
+    def _run(self, client, count, concurrency):
+        queries = [f'food {i}' for i in range(count)]
+
+        def timed(label, fn, items):
+            timings = []
+            for item in items:
+                started = time.perf_counter()
+                fn(item)
+                timings.append((time.perf_counter() - started) * 1000.0)
+            p50, p99 = np.percentile(timings, [50, 99])
+            self.stdout.write(f"  {label:<10} p50={p50:.2f}ms p99={p99:.2f}ms")
+
+        timed('miss', client.search, queries)
+        # Different spelling, same normalized key
+        timed('hit', client.search, [f'  FOOD {i} ' for i in range(count)])
+
+        client.clear()
+        calls = client.upstream_calls
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            list(pool.map(client.search, ['peanut butter'] * concurrency))
+            elapsed = (time.perf_counter() - started) * 1000.0
+        self.stdout.write(
+            f"  coalesced  {concurrency} concurrent misses -> "
+            f"{client.upstream_calls - calls} upstream call(s) in {elapsed:.2f}ms"
+        )
+        self.stdout.write(f"  stats      {client.stats()}")
@@ -0,0 +1,77 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import numpy as np
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from django.core.management.base import BaseCommand
+
+from fooddb.tokens import IdTokenVerifier
+
+PROJECT_ID = 'benchmark-project'
+
+
+def mint_signing_key(kid):
+    """A private key and the {kid: PEM certificate} Google would publish for it."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, {kid: cert.public_bytes(serialization.Encoding.PEM).decode()}
+
+
+def mint_id_token(key, kid, uid, lifetime=3600):
+    now = int(time.time())
+    claims = {
+        'iss': f'https://securetoken.google.com/{PROJECT_ID}',
+        'aud': PROJECT_ID,
+        'sub': uid,
+        'iat': now,
+        'exp': now + lifetime,
+        'auth_time': now,
+    }
+    return jwt.encode(claims, key, algorithm='RS256', headers={'kid': kid})
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure Firebase ID-token verification with and without the claims cache, '
+        'using locally minted signing keys and tokens'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100,
+                            help='Distinct tokens in the workload')
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        key, certs = mint_signing_key('bench-key')
+        tokens = [mint_id_token(key, 'bench-key', f'user-{i}') for i in range(options['users'])]
+        workload = [tokens[i % len(tokens)] for i in range(options['requests'])]
+
+        for label, max_entries in (('uncached', 0), ('cached', len(tokens))):
+            verifier = IdTokenVerifier(PROJECT_ID, fetch_keys=lambda: (certs, None), max_entries=max_entries)
+            timings = []
+            for token in workload:
+                started = time.perf_counter()
+                verifier.verify(token)
+                timings.append((time.perf_counter() - started) * 1e6)
+            timings = np.array(timings)
+            p50, p99 = np.percentile(timings, [50, 99])
+            stats = verifier.stats()
+            self.stdout.write(
+                f"{label:<9} {len(timings) / (timings.sum() / 1e6):10.0f} verifications/s "
+                f"p50={p50:.1f}us p99={p99:.1f}us hit_rate={stats['hit_rate']:.2f} "
+                f"key_fetches={stats['key_fetches']}"
+            )
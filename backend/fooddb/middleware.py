@@ -1,7 +1,8 @@
 from django.http import JsonResponse
-from firebase_admin import auth
 import logging
 
+from .tokens import id_tokens
+
 logger = logging.getLogger(__name__)
 
 class FirebaseAuthenticationMiddleware:
@@ -15,7 +16,8 @@ class FirebaseAuthenticationMiddleware:
 
         id_token = auth_header.split('Bearer ')[1]
         try:
-            decoded_token = auth.verify_id_token(id_token)
+            # Verified claims are cached until the token expires
+            decoded_token = id_tokens.verify(id_token)
             request.user = decoded_token
             request.user_id = decoded_token['uid']
         except Exception as e:
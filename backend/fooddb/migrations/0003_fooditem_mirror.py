@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+from fooddb.search import create_fts_index, drop_fts_index
+
+
+def create_fts(apps, schema_editor):
+    create_fts_index(schema_editor)
+
+
+def drop_fts(apps, schema_editor):
+    drop_fts_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fooddb', '0002_alter_fooditem_calories_alter_fooditem_carbs_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='code',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='fooditem',
+            name='last_modified',
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+        # Products are identified by code; many share a name
+        migrations.AlterField(
+            model_name='fooditem',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        # After the table rebuilds above
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -1,13 +1,17 @@
 from django.db import models
 
 class FoodItem(models.Model):
+    # OpenFoodFacts barcode; set for rows mirrored by import_openfoodfacts
+    code = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=100)
-    calories = models.FloatField()
-    protein = models.FloatField()
-    carbs = models.FloatField()
-    fat = models.FloatField()
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fat = models.FloatField(default=0)
     category = models.CharField(max_length=50)
     image = models.URLField(max_length=500, blank=True)
+    # OpenFoodFacts last_modified_t, used to skip unchanged rows on delta imports
+    last_modified = models.PositiveBigIntegerField(default=0, db_index=True)
 
     def __str__(self):
         return self.name
@@ -0,0 +1,176 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = 'product_name,nutriments,image_front_url'
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(search):
+    # "  Peanut  BUTTER " and "peanut butter" share one cache entry
+    return _WHITESPACE_RE.sub(' ', search).strip().lower()
+
+
+class OpenFoodFactsClient:
+    """Cached proxy for the OpenFoodFacts product search.
+
+    Upstream calls go through one pooled keep-alive session with strict
+    connect/read timeouts. Responses are cached per normalized query: fresh
+    for ``ttl`` seconds, then served stale for up to ``stale_ttl`` more while
+    a background refresh runs. Concurrent misses for the same query wait on
+    a single upstream request instead of each making their own.
+    """
+
+    def __init__(self, base_url, connect_timeout=3.05, read_timeout=5.0, ttl=600,
+                 stale_ttl=3600, max_entries=1024, pool_size=10, page_size=10):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.pool_size = pool_size
+        self.page_size = page_size
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._session = None
+        self._refresher = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Created on first use so forked workers don't share sockets
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def _fetch(self, query):
+        self.upstream_calls += 1
+        params = {
+            'search_terms': query,
+            'search_simple': 1,
+            'json': 1,
+            'fields': SEARCH_FIELDS,
+            'page_size': self.page_size,
+        }
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get('products', [])
+
+    def _load(self, key, future):
+        # Runs in the one caller (or refresher) that owns the in-flight future
+        try:
+            products = self._fetch(key)
+        except Exception as e:
+            self.upstream_errors += 1
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._entries[key] = (products, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(products)
+
+    def _refresh(self, key):
+        with self._lock:
+            if key in self._inflight:
+                return
+            future = self._inflight[key] = Future()
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='off-refresh')
+        self._refresher.submit(self._load, key, future)
+
+    def search(self, search):
+        """Returns the raw product dicts for a search, raising
+        requests.RequestException when upstream fails on a miss."""
+        key = normalize_query(search)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                products, fetched = entry
+                age = now - fetched
+                if age < self.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return products
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(key)
+                    stale = products
+                else:
+                    stale = None
+            else:
+                stale = None
+
+            if stale is None:
+                future = self._inflight.get(key)
+                if future is not None:
+                    self.coalesced += 1
+                    owner = False
+                else:
+                    self.misses += 1
+                    future = self._inflight[key] = Future()
+                    owner = True
+
+        if stale is not None:
+            self._refresh(key)
+            return stale
+        if owner:
+            self._load(key, future)
+        return future.result()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            'upstream_calls': self.upstream_calls,
+            'upstream_errors': self.upstream_errors,
+            'entries': len(self._entries),
+        }
+
+
+def build_client(base_url=None):
+    return OpenFoodFactsClient(
+        base_url or getattr(settings, 'OPENFOODFACTS_SEARCH_URL', 'https://world.openfoodfacts.org/cgi/search.pl'),
+        connect_timeout=getattr(settings, 'OPENFOODFACTS_CONNECT_TIMEOUT', 3.05),
+        read_timeout=getattr(settings, 'OPENFOODFACTS_READ_TIMEOUT', 5.0),
+        ttl=getattr(settings, 'OPENFOODFACTS_CACHE_TTL', 600),
+        stale_ttl=getattr(settings, 'OPENFOODFACTS_STALE_TTL', 3600),
+        max_entries=getattr(settings, 'OPENFOODFACTS_CACHE_MAX_ENTRIES', 1024),
+        pool_size=getattr(settings, 'OPENFOODFACTS_POOL_SIZE', 10),
+    )
+
+
+openfoodfacts = build_client()
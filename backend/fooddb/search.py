@@ -0,0 +1,74 @@
+import re
+
+from django.db import DatabaseError, connection
+
+from .models import FoodItem
+
+FTS_TABLE = 'fooddb_fooditem_fts'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def create_fts_index(schema_editor):
+    """Creates the FTS5 name index over fooddb_fooditem and its sync triggers.
+
+    SQLite only. Like food_detection.search, any migration that rebuilds
+    fooddb_fooditem drops the triggers and has to call this again.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"name, content='fooddb_fooditem', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON fooddb_fooditem BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON fooddb_fooditem BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); END"
+    )
+    # Only name changes touch the index, so nutrient-only delta updates stay cheap
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name ON fooddb_fooditem BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name); "
+        f"INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END"
+    )
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_fts_index(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def search_items(query, limit=10):
+    """FoodItems whose name matches every word of ``query`` as a prefix,
+    best bm25 rank first."""
+    tokens = [token.lower() for token in _TOKEN_RE.findall(query)]
+    if not tokens:
+        return []
+
+    if connection.vendor == 'sqlite':
+        match = ' AND '.join(f'"{token}"*' for token in tokens)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                    f"ORDER BY rank LIMIT %s",
+                    [match, limit],
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+        except DatabaseError:
+            # FTS5 table missing (migration not applied or no FTS5 support)
+            pass
+        else:
+            items = FoodItem.objects.in_bulk(ids)
+            return [items[item_id] for item_id in ids if item_id in items]
+
+    return list(FoodItem.objects.filter(name__icontains=query.strip())[:limit])
@@ -1,3 +1,274 @@
-from django.test import TestCase
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import jwt
+import requests
+from django.test import SimpleTestCase
+
+from fooddb.management.commands.benchmark_openfoodfacts import StandInHandler
+from fooddb.management.commands.benchmark_token_cache import PROJECT_ID, mint_signing_key
+from fooddb.openfoodfacts import OpenFoodFactsClient
+from fooddb.tokens import IdTokenVerifier, InvalidIdToken
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class IdTokenVerifierTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.key, cls.certs = mint_signing_key('key-1')
+        cls.new_key, cls.new_certs = mint_signing_key('key-2')
+
+    def setUp(self):
+        self.fetches = 0
+        self.served = [self.certs]
+
+    def fetch_keys(self):
+        self.fetches += 1
+        served = self.served[min(self.fetches, len(self.served)) - 1]
+        if isinstance(served, Exception):
+            raise served
+        return served, None
+
+    def verifier(self, **kwargs):
+        return IdTokenVerifier(PROJECT_ID, fetch_keys=self.fetch_keys, **kwargs)
+
+    def token(self, key=None, kid='key-1', **claims):
+        now = int(time.time())
+        claims = {
+            'iss': f'https://securetoken.google.com/{PROJECT_ID}',
+            'aud': PROJECT_ID,
+            'sub': 'user-1',
+            'iat': now,
+            'exp': now + 3600,
+            **claims,
+        }
+        return jwt.encode(claims, key or self.key, algorithm='RS256', headers={'kid': kid})
+
+    def test_repeat_token_is_served_from_the_cache(self):
+        verifier = self.verifier()
+        token = self.token()
+        claims = verifier.verify(token)
+        self.assertEqual(claims['uid'], 'user-1')
+
+        with mock.patch('fooddb.tokens.jwt.decode') as decode:
+            self.assertEqual(verifier.verify(token), claims)
+        decode.assert_not_called()
+        stats = verifier.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+        self.assertEqual(self.fetches, 1)
+
+    def test_cached_claims_are_dropped_after_exp(self):
+        verifier = self.verifier()
+        token = self.token()
+        verifier.verify(token)
+
+        with mock.patch('fooddb.tokens.time.time', return_value=time.time() + 3601):
+            verifier.verify(token)
+        stats = verifier.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['expired']), (0, 2, 1))
+
+    def test_expired_token_is_rejected(self):
+        verifier = self.verifier()
+        now = int(time.time())
+        with self.assertRaises(InvalidIdToken):
+            verifier.verify(self.token(iat=now - 7200, exp=now - 3600))
+        self.assertEqual(verifier.stats()['failures'], 1)
+
+    def test_clock_skew_accepts_a_just_expired_token(self):
+        now = int(time.time())
+        token = self.token(iat=now - 3600, exp=now - 5)
+        self.assertEqual(self.verifier(clock_skew=60).verify(token)['uid'], 'user-1')
+
+    def test_wrong_audience_or_issuer_is_rejected(self):
+        verifier = self.verifier()
+        for claims in ({'aud': 'other-project'}, {'iss': 'https://securetoken.google.com/other-project'}):
+            with self.subTest(**claims), self.assertRaises(InvalidIdToken):
+                verifier.verify(self.token(**claims))
+
+    def test_token_issued_in_the_future_is_rejected(self):
+        now = int(time.time())
+        with self.assertRaises(InvalidIdToken):
+            self.verifier().verify(self.token(iat=now + 600, exp=now + 4200))
+
+    def test_empty_subject_is_rejected(self):
+        with self.assertRaises(InvalidIdToken):
+            self.verifier().verify(self.token(sub=''))
+
+    def test_unsigned_token_is_rejected(self):
+        token = jwt.encode({'sub': 'user-1'}, 'not-a-google-signing-key-' * 2, algorithm='HS256', headers={'kid': 'key-1'})
+        with self.assertRaises(InvalidIdToken):
+            self.verifier().verify(token)
+
+    def test_unknown_kid_refetches_at_most_once_per_min_key_refresh(self):
+        verifier = self.verifier(min_key_refresh=30)
+        self.served = [self.certs, self.new_certs]
+        verifier.verify(self.token())
+        rotated = self.token(key=self.new_key, kid='key-2')
+
+        with self.assertRaisesMessage(InvalidIdToken, 'Unknown signing key key-2'):
+            verifier.verify(rotated)
+        self.assertEqual(self.fetches, 1)
+
+        with mock.patch('fooddb.tokens.time.monotonic', return_value=time.monotonic() + 31):
+            self.assertEqual(verifier.verify(rotated)['uid'], 'user-1')
+        self.assertEqual(self.fetches, 2)
+
+    def test_failed_key_fetch_keeps_the_old_keys(self):
+        verifier = self.verifier(key_ttl=0)
+        self.served = [self.certs, ConnectionError('certs endpoint down')]
+        verifier.verify(self.token(sub='user-1'))
+
+        with self.assertLogs('fooddb.tokens', 'ERROR'):
+            self.assertEqual(verifier.verify(self.token(sub='user-2'))['uid'], 'user-2')
+        self.assertEqual(self.fetches, 2)
+        self.assertEqual(verifier.stats()['signing_keys'], 1)
+
+    def test_no_keys_at_all_rejects_the_token(self):
+        self.served = [ConnectionError('certs endpoint down')]
+        with self.assertLogs('fooddb.tokens', 'ERROR'), \
+                self.assertRaisesMessage(InvalidIdToken, 'Signing keys unavailable'):
+            self.verifier().verify(self.token())
+
+    def test_least_recently_used_token_is_evicted(self):
+        verifier = self.verifier(max_entries=2)
+        first, second, third = (self.token(sub=f'user-{i}') for i in range(3))
+        verifier.verify(first)
+        verifier.verify(second)
+        verifier.verify(first)
+        verifier.verify(third)
+
+        verifier.verify(first)
+        verifier.verify(second)
+        stats = verifier.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (2, 4, 2))
+
+
+class OpenFoodFactsClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.daemon_threads = True
+        # Timed-out requests find the connection closed when they answer
+        cls.server.handle_error = lambda request, client_address: None
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}/cgi/search.pl'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.delay = 0.0
+        self.server.requests = 0
+
+    def off_client(self, **kwargs):
+        return OpenFoodFactsClient(self.url, **{'connect_timeout': 1.0, 'read_timeout': 1.0, **kwargs})
+
+    def test_repeat_query_is_served_from_the_cache(self):
+        client = self.off_client()
+        products = client.search('Peanut  BUTTER')
+        self.assertEqual(products[0]['product_name'], 'peanut butter 0')
+        self.assertEqual(client.search(' peanut butter'), products)
+        stats = client.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['upstream_calls']), (1, 1, 1))
+        self.assertEqual(self.server.requests, 1)
+
+    def test_slow_upstream_times_out_and_is_not_cached(self):
+        client = self.off_client(read_timeout=0.1)
+        self.server.delay = 0.5
+        started = time.monotonic()
+        with self.assertRaises(requests.Timeout):
+            client.search('apple')
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(client.stats()['upstream_errors'], 1)
+
+        self.server.delay = 0.0
+        self.assertEqual(len(client.search('apple')), 10)
+        self.assertEqual(client.stats()['misses'], 2)
+
+    def test_stale_entry_is_served_while_it_is_refreshed(self):
+        client = self.off_client(ttl=0.05, stale_ttl=60)
+        products = client.search('apple')
+        time.sleep(0.06)
+
+        self.server.delay = 0.3
+        started = time.monotonic()
+        self.assertEqual(client.search('apple'), products)
+        self.assertLess(time.monotonic() - started, 0.2)
+        self.assertEqual(client.stats()['stale_hits'], 1)
+
+        # Served fresh once the background refresh lands
+        self.assertTrue(wait_for(lambda: self.server.requests == 2 and client.stats()['upstream_calls'] == 2
+                                 and not client._inflight))
+        client.search('apple')
+        self.assertEqual(client.stats()['hits'], 1)
+
+    def test_failed_refresh_keeps_serving_the_stale_entry(self):
+        client = self.off_client(ttl=0.05, stale_ttl=60, read_timeout=0.1)
+        products = client.search('apple')
+        time.sleep(0.06)
+
+        self.server.delay = 0.5
+        self.assertEqual(client.search('apple'), products)
+        self.assertTrue(wait_for(lambda: client.stats()['upstream_errors'] == 1))
+        self.assertEqual(client.search('apple'), products)
+        self.assertEqual(client.stats()['stale_hits'], 2)
+        # Each stale hit retries the refresh
+        self.assertTrue(wait_for(lambda: client.stats()['upstream_errors'] == 2))
+
+    def test_entry_past_its_stale_ttl_is_refetched(self):
+        client = self.off_client(ttl=0.02, stale_ttl=0.02)
+        client.search('apple')
+        time.sleep(0.05)
+        client.search('apple')
+        stats = client.stats()
+        self.assertEqual((stats['misses'], stats['stale_hits']), (2, 0))
+        self.assertEqual(self.server.requests, 2)
+
+    def test_concurrent_misses_share_one_upstream_request(self):
+        client = self.off_client()
+        self.server.delay = 0.2
+        callers = 8
+        barrier = threading.Barrier(callers)
+
+        def search(query):
+            barrier.wait()
+            return client.search(query)
+
+        with ThreadPoolExecutor(max_workers=callers) as executor:
+            results = list(executor.map(search, ['Banana'] * (callers // 2) + ['banana '] * (callers // 2)))
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(self.server.requests, 1)
+        stats = client.stats()
+        self.assertEqual((stats['misses'], stats['coalesced']), (1, callers - 1))
+
+    def test_coalesced_callers_share_the_upstream_error(self):
+        client = self.off_client(read_timeout=0.1)
+        self.server.delay = 0.5
+        barrier = threading.Barrier(4)
+
+        def search(query):
+            barrier.wait()
+            try:
+                client.search(query)
+            except requests.Timeout:
+                return 'timeout'
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(list(executor.map(search, ['apple'] * 4)), ['timeout'] * 4)
+        self.assertEqual(client.stats()['upstream_calls'], 1)
@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+import requests
+from cryptography.x509 import load_pem_x509_certificate
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+FIREBASE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class InvalidIdToken(Exception):
+    pass
+
+
+def fetch_firebase_certs(url=FIREBASE_CERTS_URL, timeout=5.0):
+    """({key id: PEM certificate}, seconds they may be cached for)."""
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    match = _MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+    return response.json(), int(match.group(1)) if match else None
+
+
+class IdTokenVerifier:
+    """Verifies Firebase ID tokens and caches the verified claims.
+
+    Claims are cached by the SHA-256 of the token until the token's ``exp``,
+    so a repeat request skips the RSA signature check; the cache holds at most
+    ``max_entries`` tokens, least recently used first out. Google's signing
+    certificates are fetched with ``fetch_keys`` and kept for as long as their
+    Cache-Control allows (or ``key_ttl`` seconds), refetched early only when a
+    token names a key id that isn't known yet.
+    """
+
+    def __init__(self, project_id, fetch_keys=fetch_firebase_certs, max_entries=10000,
+                 key_ttl=3600, clock_skew=0, min_key_refresh=30):
+        self.project_id = project_id
+        self.fetch_keys = fetch_keys
+        self.max_entries = max_entries
+        self.key_ttl = key_ttl
+        self.clock_skew = clock_skew
+        self.min_key_refresh = min_key_refresh
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.failures = 0
+        self.key_fetches = 0
+        self._entries = OrderedDict()
+        self._keys = {}
+        self._keys_expire = 0.0
+        self._keys_fetched = None
+        self._lock = threading.Lock()
+        self._key_lock = threading.Lock()
+
+    def _load_keys(self):
+        certs, max_age = self.fetch_keys()
+        self.key_fetches += 1
+        self._keys = {
+            kid: load_pem_x509_certificate(pem.encode()).public_key()
+            for kid, pem in certs.items()
+        }
+        self._keys_fetched = time.monotonic()
+        self._keys_expire = self._keys_fetched + (max_age if max_age is not None else self.key_ttl)
+
+    def _signing_key(self, kid):
+        now = time.monotonic()
+        key = self._keys.get(kid)
+        if key is not None and now < self._keys_expire:
+            return key
+        with self._key_lock:
+            key = self._keys.get(kid)
+            stale = time.monotonic() >= self._keys_expire
+            # An unknown key id refetches early, but not more often than
+            # min_key_refresh so garbage tokens can't hammer the endpoint
+            recent = (self._keys_fetched is not None
+                      and time.monotonic() - self._keys_fetched < self.min_key_refresh)
+            if stale or (key is None and not recent):
+                try:
+                    self._load_keys()
+                except Exception as e:
+                    # Keep verifying with the old keys until the endpoint is back
+                    logger.error(f"Failed to fetch Firebase signing keys: {str(e)}")
+                    if not self._keys:
+                        raise InvalidIdToken('Signing keys unavailable')
+                key = self._keys.get(kid)
+        if key is None:
+            raise InvalidIdToken(f"Unknown signing key {kid}")
+        return key
+
+    def _decode(self, id_token):
+        if not self.project_id:
+            raise InvalidIdToken('Firebase project id is not configured')
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except jwt.PyJWTError as e:
+            raise InvalidIdToken(str(e))
+        if header.get('alg') != 'RS256':
+            raise InvalidIdToken('Token must be signed with RS256')
+        key = self._signing_key(header.get('kid'))
+        try:
+            claims = jwt.decode(
+                id_token, key, algorithms=['RS256'], audience=self.project_id,
+                issuer=f'https://securetoken.google.com/{self.project_id}',
+                leeway=self.clock_skew, options={'require': ['exp', 'iat', 'sub']},
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidIdToken(str(e))
+        subject = claims['sub']
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise InvalidIdToken('Token has an invalid subject')
+        # Same shape as firebase_admin.auth.verify_id_token
+        claims['uid'] = subject
+        return claims
+
+    def verify(self, id_token):
+        """The token's claims, raising InvalidIdToken if it doesn't verify."""
+        key = hashlib.sha256(id_token.encode()).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                claims, expires = entry
+                if now < expires:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return claims
+                self.expired += 1
+                del self._entries[key]
+            self.misses += 1
+
+        try:
+            claims = self._decode(id_token)
+        except InvalidIdToken:
+            self.failures += 1
+            raise
+        with self._lock:
+            self._entries[key] = (claims, claims['exp'])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'failures': self.failures,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'signing_keys': len(self._keys),
+            'key_fetches': self.key_fetches,
+        }
+
+
+def build_verifier():
+    return IdTokenVerifier(
+        getattr(settings, 'FIREBASE_PROJECT_ID', None),
+        max_entries=getattr(settings, 'FIREBASE_TOKEN_CACHE_MAX_ENTRIES', 10000),
+        key_ttl=getattr(settings, 'FIREBASE_SIGNING_KEY_TTL', 3600),
+        clock_skew=getattr(settings, 'FIREBASE_TOKEN_CLOCK_SKEW', 0),
+    )
+
+
+id_tokens = build_verifier()
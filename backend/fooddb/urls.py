@@ -3,4 +3,6 @@ from . import views
 
 urlpatterns = [
     path('', views.food_item_list, name='food_item_list'),
+    path('stats/', views.food_item_stats, name='food_item_stats'),
+    path('auth/stats/', views.auth_stats, name='auth_stats'),
 ]
\ No newline at end of file
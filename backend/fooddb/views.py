@@ -1,8 +1,13 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 import requests
 
+from .openfoodfacts import openfoodfacts
+from .search import search_items
+from .tokens import id_tokens
+
 @api_view(['GET'])
 def food_item_list(request):
     search = request.query_params.get('search', '')
@@ -11,22 +16,32 @@ def food_item_list(request):
     if not search:
         return Response({"error": "Search term is required"}, status=status.HTTP_400_BAD_REQUEST)
     
-    url = 'https://world.openfoodfacts.org/cgi/search.pl'
-    params = {
-        'search_terms': search,
-        'search_simple': 1,
-        'json': 1,
-        'fields': 'product_name,nutriments,image_front_url',
-        'page_size': 10
-    }
-    
+    fallback_image = f'https://source.unsplash.com/featured/?{search.replace(" ", ",")}'
+
+    # The local OpenFoodFacts mirror (import_openfoodfacts) answers first
+    if getattr(settings, 'FOODDB_LOCAL_SEARCH', True):
+        local_items = search_items(search, limit=10)
+        if local_items:
+            return Response([
+                {
+                    'id': item.name.lower().replace(' ', '_'),
+                    'name': item.name,
+                    'calories': item.calories,
+                    'protein': item.protein,
+                    'carbs': item.carbs,
+                    'fat': item.fat,
+                    'category': category if category != 'all' else item.category or 'General',
+                    'image': item.image or fallback_image,
+                }
+                for item in local_items
+            ])
+
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        # Pooled, cached and coalesced; see fooddb.openfoodfacts
+        products = openfoodfacts.search(search)
         
         food_items = []
-        for product in data.get('products', []):
+        for product in products:
             name = product.get('product_name', '')
             if not name:
                 continue
@@ -39,10 +54,19 @@ def food_item_list(request):
                 'carbs': nutriments.get('carbohydrates_100g', 0),
                 'fat': nutriments.get('fat_100g', 0),
                 'category': category if category != 'all' else 'General',
-                'image': product.get('image_front_url', f'https://source.unsplash.com/featured/?{search.replace(" ", ",")}')
+                'image': product.get('image_front_url', fallback_image)
             }
             food_items.append(item)
         
         return Response(food_items)
     except requests.RequestException as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def food_item_stats(request):
+    return Response(openfoodfacts.stats())
+
+
+@api_view(['GET'])
+def auth_stats(request):
+    return Response(id_tokens.stats())
@@ -0,0 +1,44 @@
+import os
+
+# gunicorn picks this file up automatically when started from backend/:
+#   gunicorn backend.wsgi
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+# Threads per worker: concurrent uploads in one process are what the batch
+# scheduler groups into a forward pass, and what admission control counts
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Load the Django app (and, if enabled, the TFLite model file) once in the
+# master so forked workers share those pages copy-on-write
+preload_app = True
+preload_model = os.getenv('DETECTION_PRELOAD_MODEL', 'false').lower() == 'true'
+
+
+def when_ready(server):
+    if not preload_model:
+        return
+    from food_detection.model_registry import registry
+    # The file only: engines are built in the workers, as TensorFlow's and
+    # TFLite's thread pools do not survive a fork
+    if registry.preload():
+        server.log.info("Read detection model file in master")
+    else:
+        server.log.warning(
+            "DETECTION_PRELOAD_MODEL only applies to DETECTION_INFERENCE_ENGINE=tflite; "
+            "the TensorFlow engines are loaded by each worker"
+        )
+
+
+def post_fork(server, worker):
+    from food_detection.model_registry import registry
+    # Dummy inference in each worker traces the graph before traffic arrives;
+    # /api/ready/ reports 503 until this has finished
+    registry.warmup_async()
+
+
+def worker_exit(server, worker):
+    from food_detection.history import firestore_history_buffer, history_buffer
+    # Write out queued detection history before the worker goes away
+    history_buffer.stop()
+    firestore_history_buffer.stop()
@@ -0,0 +1,218 @@
+"""Running nutrition totals kept next to the food entries in Firestore.
+
+Every entry contributes to five documents in ``nutrition_summaries``: one
+shard of the all-time totals of all users, the all-time totals of its user,
+and that user's day, week (starting Monday) and month buckets containing its
+UTC timestamp. The entry write and the Increment transforms on those
+documents are committed in one batch, so the totals never drift from the
+entries; a user's summary costs one read, the all-users summary one read per
+shard and a rollup one read per bucket in its range.
+"""
+import hashlib
+import zlib
+from datetime import timedelta
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+
+ENTRIES_COLLECTION = 'food_entries'
+SUMMARY_COLLECTION = 'nutrition_summaries'
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+# Entries written before users were recorded
+DEFAULT_USER = 'guest'
+PERIODS = ('day', 'week', 'month')
+# Firestore sustains about one write per second to a document, so the
+# all-users totals are split over shards picked by user; no shard is then
+# written more often than the user documents are anyway
+ALL_USERS_SHARDS = 16
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def bucket_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, period):
+    if period == 'week':
+        return start + timedelta(days=7)
+    if period == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def all_users_shard(user_id):
+    return zlib.crc32(user_id.encode()) % ALL_USERS_SHARDS
+
+
+def summary_id(user_id=None, period=None, start=None, shard=0):
+    if user_id is None:
+        return f'all_{shard}'
+    # userId is client-supplied: hashed, it can neither contain '/' nor end
+    # in another user's '_day_2024-01-01'
+    user_key = hashlib.sha1(user_id.encode()).hexdigest()
+    if period is None:
+        return f'user_{user_key}'
+    return f'user_{user_key}_{period}_{start.isoformat()}'
+
+
+def summary_docs(entry):
+    """(document id, identifying fields) of the summaries an entry counts in."""
+    user_id = entry.get('userId') or DEFAULT_USER
+    shard = all_users_shard(user_id)
+    docs = [
+        (summary_id(shard=shard), {'shard': shard}),
+        (summary_id(user_id), {'userId': user_id}),
+    ]
+    timestamp = entry.get('timestamp')
+    if timestamp:
+        for period in PERIODS:
+            start = bucket_start(timestamp.date(), period)
+            docs.append((
+                summary_id(user_id, period, start),
+                {'userId': user_id, 'period': period, 'start': start.isoformat()},
+            ))
+    return docs
+
+
+def _increment(db, batch, entry, sign):
+    delta = {key: firestore.Increment(sign * _number(entry.get(key))) for key in NUTRIENTS}
+    delta['count'] = firestore.Increment(sign)
+    summaries = db.collection(SUMMARY_COLLECTION)
+    for doc_id, fields in summary_docs(entry):
+        batch.set(summaries.document(doc_id), {**fields, **delta}, merge=True)
+
+
+def add_entry(db, entry_id, entry):
+    batch = db.batch()
+    batch.set(db.collection(ENTRIES_COLLECTION).document(entry_id), entry)
+    _increment(db, batch, entry, 1)
+    batch.commit()
+
+
+def delete_entry(db, entry_id):
+    """Deletes an entry and takes it out of the totals; False if it didn't exist."""
+    doc_ref = db.collection(ENTRIES_COLLECTION).document(entry_id)
+    snapshot = doc_ref.get()
+    if not snapshot.exists:
+        return False
+    batch = db.batch()
+    # If a concurrent request deleted it first, the whole batch fails and
+    # the totals are only decremented once
+    batch.delete(doc_ref, option=db.write_option(exists=True))
+    _increment(db, batch, snapshot.to_dict(), -1)
+    try:
+        batch.commit()
+    except NotFound:
+        return False
+    return True
+
+
+def read_summary(db, user_id=None, day=None):
+    summaries = db.collection(SUMMARY_COLLECTION)
+    if user_id is None:
+        refs = [summaries.document(summary_id(shard=shard)) for shard in range(ALL_USERS_SHARDS)]
+    else:
+        refs = [summaries.document(summary_id(user_id, 'day', day) if day else summary_id(user_id))]
+    docs = [snapshot.to_dict() for snapshot in db.get_all(refs) if snapshot.exists]
+    summary = {f'total_{key}': sum(float(data.get(key, 0.0)) for data in docs) for key in NUTRIENTS}
+    summary['entries'] = sum(int(data.get('count', 0)) for data in docs)
+    return summary
+
+
+def bucket_starts(period, start, end):
+    current = bucket_start(start, period)
+    while current <= end:
+        yield current
+        current = next_bucket(current, period)
+
+
+def read_rollup(db, user_id, period, start, end):
+    """Per-bucket totals from ``start`` to ``end`` (dates, inclusive) as
+    parallel lists, with zeros for empty buckets."""
+    starts = list(bucket_starts(period, start, end))
+    summaries = db.collection(SUMMARY_COLLECTION)
+    refs = [summaries.document(summary_id(user_id, period, bucket)) for bucket in starts]
+    found = {snapshot.id: snapshot.to_dict() for snapshot in db.get_all(refs) if snapshot.exists}
+
+    series = {'buckets': [bucket.isoformat() for bucket in starts]}
+    for key in NUTRIENTS:
+        series[key] = [float(found.get(ref.id, {}).get(key, 0.0)) for ref in refs]
+    series['entries'] = [int(found.get(ref.id, {}).get('count', 0)) for ref in refs]
+    return series
+
+
+def compute_summaries(entries):
+    """Totals by summary document id, recomputed from scratch."""
+    totals = {}
+    for entry in entries:
+        for doc_id, fields in summary_docs(entry):
+            total = totals.get(doc_id)
+            if total is None:
+                total = totals[doc_id] = {**fields, **dict.fromkeys(NUTRIENTS, 0.0), 'count': 0}
+            for key in NUTRIENTS:
+                total[key] += _number(entry.get(key))
+            total['count'] += 1
+    return totals
+
+
+def _differs(expected, actual):
+    for key, value in expected.items():
+        if isinstance(value, str):
+            if actual.get(key) != value:
+                return True
+        elif abs(value - _number(actual.get(key))) > 1e-6:
+            return True
+    return False
+
+
+def reconcile_summaries(db, dry_run=False, batch_size=500):
+    """Rebuilds the summary documents from the entries.
+
+    Only documents whose totals differ are rewritten and summaries without
+    entries left are deleted. Entries written while this runs may be
+    counted twice or not at all, so run it when the app is quiet.
+    """
+    entries = (doc.to_dict() for doc in db.collection(ENTRIES_COLLECTION).stream())
+    totals = compute_summaries(entries)
+    summaries = db.collection(SUMMARY_COLLECTION)
+    existing = {doc.id: doc.to_dict() for doc in summaries.stream()}
+
+    writes = [(doc_id, total) for doc_id, total in totals.items()
+              if doc_id not in existing or _differs(total, existing[doc_id])]
+    removed = [doc_id for doc_id in existing if doc_id not in totals]
+
+    if not dry_run:
+        batch = db.batch()
+        pending = 0
+        for doc_id, total in writes:
+            batch.set(summaries.document(doc_id), total)
+            pending += 1
+            if pending == batch_size:
+                batch.commit()
+                batch, pending = db.batch(), 0
+        for doc_id in removed:
+            batch.delete(summaries.document(doc_id))
+            pending += 1
+            if pending == batch_size:
+                batch.commit()
+                batch, pending = db.batch(), 0
+        if pending:
+            batch.commit()
+
+    return {
+        'entries': sum(totals.get(summary_id(shard=shard), {}).get('count', 0)
+                       for shard in range(ALL_USERS_SHARDS)),
+        'summaries': len(totals),
+        'rewritten': len(writes),
+        'removed': len(removed),
+    }
@@ -1,11 +1,42 @@
+import logging
+import os
+
 import firebase_admin
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from firebase_admin import credentials, firestore
 
-# Path to your downloaded firebase_credentials.json file
-cred = credentials.Certificate("firebase_credentials.json")
+logger = logging.getLogger(__name__)
+
+_db = None
+
+
+def get_db():
+    """The Firestore client, created on first use.
+
+    Uses the Firebase app settings initializes from the FIREBASE_* environment
+    variables, falling back to the service account file at
+    FIREBASE_CREDENTIALS_FILE.
+    """
+    global _db
+    if _db is None:
+        # Initialize the app only once
+        if not firebase_admin._apps:
+            path = getattr(settings, 'FIREBASE_CREDENTIALS_FILE', 'firebase_credentials.json')
+            if not os.path.exists(path):
+                raise ImproperlyConfigured(
+                    f"Firestore is not configured: set the FIREBASE_* variables or provide {path}"
+                )
+            firebase_admin.initialize_app(credentials.Certificate(path))
+        _db = firestore.client()
+    return _db
 
-# Initialize the app only once
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+def firestore_configured():
+    """True if get_db() can create a client."""
+    try:
+        get_db()
+    except (ImproperlyConfigured, ValueError) as e:
+        logger.info(f"Firestore disabled: {str(e)}")
+        return False
+    return True
@@ -0,0 +1,285 @@
+"""In-memory stand-in for the subset of the Firestore client the app uses.
+
+Lets the nutrition aggregates (and anything else written against
+``firestore.client()``) run without credentials: collections, documents,
+where/order_by/limit/select/start_after queries, get_all, atomic write batches with exists
+preconditions, and the Increment / SERVER_TIMESTAMP transforms. ``reads``
+counts documents returned, which is what Firestore bills for.
+"""
+import copy
+import operator
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import BaseQuery
+
+_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, options: value in options,
+    'array_contains': lambda value, item: item in (value or ()),
+}
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self._collections = {}
+        self._lock = threading.RLock()
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        for reference in references:
+            yield reference.get()
+
+    def write_option(self, **kwargs):
+        return FakeWriteOption(**kwargs)
+
+    def _documents(self, collection):
+        return self._collections.setdefault(collection, {})
+
+
+class FakeWriteOption:
+    def __init__(self, exists=None, last_update_time=None):
+        self.exists = exists
+        self.last_update_time = last_update_time
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return self._data[field]
+
+
+def _field(doc_id, data, field_path):
+    return doc_id if field_path == '__name__' else data[field_path]
+
+
+def _is_after(values, cursor, directions):
+    for value, bound, direction in zip(values, cursor, directions):
+        if value != bound:
+            return value < bound if direction == BaseQuery.DESCENDING else value > bound
+    return False
+
+
+class FakeQuery:
+    def __init__(self, client, collection, filters=(), orders=(), limit=None, offset=None,
+                 projection=None, start_after=None):
+        self._client = client
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._offset = offset
+        self._projection = projection
+        self._start_after = start_after
+
+    def _copy(self, **changes):
+        state = {
+            'filters': self._filters, 'orders': self._orders,
+            'limit': self._limit, 'offset': self._offset,
+            'projection': self._projection, 'start_after': self._start_after,
+        }
+        state.update(changes)
+        return FakeQuery(self._client, self._collection, **state)
+
+    def select(self, field_paths):
+        return self._copy(projection=tuple(field_paths))
+
+    def start_after(self, document_fields):
+        # Field values keyed like the order_by clauses; '__name__' is a
+        # document id or reference
+        if isinstance(document_fields, FakeSnapshot):
+            document_fields = {**document_fields.to_dict(), '__name__': document_fields.id}
+        values = []
+        for field_path, _ in self._orders[:len(document_fields)]:
+            value = document_fields[field_path]
+            values.append(getattr(value, 'id', value) if field_path == '__name__' else value)
+        return self._copy(start_after=tuple(values))
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, _OPERATORS[op_string], value),))
+
+    def order_by(self, field_path, direction=BaseQuery.ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def stream(self, transaction=None):
+        with self._client._lock:
+            documents = [
+                (doc_id, copy.deepcopy(data))
+                for doc_id, data in self._client._documents(self._collection).items()
+                if all(field in data and op(data[field], value) for field, op, value in self._filters)
+            ]
+        for field, direction in reversed(self._orders):
+            documents = [doc for doc in documents if field == '__name__' or field in doc[1]]
+            documents.sort(key=lambda doc: _field(*doc, field), reverse=direction == BaseQuery.DESCENDING)
+        if not self._orders:
+            documents.sort(key=lambda doc: doc[0])
+        if self._start_after is not None:
+            fields = [field for field, _ in self._orders]
+            directions = [direction for _, direction in self._orders]
+            documents = [
+                doc for doc in documents
+                if _is_after([_field(*doc, field) for field in fields], self._start_after, directions)
+            ]
+        if self._projection is not None:
+            documents = [
+                (doc_id, {field: data[field] for field in self._projection if field in data})
+                for doc_id, data in documents
+            ]
+        if self._offset:
+            documents = documents[self._offset:]
+        if self._limit is not None:
+            documents = documents[:self._limit]
+        for doc_id, data in documents:
+            self._client.reads += 1
+            yield FakeSnapshot(FakeDocumentRef(self._client, self._collection, doc_id), data)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, document_id=None):
+        return FakeDocumentRef(self._client, self._collection, document_id or uuid.uuid4().hex[:20])
+
+
+class FakeDocumentRef:
+    def __init__(self, client, collection, document_id):
+        self._client = client
+        self._collection = collection
+        self.id = document_id
+        self.path = f'{collection}/{document_id}'
+
+    def get(self, field_paths=None, transaction=None):
+        with self._client._lock:
+            data = self._client._documents(self._collection).get(self.id)
+            self._client.reads += 1
+            return FakeSnapshot(self, copy.deepcopy(data))
+
+    def set(self, document_data, merge=False):
+        batch = self._client.batch()
+        batch.set(self, document_data, merge=merge)
+        batch.commit()
+
+    def update(self, field_updates, option=None):
+        batch = self._client.batch()
+        batch.update(self, field_updates, option=option)
+        batch.commit()
+
+    def create(self, document_data):
+        batch = self._client.batch()
+        batch.create(self, document_data)
+        batch.commit()
+
+    def delete(self, option=None):
+        batch = self._client.batch()
+        batch.delete(self, option=option)
+        batch.commit()
+
+
+def _apply_transforms(current, updates):
+    result = dict(current or {})
+    for field, value in updates.items():
+        if isinstance(value, transforms.Increment):
+            result[field] = result.get(field, 0) + value.value
+        elif value is transforms.SERVER_TIMESTAMP:
+            result[field] = datetime.now(timezone.utc)
+        elif value is transforms.DELETE_FIELD:
+            result.pop(field, None)
+        else:
+            result[field] = copy.deepcopy(value)
+    return result
+
+
+class FakeWriteBatch:
+    """Applies all queued writes at once, or none if a precondition fails."""
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(('set', reference, document_data, merge, None))
+        return self
+
+    def create(self, reference, document_data):
+        self._writes.append(('create', reference, document_data, False, None))
+        return self
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(('update', reference, field_updates, True, FakeWriteOption(exists=True)))
+        return self
+
+    def delete(self, reference, option=None):
+        self._writes.append(('delete', reference, None, False, option))
+        return self
+
+    def commit(self):
+        with self._client._lock:
+            staged = {}
+
+            def current(reference):
+                key = (reference._collection, reference.id)
+                if key in staged:
+                    return staged[key]
+                return self._client._documents(reference._collection).get(reference.id)
+
+            for kind, reference, data, merge, option in self._writes:
+                existing = current(reference)
+                if option is not None and option.exists is not None and option.exists != (existing is not None):
+                    raise NotFound(f"Document {reference.path} precondition failed")
+                if kind == 'create' and existing is not None:
+                    raise AlreadyExists(f"Document {reference.path} already exists")
+                if kind == 'delete':
+                    staged[(reference._collection, reference.id)] = None
+                else:
+                    staged[(reference._collection, reference.id)] = _apply_transforms(
+                        existing if merge else None, data
+                    )
+
+            for (collection, document_id), data in staged.items():
+                documents = self._client._documents(collection)
+                if data is None:
+                    documents.pop(document_id, None)
+                else:
+                    documents[document_id] = data
+            self._client.writes += len(self._writes)
+        self._writes = []
+        return []
@@ -0,0 +1,117 @@
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from nutrition.storage import BACKENDS, FirestoreEntryStore
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the nutrition storage backends on the same workload: add entries, '
+        'page through them, read summaries and rollups, then delete them again'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', action='append', choices=list(BACKENDS),
+                            help='May be repeated; defaults to all backends')
+        parser.add_argument('--entries', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--days', type=int, default=90,
+                            help='Spread the entries over this many past days')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--reads', type=int, default=200,
+                            help='Summary and rollup requests per backend')
+        parser.add_argument('--fake-firestore', action='store_true',
+                            help='Run the firestore backend against the in-memory fake')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        run = uuid.uuid4().hex[:8]
+        now = datetime.now(timezone.utc)
+        users = [f'bench-{run}-{i}' for i in range(options['users'])]
+        entries = [
+            {
+                'food_name': f'food {i}',
+                'calories': rng.uniform(50, 800),
+                'protein': rng.uniform(0, 50),
+                'carbs': rng.uniform(0, 100),
+                'fat': rng.uniform(0, 40),
+                'userId': rng.choice(users),
+                'timestamp': now - timedelta(seconds=rng.uniform(0, options['days'] * 86400)),
+            }
+            for i in range(options['entries'])
+        ]
+        self.stdout.write(f"{len(entries)} entries over {len(users)} users and {options['days']} days")
+
+        for name in options['backend'] or list(BACKENDS):
+            store = self._store(name, options['fake_firestore'])
+            self.stdout.write(name)
+            try:
+                self._run(store, entries, users, now.date(), options, rng)
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+
+    def _store(self, name, fake_firestore):
+        if name == 'firestore' and fake_firestore:
+            from nutrition.firestore_fake import FakeFirestore
+            return FirestoreEntryStore(FakeFirestore())
+        return BACKENDS[name]()
+
+    def _report(self, label, timings):
+        timings = np.array(timings) * 1000.0
+        total = timings.sum() / 1000.0
+        p50, p99 = np.percentile(timings, [50, 99])
+        self.stdout.write(
+            f"  {label:<8} {len(timings) / total:10.1f} ops/s "
+            f"p50={p50:.2f}ms p99={p99:.2f}ms"
+        )
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - started
+
+    def _run(self, store, entries, users, today, options, rng):
+        ids = []
+        timings = []
+        for entry in entries:
+            entry_id, elapsed = self._timed(store.add, entry)
+            ids.append(entry_id)
+            timings.append(elapsed)
+        self._report('add', timings)
+
+        # Walks every entry in the store, not only the ones added here
+        timings = []
+        after = None
+        while True:
+            (page, after), elapsed = self._timed(store.page, None, after, options['page_size'])
+            timings.append(elapsed)
+            if after is None:
+                break
+        self._report('page', timings)
+
+        timings = []
+        for _ in range(options['reads']):
+            day = today - timedelta(days=rng.randrange(options['days']))
+            _, elapsed = self._timed(store.summary, rng.choice(users), day)
+            timings.append(elapsed)
+        self._report('summary', timings)
+
+        timings = []
+        start = today - timedelta(days=options['days'] - 1)
+        for _ in range(options['reads']):
+            period = rng.choice(['day', 'week', 'month'])
+            _, elapsed = self._timed(store.rollup, rng.choice(users), period, start, today)
+            timings.append(elapsed)
+        self._report('rollup', timings)
+
+        timings = []
+        for entry_id in ids:
+            _, elapsed = self._timed(store.delete, entry_id)
+            timings.append(elapsed)
+        self._report('delete', timings)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from nutrition.storage import entry_store
+
+
+class Command(BaseCommand):
+    help = 'Recompute the nutrition summary documents from food_entries and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many summaries are out of date')
+
+    def handle(self, *args, **options):
+        result = entry_store.reconcile(dry_run=options['dry_run'])
+        verb = 'would rewrite' if options['dry_run'] else 'rewrote'
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['entries']} entries, {result['summaries']} summaries: "
+            f"{verb} {result['rewritten']}, removed {result['removed']}"
+        ))
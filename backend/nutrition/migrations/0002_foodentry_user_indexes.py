@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodentry',
+            name='user_id',
+            field=models.CharField(default='guest', max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='foodentry',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='foodentry',
+            index=models.Index(fields=['timestamp', 'id'], name='nutrition_entry_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodentry',
+            index=models.Index(fields=['user_id', 'timestamp'], name='nutrition_entry_user_ts_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class FoodEntry(models.Model):
     name = models.CharField(max_length=100)
@@ -6,7 +7,16 @@ class FoodEntry(models.Model):
     protein = models.FloatField()
     carbs = models.FloatField()
     fat = models.FloatField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    user_id = models.CharField(max_length=128, default='guest')
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Newest-first paging on (timestamp, id)
+            models.Index(fields=['timestamp', 'id'], name='nutrition_entry_ts_idx'),
+            # Per-user summaries and rollups over a time range
+            models.Index(fields=['user_id', 'timestamp'], name='nutrition_entry_user_ts_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -0,0 +1,242 @@
+"""Storage backends for the food log, selected by NUTRITION_STORAGE_BACKEND.
+
+``firestore`` keeps entries in ``food_entries`` with incrementally maintained
+totals (see ``aggregates``); ``django`` keeps them in the ``FoodEntry`` table
+of the default database and computes totals with indexed aggregate queries.
+Both take and return entries as dicts with the API's field names and string
+ids, and page newest first on (timestamp, id).
+"""
+from datetime import datetime, time, timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count, DateTimeField, Q, Sum
+from django.db.models.functions import Trunc
+
+from .aggregates import (
+    DEFAULT_USER, ENTRIES_COLLECTION, NUTRIENTS, add_entry, bucket_start, bucket_starts,
+    delete_entry, next_bucket, read_rollup, read_summary, reconcile_summaries,
+)
+
+
+class EntryStore:
+    def add(self, entry):
+        """Stores an entry and returns its id."""
+        raise NotImplementedError
+
+    def delete(self, entry_id):
+        """Deletes an entry; False if it didn't exist."""
+        raise NotImplementedError
+
+    def page(self, fields, after, limit, user_id=None):
+        """One page of entries, newest first, and the (timestamp, id) to
+        continue after, or None on the last page. ``fields`` limits the
+        returned fields (the id is always included) and ``user_id`` the
+        entries to those of one user."""
+        raise NotImplementedError
+
+    def summary(self, user_id=None, day=None):
+        raise NotImplementedError
+
+    def rollup(self, user_id, period, start, end):
+        """Per-bucket totals from ``start`` to ``end`` (dates, inclusive) as
+        parallel lists, with zeros for empty buckets."""
+        raise NotImplementedError
+
+    def reconcile(self, dry_run=False):
+        """Brings any precomputed totals back in line with the entries."""
+        raise NotImplementedError
+
+
+class FirestoreEntryStore(EntryStore):
+    def __init__(self, db=None):
+        self._db = db
+
+    @property
+    def db(self):
+        # Resolved on first use so the app starts without Firebase credentials
+        if self._db is None:
+            from .firebase import get_db
+            self._db = get_db()
+        return self._db
+
+    def add(self, entry):
+        doc_ref = self.db.collection(ENTRIES_COLLECTION).document()
+        # Written together with the running totals
+        add_entry(self.db, doc_ref.id, entry)
+        return doc_ref.id
+
+    def delete(self, entry_id):
+        return delete_entry(self.db, entry_id)
+
+    def page(self, fields, after, limit, user_id=None):
+        from firebase_admin import firestore
+
+        query = self.db.collection(ENTRIES_COLLECTION)
+        if user_id is not None:
+            # Served by the (userId, timestamp desc) composite index
+            query = query.where("userId", "==", user_id)
+        query = (
+            query
+            .order_by("timestamp", direction=firestore.Query.DESCENDING)
+            .order_by("__name__", direction=firestore.Query.DESCENDING)
+        )
+        if fields is not None:
+            # The timestamp is needed for the cursor even when not requested
+            query = query.select(sorted(set(fields) | {"timestamp"}))
+        if after is not None:
+            query = query.start_after({"timestamp": after[0], "__name__": after[1]})
+
+        entries = []
+        last = None
+        for doc in query.limit(limit + 1).stream():
+            if len(entries) == limit:
+                break
+            data = doc.to_dict()
+            last = (data["timestamp"], doc.id)
+            if fields is not None:
+                data = {field: data[field] for field in fields if field in data}
+            data['id'] = doc.id
+            entries.append(data)
+        else:
+            last = None
+        return entries, last
+
+    def summary(self, user_id=None, day=None):
+        return read_summary(self.db, user_id, day)
+
+    def rollup(self, user_id, period, start, end):
+        return read_rollup(self.db, user_id, period, start, end)
+
+    def reconcile(self, dry_run=False):
+        return reconcile_summaries(self.db, dry_run=dry_run)
+
+
+# API field name -> FoodEntry column
+ENTRY_COLUMNS = {
+    'food_name': 'name',
+    'calories': 'calories',
+    'protein': 'protein',
+    'carbs': 'carbs',
+    'fat': 'fat',
+    'userId': 'user_id',
+    'timestamp': 'timestamp',
+}
+
+
+def _day_range(start, end):
+    # [start 00:00, end 00:00) in UTC, the zone the buckets are defined in
+    return (datetime.combine(start, time.min, tzinfo=timezone.utc),
+            datetime.combine(end, time.min, tzinfo=timezone.utc))
+
+
+class DjangoEntryStore(EntryStore):
+    def __init__(self, using='default'):
+        self.using = using
+
+    @property
+    def entries(self):
+        from .models import FoodEntry
+        return FoodEntry.objects.using(self.using)
+
+    def add(self, entry):
+        values = {ENTRY_COLUMNS[field]: value for field, value in entry.items() if field in ENTRY_COLUMNS}
+        values.setdefault('user_id', DEFAULT_USER)
+        return str(self.entries.create(**values).pk)
+
+    def delete(self, entry_id):
+        try:
+            pk = int(entry_id)
+        except (TypeError, ValueError):
+            return False
+        deleted, _ = self.entries.filter(pk=pk).delete()
+        return deleted > 0
+
+    def page(self, fields, after, limit, user_id=None):
+        query = self.entries.order_by('-timestamp', '-id')
+        if user_id is not None:
+            query = query.filter(user_id=user_id)
+        if after is not None:
+            timestamp, entry_id = after
+            try:
+                entry_id = int(entry_id)
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+            # Keyset on (timestamp, id), served by the timestamp index
+            query = query.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=entry_id))
+        fields = list(ENTRY_COLUMNS) if fields is None else fields
+        columns = {'id', 'timestamp'} | {ENTRY_COLUMNS[field] for field in fields}
+        rows = list(query.values(*columns)[:limit + 1])
+
+        last = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = (rows[-1]['timestamp'], str(rows[-1]['id']))
+        entries = []
+        for row in rows:
+            entry = {field: row[ENTRY_COLUMNS[field]] for field in fields}
+            entry['id'] = str(row['id'])
+            entries.append(entry)
+        return entries, last
+
+    def _totals(self, query):
+        return query.aggregate(
+            count=Count('id'), **{key: Sum(key) for key in NUTRIENTS}
+        )
+
+    def summary(self, user_id=None, day=None):
+        query = self.entries.all()
+        if user_id is not None:
+            query = query.filter(user_id=user_id)
+        if day is not None:
+            since, until = _day_range(day, next_bucket(day, 'day'))
+            query = query.filter(timestamp__gte=since, timestamp__lt=until)
+        data = self._totals(query)
+        summary = {f'total_{key}': float(data[key] or 0.0) for key in NUTRIENTS}
+        summary['entries'] = data['count']
+        return summary
+
+    def rollup(self, user_id, period, start, end):
+        starts = list(bucket_starts(period, start, end))
+        since, until = _day_range(starts[0], next_bucket(starts[-1], period))
+        rows = (
+            self.entries
+            .filter(user_id=user_id, timestamp__gte=since, timestamp__lt=until)
+            .annotate(bucket=Trunc('timestamp', period, output_field=DateTimeField(), tzinfo=timezone.utc))
+            .values('bucket')
+            .annotate(count=Count('id'), **{key: Sum(key) for key in NUTRIENTS})
+            .order_by()
+        )
+        found = {}
+        for row in rows:
+            # Trunc weeks start on Monday, like bucket_start
+            found[bucket_start(row['bucket'].date(), period)] = row
+
+        series = {'buckets': [bucket.isoformat() for bucket in starts]}
+        for key in NUTRIENTS:
+            series[key] = [float(found.get(bucket, {}).get(key) or 0.0) for bucket in starts]
+        series['entries'] = [int(found.get(bucket, {}).get('count', 0)) for bucket in starts]
+        return series
+
+    def reconcile(self, dry_run=False):
+        # Totals are computed on read, so there is nothing to drift
+        return {'entries': self.entries.count(), 'summaries': 0, 'rewritten': 0, 'removed': 0}
+
+
+BACKENDS = {
+    'firestore': FirestoreEntryStore,
+    'django': DjangoEntryStore,
+}
+
+
+def build_store(name=None):
+    name = name or getattr(settings, 'NUTRITION_STORAGE_BACKEND', 'firestore')
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown NUTRITION_STORAGE_BACKEND {name!r}, expected one of {', '.join(BACKENDS)}"
+        )
+
+
+entry_store = build_store()
@@ -1,3 +1,128 @@
-from django.test import TestCase
+from datetime import date, datetime, timezone
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from nutrition.aggregates import (
+    ALL_USERS_SHARDS, SUMMARY_COLLECTION, add_entry, all_users_shard, delete_entry,
+    read_rollup, read_summary, reconcile_summaries, summary_id,
+)
+from nutrition.firestore_fake import FakeFirestore
+
+
+def entry(user_id, day, calories, protein=1.0, carbs=2.0, fat=3.0):
+    return {
+        'food_name': 'Apple',
+        'calories': calories,
+        'protein': protein,
+        'carbs': carbs,
+        'fat': fat,
+        'userId': user_id,
+        'timestamp': datetime(day.year, day.month, day.day, 12, tzinfo=timezone.utc),
+    }
+
+
+class AggregatesTests(SimpleTestCase):
+    def setUp(self):
+        self.db = FakeFirestore()
+        # Users on different all-users shards
+        self.alice, self.bob = 'alice', next(
+            f'bob-{i}' for i in range(100) if all_users_shard(f'bob-{i}') != all_users_shard('alice')
+        )
+        add_entry(self.db, 'e1', entry(self.alice, date(2024, 1, 1), 100))  # Monday
+        add_entry(self.db, 'e2', entry(self.alice, date(2024, 1, 3), 50))
+        add_entry(self.db, 'e3', entry(self.alice, date(2024, 2, 1), 10))
+        add_entry(self.db, 'e4', entry(self.bob, date(2024, 1, 1), 200))
+
+    def summary(self, doc_id):
+        return self.db.collection(SUMMARY_COLLECTION).document(doc_id).get().to_dict()
+
+    def test_add_entry_counts_in_every_summary(self):
+        self.assertEqual(read_summary(self.db, self.alice), {
+            'total_calories': 160.0, 'total_protein': 3.0, 'total_carbs': 6.0, 'total_fat': 9.0, 'entries': 3,
+        })
+        self.assertEqual(read_summary(self.db, self.alice, date(2024, 1, 3))['total_calories'], 50.0)
+        self.assertEqual(read_summary(self.db, self.bob)['entries'], 1)
+        self.assertEqual(read_summary(self.db, 'nobody')['entries'], 0)
+
+    def test_all_users_totals_are_summed_over_shards(self):
+        self.assertEqual(self.summary(summary_id(shard=all_users_shard(self.alice)))['count'], 3)
+        self.assertEqual(self.summary(summary_id(shard=all_users_shard(self.bob)))['count'], 1)
+
+        self.db.reads = 0
+        summary = read_summary(self.db)
+        self.assertEqual((summary['total_calories'], summary['entries']), (360.0, 4))
+        self.assertEqual(self.db.reads, ALL_USERS_SHARDS)
+
+    def test_delete_entry_takes_it_out_of_the_totals(self):
+        self.assertTrue(delete_entry(self.db, 'e2'))
+        self.assertEqual(read_summary(self.db, self.alice)['total_calories'], 110.0)
+        self.assertEqual(read_summary(self.db, self.alice, date(2024, 1, 3))['entries'], 0)
+        self.assertEqual(read_summary(self.db)['entries'], 3)
+
+    def test_double_delete_decrements_once(self):
+        self.assertTrue(delete_entry(self.db, 'e2'))
+        self.assertFalse(delete_entry(self.db, 'e2'))
+        self.assertFalse(delete_entry(self.db, 'missing'))
+        self.assertEqual(read_summary(self.db, self.alice)['entries'], 2)
+
+    def test_concurrent_delete_decrements_once(self):
+        # Another request deletes the entry after this one read it
+        batch = self.db.batch
+
+        def racing_batch():
+            self.db.batch = batch
+            self.assertTrue(delete_entry(self.db, 'e1'))
+            return batch()
+
+        self.db.batch = racing_batch
+        self.assertFalse(delete_entry(self.db, 'e1'))
+        self.assertEqual(read_summary(self.db, self.alice)['total_calories'], 60.0)
+        self.assertEqual(read_summary(self.db)['entries'], 3)
+
+    def test_read_rollup_fills_empty_buckets(self):
+        days = read_rollup(self.db, self.alice, 'day', date(2024, 1, 1), date(2024, 1, 4))
+        self.assertEqual(days['buckets'], ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04'])
+        self.assertEqual(days['calories'], [100.0, 0.0, 50.0, 0.0])
+        self.assertEqual(days['entries'], [1, 0, 1, 0])
+
+        # Weeks start on Monday, months on the 1st, whatever the start date
+        weeks = read_rollup(self.db, self.alice, 'week', date(2024, 1, 3), date(2024, 1, 10))
+        self.assertEqual(weeks['buckets'], ['2024-01-01', '2024-01-08'])
+        self.assertEqual(weeks['calories'], [150.0, 0.0])
+
+        self.db.reads = 0
+        months = read_rollup(self.db, self.alice, 'month', date(2023, 12, 15), date(2024, 2, 1))
+        self.assertEqual(months['buckets'], ['2023-12-01', '2024-01-01', '2024-02-01'])
+        self.assertEqual(months['calories'], [0.0, 150.0, 10.0])
+        self.assertEqual(months['fat'], [0.0, 6.0, 3.0])
+        self.assertEqual(self.db.reads, 3)
+
+    def test_user_ids_cannot_collide_or_break_document_paths(self):
+        add_entry(self.db, 'e5', entry('alice_day_2024-01-01', date(2024, 1, 2), 7))
+        add_entry(self.db, 'e6', entry('carol/day', date(2024, 1, 2), 9))
+        self.assertEqual(read_summary(self.db, self.alice, date(2024, 1, 1))['total_calories'], 100.0)
+        self.assertEqual(read_summary(self.db, 'alice_day_2024-01-01')['total_calories'], 7.0)
+        self.assertEqual(read_summary(self.db, 'carol/day', date(2024, 1, 2))['total_calories'], 9.0)
+        self.assertNotIn('/', summary_id('carol/day', 'week', date(2024, 1, 1)))
+
+    def test_reconcile_summaries_leaves_consistent_totals_alone(self):
+        self.assertEqual(reconcile_summaries(self.db), {
+            'entries': 4, 'summaries': 14, 'rewritten': 0, 'removed': 0,
+        })
+
+    def test_reconcile_summaries_repairs_drifted_totals(self):
+        summaries = self.db.collection(SUMMARY_COLLECTION)
+        summaries.document(summary_id(self.alice)).set({'calories': 1.0}, merge=True)
+        summaries.document(summary_id(self.bob, 'day', date(2024, 1, 1))).delete()
+        summaries.document(summary_id('gone')).set({'userId': 'gone', 'calories': 5.0, 'count': 1})
+
+        result = reconcile_summaries(self.db, dry_run=True)
+        self.assertEqual((result['rewritten'], result['removed']), (2, 1))
+        self.assertEqual(read_summary(self.db, self.alice)['total_calories'], 1.0)
+
+        result = reconcile_summaries(self.db, batch_size=1)
+        self.assertEqual((result['rewritten'], result['removed']), (2, 1))
+        self.assertEqual(read_summary(self.db, self.alice)['total_calories'], 160.0)
+        self.assertEqual(read_summary(self.db, self.bob, date(2024, 1, 1))['total_calories'], 200.0)
+        self.assertIsNone(self.summary(summary_id('gone')))
+        self.assertEqual(reconcile_summaries(self.db)['rewritten'], 0)
@@ -5,4 +5,5 @@ urlpatterns = [
     path('food/', views.food_list),
     path('food/<str:pk>/', views.food_delete),
     path('summary/', views.food_summary),
+    path('rollup/', views.food_rollup),
 ]
@@ -1,30 +1,94 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from .firebase import db
-from firebase_admin import firestore
-import uuid
-from datetime import datetime
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+from django.http import StreamingHttpResponse
+from .aggregates import PERIODS, bucket_starts
+from .storage import entry_store
+import base64
+import json
+from itertools import islice
+from datetime import date, datetime, timedelta, timezone
+from django.conf import settings
 
-collection_name = 'food_entries'  # Firestore collection name
+ENTRY_FIELDS = ("food_name", "calories", "protein", "carbs", "fat", "userId", "timestamp")
+ENTRIES_PAGE_SIZE = getattr(settings, 'NUTRITION_ENTRIES_PAGE_SIZE', 50)
+ENTRIES_MAX_PAGE_SIZE = getattr(settings, 'NUTRITION_ENTRIES_MAX_PAGE_SIZE', 500)
+# Documents fetched per query while streaming, so no single query stays open long
+STREAM_CHUNK_SIZE = 500
+
+
+def _entry_fields(fields):
+    if not fields:
+        return None
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = set(fields) - set(ENTRY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def _encode_entry_cursor(position):
+    timestamp, doc_id = position
+    data = json.dumps({"timestamp": timestamp.isoformat(), "id": doc_id})
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def _decode_entry_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(data["timestamp"]), data["id"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+
+
+def _stream_entries(fields, after, user_id):
+    encoder = JSONEncoder()
+    yield '['
+    first = True
+    while True:
+        entries, after = entry_store.page(fields, after, STREAM_CHUNK_SIZE, user_id)
+        for entry in entries:
+            yield ('' if first else ',') + encoder.encode(entry)
+            first = False
+        if after is None:
+            break
+    yield ']'
 
 
 @api_view(['GET', 'POST'])
 def food_list(request):
     if request.method == 'GET':
-        # Fetch all documents, ordered by timestamp descending
+        # Newest first, one page at a time (?limit=&cursor=), optionally only
+        # one user's (?userId=) and some fields (?fields=food_name,calories);
+        # ?stream=1 sends everything as an incrementally written JSON array
+        user_id = request.query_params.get('userId') or None
         try:
-            docs = db.collection(collection_name).order_by(
-                "timestamp", direction=firestore.Query.DESCENDING
-            ).stream()
-            entries = []
-            for doc in docs:
-                data = doc.to_dict()
-                data['id'] = doc.id  # add document ID to the data
-                entries.append(data)
-            return Response(entries)
+            limit = int(request.query_params.get('limit', 0)) or ENTRIES_PAGE_SIZE
+            limit = max(1, min(limit, ENTRIES_MAX_PAGE_SIZE))
+            fields = _entry_fields(request.query_params.get('fields'))
+            after = _decode_entry_cursor(request.query_params.get('cursor'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.query_params.get('stream') in ('1', 'true'):
+            response = StreamingHttpResponse(_stream_entries(fields, after, user_id), content_type='application/json')
+            response['Cache-Control'] = 'no-cache'
+            return response
+
+        try:
+            entries, last = entry_store.page(fields, after, limit, user_id)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        next_url = None
+        if last is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', _encode_entry_cursor(last))
+        return Response({"next": next_url, "results": entries})
 
     elif request.method == 'POST':
         data = request.data
@@ -47,14 +111,14 @@ def food_list(request):
                         status=status.HTTP_400_BAD_REQUEST
                     )
 
-            new_id = str(uuid.uuid4())
-            db.collection(collection_name).document(new_id).set({
+            new_id = entry_store.add({
                 "food_name": data["food_name"],
                 "calories": float(data["calories"]),
                 "protein": float(data["protein"]),
                 "carbs": float(data["carbs"]),
                 "fat": float(data["fat"]),
-                "timestamp": datetime.utcnow()
+                "userId": data.get("userId") or "guest",
+                "timestamp": datetime.now(timezone.utc)
             })
             return Response({"id": new_id, **data}, status=status.HTTP_201_CREATED)
         except (ValueError, TypeError) as e:
@@ -67,9 +131,7 @@ def food_list(request):
 @api_view(['DELETE'])
 def food_delete(request, pk):
     try:
-        doc_ref = db.collection(collection_name).document(pk)
-        if doc_ref.get().exists:
-            doc_ref.delete()
+        if entry_store.delete(pk):
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             return Response({"error": "Document not found"}, 
@@ -80,23 +142,70 @@ def food_delete(request, pk):
 
 @api_view(['GET'])
 def food_summary(request):
+    # All-time totals, optionally for one user (?userId=) and one day (&date=YYYY-MM-DD):
+    # one precomputed document on Firestore, one indexed aggregate query on the ORM backend
+    user_id = request.query_params.get('userId')
+    day = request.query_params.get('date')
+    if day:
+        if not user_id:
+            return Response({"error": "date requires userId"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            day = date.fromisoformat(day)
+        except ValueError:
+            return Response({"error": "date must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        docs = db.collection(collection_name).stream()
-        total = {
-            "total_calories": 0.0,
-            "total_protein": 0.0,
-            "total_carbs": 0.0,
-            "total_fat": 0.0
-        }
-        for doc in docs:
-            data = doc.to_dict()
-            for key in ["calories", "protein", "carbs", "fat"]:
-                try:
-                    total[f"total_{key}"] += float(data.get(key, 0))
-                except (ValueError, TypeError):
-                    # Skip invalid data
-                    continue
-        return Response(total)
+        return Response(entry_store.summary(user_id, day))
     except Exception as e:
         return Response({"error": f"Failed to compute summary: {str(e)}"}, 
-                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Default window when no start date is given, in buckets
+ROLLUP_DEFAULT_BUCKETS = {'day': 30, 'week': 12, 'month': 12}
+
+
+@api_view(['GET'])
+def food_rollup(request):
+    # Per-bucket totals for one user: ?userId=&period=day|week|month&start=&end=
+    user_id = request.query_params.get('userId')
+    period = request.query_params.get('period', 'day')
+    if not user_id:
+        return Response({"error": "userId is required"}, status=status.HTTP_400_BAD_REQUEST)
+    if period not in PERIODS:
+        return Response({"error": f"period must be one of {', '.join(PERIODS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        end = request.query_params.get('end')
+        end = date.fromisoformat(end) if end else datetime.now(timezone.utc).date()
+        start = request.query_params.get('start')
+        if start:
+            start = date.fromisoformat(start)
+        else:
+            start = end - timedelta(days={'day': 1, 'week': 7, 'month': 31}[period] * (ROLLUP_DEFAULT_BUCKETS[period] - 1))
+    except (ValueError, OverflowError):
+        return Response({"error": "start and end must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end:
+        return Response({"error": "start must not be after end"}, status=status.HTTP_400_BAD_REQUEST)
+
+    max_buckets = getattr(settings, 'NUTRITION_ROLLUP_MAX_BUCKETS', 366)
+    try:
+        # Only walks as far as the limit, however long the requested range
+        buckets = sum(1 for _ in islice(bucket_starts(period, start, end), max_buckets + 1))
+    except OverflowError:
+        # Buckets running past 9999-12-31
+        return Response({"error": "end is out of range"}, status=status.HTTP_400_BAD_REQUEST)
+    if buckets > max_buckets:
+        return Response({"error": f"At most {max_buckets} buckets per request"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        return Response({
+            "userId": user_id,
+            "period": period,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            **entry_store.rollup(user_id, period, start, end),
+        })
+    except Exception as e:
+        return Response({"error": f"Failed to compute rollup: {str(e)}"},
+                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1,8 +1,6 @@
 import os
 import sys
 import django
-import json
-from datetime import datetime
 from pathlib import Path
 
 # Add the parent directory to Python path
@@ -13,6 +11,7 @@ sys.path.append(str(backend_dir))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
+from django.core.management import call_command
 from food_detection.models import Food
 
 # Sample food data
@@ -69,12 +68,13 @@ FOODS = [
     }
 ]
 
-async def load_food_data():
+def load_food_data():
+    # Food.save() is synchronous; the rows are then mirrored to Firestore in
+    # batches, skipping foods already there unchanged
     for food_data in FOODS:
-        food = Food(**food_data)
-        await food.save()
+        food, _ = Food.objects.update_or_create(name=food_data["name"], defaults=food_data)
         print(f"Loaded food: {food.name}")
+    call_command("sync_firestore_foods")
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(load_food_data()) 
\ No newline at end of file
+    load_food_data()
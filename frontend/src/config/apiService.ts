@@ -14,11 +14,16 @@ export interface FoodSummary {
     [key: string]: any;
 }
 
-// Fetch all food entries
+export interface EntryPage<T> {
+    next: string | null;
+    results: T[];
+}
+
+// Fetch the most recent food entries (one page)
 export const fetchFoodEntries = async (): Promise<FoodEntry[]> => {
     try {
-        const response = await axios.get<FoodEntry[]>(`${API_URL}food/`);
-        return response.data;
+        const response = await axios.get<EntryPage<FoodEntry>>(`${API_URL}food/`);
+        return response.data.results;
     } catch (error) {
         console.error('Error fetching food entries:', error);
         return [];
@@ -86,18 +86,27 @@ const NutritionTracking = () => {
       }
       try {
         console.debug('NutritionTracking: Fetching entries for user', user.uid);
-        const response = await axios.get(NUTRITION_API_URL, {
-          params: { userId: user.uid },
-        });
-        const entries = response.data.map((entry: any) => ({
-          id: entry.id,
-          food_name: entry.food_name,
-          calories: Number(entry.calories),
-          protein: Number(entry.protein || 0),
-          carbs: Number(entry.carbs || 0),
-          fat: Number(entry.fat || 0),
-          timestamp: entry.timestamp,
-        }));
+        // Follow the cursor so today's totals and the charts see every entry,
+        // not just the first page; the next link keeps userId and limit
+        const entries: FoodEntry[] = [];
+        let url: string | null = NUTRITION_API_URL;
+        let params: Record<string, string | number> | undefined = { userId: user.uid, limit: 500 };
+        while (url) {
+          const response: { data: { next: string | null; results: any[] } } = await axios.get(url, { params });
+          entries.push(
+            ...response.data.results.map((entry: any) => ({
+              id: entry.id,
+              food_name: entry.food_name,
+              calories: Number(entry.calories),
+              protein: Number(entry.protein || 0),
+              carbs: Number(entry.carbs || 0),
+              fat: Number(entry.fat || 0),
+              timestamp: entry.timestamp,
+            }))
+          );
+          url = response.data.next;
+          params = undefined;
+        }
         setFoodEntries(entries);
         setError('');
         console.debug('NutritionTracking: Entries fetched', entries);
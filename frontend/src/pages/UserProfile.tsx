@@ -85,11 +85,11 @@ const UserProfile = () => {
     try {
       console.log('UserProfile: Sending API request to', NUTRITION_API_URL, 'with userId:', user.uid);
       const response = await axios.get(NUTRITION_API_URL, {
-        params: { userId: user.uid },
+        params: { userId: user.uid, limit: 5 },
       });
-      const entries = response.data.slice(0, 5);
+      const entries = response.data.results;
       setNutritionEntries(entries);
-      console.log('UserProfile: Nutrition entries fetched', response.data);
+      console.log('UserProfile: Nutrition entries fetched', response.data.results);
 
       // Calculate health summary
       const totalCalories = entries.reduce((sum: number, entry: FoodEntry) => sum + entry.calories, 0);
@@ -12,6 +12,12 @@ export interface Food {
     food_class: string;
 }
 
+export interface Page<T> {
+    next: string | null;
+    previous: string | null;
+    results: T[];
+}
+
 export interface DetectionResult {
     detected_foods: Food[];
     message: string;
@@ -20,20 +26,20 @@ export interface DetectionResult {
 export const foodService = {
     // Get all foods
     getAllFoods: async () => {
-        const response = await api.get<Food[]>('/foods/');
-        return response.data;
+        const response = await api.get<Page<Food>>('/foods/');
+        return response.data.results;
     },
 
     // Get foods by category
     getFoodsByCategory: async (category: string) => {
-        const response = await api.get<Food[]>(`/foods/?category=${category}`);
-        return response.data;
+        const response = await api.get<Page<Food>>(`/foods/?category=${category}`);
+        return response.data.results;
     },
 
     // Search foods by name
     searchFoods: async (query: string) => {
-        const response = await api.get<Food[]>(`/foods/?search=${query}`);
-        return response.data;
+        const response = await api.get<Page<Food>>(`/foods/?search=${encodeURIComponent(query)}`);
+        return response.data.results;
     },
 
     // Detect food from image